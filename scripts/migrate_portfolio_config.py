@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Migrate Portfolio Config
+One-shot maintenance for the stored portfolio configuration: fixes known bad ticker
+mappings, expires old '🆕' badges and initialises the Gist config from the local
+portfolio_config.json (or the defaults) when the Gist has none yet.
+
+Loading the config (portfolio_manager.load_config) is read-only, so run this after
+changing the fixes in portfolio_manager.migrate_config().
+
+Usage:
+    python scripts/migrate_portfolio_config.py
+"""
+
+import os
+import sys
+
+# Add src to path so we can import our modules
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+import gist_storage
+import portfolio_manager
+
+
+def main():
+    changed = portfolio_manager.migrate_config()
+    if changed and not gist_storage.flush():
+        print('❌ Could not save the migrated config to the Gist')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
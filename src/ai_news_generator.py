@@ -8,15 +8,13 @@ import os
 import time
 import re
 from datetime import datetime
-try:
-    from google import genai
-    from google.genai import types
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
-    print("⚠️  google-genai not installed, AI news generation will be disabled")
 
-from config import PORTFOLIO_TICKERS
+import gemini_gateway
+from gemini_gateway import DEFAULT_GEMINI_MODELS, GENAI_AVAILABLE
+from portfolio_manager import get_tickers
+
+if not GENAI_AVAILABLE:
+    print("⚠️  google-genai not installed, AI news generation will be disabled")
 
 # Import Gist storage module
 try:
@@ -26,42 +24,19 @@ except ImportError:
     GIST_STORAGE_AVAILABLE = False
     print("⚠️  gist_storage module not available, using fallback")
 
-# Import API usage tracker
-try:
-    from api_usage_tracker import log_api_request, save_usage_report
-    API_TRACKER_AVAILABLE = True
-except ImportError:
-    API_TRACKER_AVAILABLE = False
-    print("⚠️  api_usage_tracker module not available, usage tracking disabled")
-
 # Maximum number of $ tags per post
 MAX_TAGS_PER_POST = 4
 
-# Default Gemini models in priority order (Smartest -> Standard fallback).
-# Each model belongs to an independent Free Tier quota bucket (20 RPD each).
-DEFAULT_GEMINI_MODELS = [
-    'gemini-3.7-flash',       # Most intelligent & capable (5 RPM, 20 RPD)
-    'gemini-3.6-flash',       # High capability 3.x series (5 RPM, 20 RPD)
-    'gemini-3.5-flash',       # Advanced financial context & reasoning (5 RPM, 20 RPD)
-    'gemini-2.5-flash',       # Robust standard model (5 RPM, 20 RPD)
-]
-
-
-def _throttle_request(delay: float = 2.0):
-    """Sleep briefly between API requests to avoid breaching RPM limits on Free Tier."""
-    time.sleep(delay)
-
 # Valid eToro symbols for tagging (only use these in posts)
 # These are confirmed to exist on eToro platform
 # Exclude Russian stocks (sanctioned/untradeable)
 _EXCLUDED_FROM_TAGS = {'MNODL.L', 'NVTKL.L'}
-ETORO_VALID_SYMBOLS = [t for t in PORTFOLIO_TICKERS.keys() if t not in _EXCLUDED_FROM_TAGS]
 
 
 def _get_all_portfolio_tags():
     """Get all valid portfolio ticker tags for eToro"""
-    # Map to eToro symbols (keys of PORTFOLIO_TICKERS), excluding Russian stocks
-    return [t for t in PORTFOLIO_TICKERS.keys() if t not in _EXCLUDED_FROM_TAGS]
+    # Map to eToro symbols (keys of the portfolio config tickers), excluding Russian stocks
+    return [t for t in get_tickers().keys() if t not in _EXCLUDED_FROM_TAGS]
 
 
 def _select_tags_for_rotation(max_tags=MAX_TAGS_PER_POST, excluded_tags=None, allowed_tickers=None):
@@ -563,13 +538,8 @@ def generate_monthly_ai_recap(max_tags=MAX_TAGS_PER_POST, excluded_tags=None):
         print("⚠️  Warning: GEMINI_API_KEY not set, skipping AI monthly recap")
         return ""
     
-    # Models in order of preference — each belongs to a DIFFERENT quota bucket (20 RPD each).
-    # gemini-2.5-flash-lite is first (10 RPM vs 5 RPM).
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
     
     try:
-        client = genai.Client(api_key=api_key)
-        
         # Select tags for this post (with rotation)
         selected_tags = []
         selected_tags_str = "None"
@@ -596,7 +566,7 @@ def generate_monthly_ai_recap(max_tags=MAX_TAGS_PER_POST, excluded_tags=None):
         # Get all portfolio tickers for context with descriptions (exclude Russian stocks)
         excluded_tickers = {'MNODL.L', 'NVTKL.L'}
         portfolio_items = []
-        for t, (_, descr) in PORTFOLIO_TICKERS.items():
+        for t, (_, descr) in get_tickers().items():
             if t not in excluded_tickers:
                 portfolio_items.append(f"{t} ({descr})")
         portfolio_context = ", ".join(portfolio_items)
@@ -671,113 +641,22 @@ Impact and outlook summary...
         print(f"🤖 Generating monthly AI recap for {current_month}...")
         print(f"   Selected tags: {selected_tags_str}")
         
-        # Configure with search tool
-        config = None
-        try:
-            config = types.GenerateContentConfig(
-                tools=[types.Tool(google_search=types.GoogleSearch())],
-                temperature=0.7
-            )
-        except Exception as config_err:
-            print(f"⚠️ Search tool unavailable: {config_err}")
-            config = types.GenerateContentConfig(temperature=0.7)
-        
-        # Try models
-        for model_name in models_to_try:
-            try:
-                print(f"   Trying model: {model_name}...")
-                
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config
-                )
-                
-                if response and response.text:
-                    print(f"✅ Monthly recap generated using {model_name}!")
-                    recap_text = response.text.strip()
-                    
-                    # Log successful API usage
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "monthly_recap")
-                    
-                    # Post-process: remove intro text and tags from overview section
-                    recap_text = _remove_intro_text(recap_text)
-                    recap_text = _remove_market_section_tags(recap_text)
-                    
-                    # Limit tags
-                    recap_text = _limit_tags_in_text(recap_text, selected_tags, MAX_TAGS_PER_POST)
-                    
-                    return "\n" + recap_text + "\n"
-                else:
-                    print(f"⚠️  Empty response from {model_name}")
-                    continue
-                    
-            except Exception as model_error:
-                error_msg = str(model_error).lower()
-                print(f"⚠️  Model {model_name} failed: {model_error}")
-                if API_TRACKER_AVAILABLE:
-                    log_api_request(model_name, False, "monthly_recap")
-                
-                # 503 UNAVAILABLE — retry with 10-minute intervals up to 5 times
-                if '503' in error_msg or 'unavailable' in error_msg:
-                    max_503_retries = 5
-                    retry_wait_secs = 600
-                    succeeded = False
-                    for attempt in range(1, max_503_retries + 1):
-                        print(f"   503 on {model_name} (retry {attempt}/{max_503_retries}), waiting {retry_wait_secs}s...")
-                        time.sleep(retry_wait_secs)
-                        try:
-                            response = client.models.generate_content(
-                                model=model_name,
-                                contents=prompt,
-                                config=config
-                            )
-                            if response and response.text:
-                                print(f"✅ Monthly recap generated (after 503 retry {attempt}) using {model_name}!")
-                                if API_TRACKER_AVAILABLE:
-                                    log_api_request(model_name, True, "monthly_recap")
-                                recap_text = response.text.strip()
-                                recap_text = _remove_intro_text(recap_text)
-                                recap_text = _remove_market_section_tags(recap_text)
-                                recap_text = _limit_tags_in_text(recap_text, selected_tags, MAX_TAGS_PER_POST)
-                                succeeded = True
-                                return "\n" + recap_text + "\n"
-                        except Exception as e2:
-                            retry_msg = str(e2).lower()
-                            if '503' not in retry_msg and 'unavailable' not in retry_msg:
-                                print(f"   Non-503 error on 503-retry {attempt}: {e2}")
-                                break
-                    if not succeeded:
-                        last_error = model_error
-                    continue
-                
-                time.sleep(2)
-                
-                # Try without tools if not supported (exclude 404 NOT_FOUND from this branch)
-                is_tool_issue = ('not supported' in error_msg or 'invalid' in error_msg) and '404' not in error_msg
-                if is_tool_issue:
-                    try:
-                        response = client.models.generate_content(
-                            model=model_name,
-                            contents=prompt
-                        )
-                        if response and response.text:
-                            print(f"✅ Monthly recap generated (no tools) using {model_name}!")
-                            if API_TRACKER_AVAILABLE:
-                                log_api_request(model_name, True, "monthly_recap")
-                            recap_text = response.text.strip()
-                            recap_text = _remove_intro_text(recap_text)
-                            recap_text = _remove_market_section_tags(recap_text)
-                            recap_text = _limit_tags_in_text(recap_text, selected_tags, MAX_TAGS_PER_POST)
-                            return "\n" + recap_text + "\n"
-                    except Exception as e2:
-                        print(f"   Retry failed: {e2}")
-                
-                continue
-        
-        print("❌ All models failed for monthly recap")
-        return ""
+        recap_text, _ = gemini_gateway.generate(
+            prompt, "monthly_recap", temperature=0.7, search=True,
+            deadline_seconds=gemini_gateway.GEMINI_RECAP_DEADLINE_SECONDS
+        )
+        if not recap_text:
+            print("❌ All models failed for monthly recap")
+            return ""
+
+        # Post-process: remove intro text and tags from overview section
+        recap_text = _remove_intro_text(recap_text)
+        recap_text = _remove_market_section_tags(recap_text)
+
+        # Limit tags
+        recap_text = _limit_tags_in_text(recap_text, selected_tags, MAX_TAGS_PER_POST)
+
+        return "\n" + recap_text + "\n"
         
     except Exception as e:
         print(f"❌ Error generating monthly recap: {e}")
@@ -806,9 +685,6 @@ def generate_market_news_recap(max_tags=MAX_TAGS_PER_POST, excluded_tags=None, m
         print("⚠️  Warning: GEMINI_API_KEY not set, skipping AI news generation")
         return ""
     
-    # Models in order of preference — each belongs to a DIFFERENT quota bucket (20 RPD each).
-    # gemini-2.5-flash-lite is first (10 RPM vs 5 RPM).
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
     
     if not market_session:
         market_session = os.environ.get('MARKET_SESSION', 'Daily recap')
@@ -825,12 +701,9 @@ def generate_market_news_recap(max_tags=MAX_TAGS_PER_POST, excluded_tags=None, m
             allowed_tickers = US_TICKERS
             
     try:
-        # Configure Gemini client
-        client = genai.Client(api_key=api_key)
-        
         # Build the full list of allowed tickers for tag validation
         # (broader than the rotation-selected subset — any valid portfolio ticker is OK)
-        all_allowed_for_validation = list(PORTFOLIO_TICKERS.keys())
+        all_allowed_for_validation = list(get_tickers().keys())
         
         # Select tags for this post (with rotation)
         selected_tags = []
@@ -856,7 +729,7 @@ def generate_market_news_recap(max_tags=MAX_TAGS_PER_POST, excluded_tags=None, m
         # Get all portfolio tickers for context with descriptions (exclude Russian stocks)
         excluded_tickers = {'MNODL.L', 'NVTKL.L'}
         portfolio_items = []
-        for t, (_, descr) in PORTFOLIO_TICKERS.items():
+        for t, (_, descr) in get_tickers().items():
             if t not in excluded_tickers:
                 portfolio_items.append(f"{t} ({descr})")
         portfolio_context = ", ".join(portfolio_items)
@@ -996,145 +869,34 @@ def generate_market_news_recap(max_tags=MAX_TAGS_PER_POST, excluded_tags=None, m
         print("🤖 Generating AI market news recap...")
         print(f"   Selected tags for this post: {selected_tags_str}")
         
-        # Configure search tool if available in the SDK
-        config = None
-        try:
-            config = types.GenerateContentConfig(
-                tools=[types.Tool(google_search=types.GoogleSearch())],
-                temperature=0.7
-            )
-        except Exception as config_err:
-            print(f"⚠️ Could not initialize Google Search tool: {config_err}")
-            config = types.GenerateContentConfig(temperature=0.7)
-
-        # Try each model until one works
-        last_error = None
-        for model_name in models_to_try:
-            try:
-                print(f"   Trying model: {model_name}...")
-                
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config
-                )
-                
-                if response and response.text:
-                    print(f"✅ AI news recap generated successfully using {model_name}!")
-                    recap_text = response.text.strip()
-                    
-                    # Log successful API usage
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "daily_recap")
-                    
-                    # Post-process: remove intro text and any $ tags from market section
-                    recap_text = _remove_intro_text(recap_text)
-                    recap_text = _remove_market_section_tags(recap_text)
-                    
-                    # Post-process: ensure only valid portfolio tags are used and limit count
-                    recap_text = _limit_tags_in_text(recap_text, all_allowed_for_validation, max_tags)
-                    recap_text = _clean_robotic_phrases(recap_text)
-                    
-                    # Update rotation history with the tags actually selected for the post
-                    if selected_tags:
-                        update_rotation_history(selected_tags)
-                    
-                    # Save to history (using Gist storage)
-                    if GIST_STORAGE_AVAILABLE:
-                        save_to_history(recap_text)
-                    
-                    return "\n" + recap_text + "\n"
-                else:
-                    print(f"⚠️  Empty response from {model_name}, trying next model...")
-                    continue
-                    
-            except Exception as model_error:
-                error_msg = str(model_error).lower()
-                print(f"⚠️  Model {model_name} failed: {model_error}")
-                if API_TRACKER_AVAILABLE:
-                    log_api_request(model_name, False, "daily_recap")
-                
-                # 503 UNAVAILABLE at EU open (07:00 UTC) on gemini-2.5-flash typically
-                # lasts 30-50 minutes. Retry with 10-minute intervals (up to 5 times = 50 min
-                # max) before giving up and trying the next model.
-                if '503' in error_msg or 'unavailable' in error_msg:
-                    max_503_retries = 5
-                    retry_wait_secs = 600  # 10 minutes
-                    for attempt in range(1, max_503_retries + 1):
-                        print(f"   503 on {model_name} (retry {attempt}/{max_503_retries}), waiting {retry_wait_secs}s...")
-                        time.sleep(retry_wait_secs)
-                        try:
-                            response = client.models.generate_content(
-                                model=model_name,
-                                contents=prompt,
-                                config=config
-                            )
-                            if response and response.text:
-                                print(f"✅ AI news recap generated (after 503 retry {attempt}) using {model_name}!")
-                                if API_TRACKER_AVAILABLE:
-                                    log_api_request(model_name, True, "daily_recap")
-                                recap_text = response.text.strip()
-                                recap_text = _remove_intro_text(recap_text)
-                                recap_text = _remove_market_section_tags(recap_text)
-                                recap_text = _limit_tags_in_text(recap_text, all_allowed_for_validation, max_tags)
-                                if selected_tags:
-                                    update_rotation_history(selected_tags)
-                                if GIST_STORAGE_AVAILABLE:
-                                    save_to_history(recap_text)
-                                return "\n" + recap_text + "\n"
-                        except Exception as e2:
-                            retry_msg = str(e2).lower()
-                            if '503' not in retry_msg and 'unavailable' not in retry_msg:
-                                print(f"   Non-503 error on 503-retry {attempt}: {e2}")
-                                break  # different error, stop retrying this model
-                    last_error = model_error
-                    continue
-                
-                time.sleep(2)
-                
-                # 404 NOT_FOUND may include "not supported" in the message — check for actual
-                # tool-compatibility issues (not just model not found) by excluding 404 errors
-                is_tool_issue = ('not supported' in error_msg or 'invalid' in error_msg) and '404' not in error_msg
-                if is_tool_issue:
-                    print(f"   Model {model_name} might not support search tools, trying without...")
-                    try:
-                        response = client.models.generate_content(
-                            model=model_name,
-                            contents=prompt
-                        )
-                        if response and response.text:
-                            print(f"✅ AI news recap generated successfully (without tools) using {model_name}!")
-                            if API_TRACKER_AVAILABLE:
-                                log_api_request(model_name, True, "daily_recap")
-                            recap_text = response.text.strip()
-                            
-                            # Post-process
-                            recap_text = _remove_intro_text(recap_text)
-                            recap_text = _remove_market_section_tags(recap_text)
-                            recap_text = _limit_tags_in_text(recap_text, all_allowed_for_validation, max_tags)
-                            
-                            # Update rotation history with the tags actually selected for the post
-                            if selected_tags:
-                                update_rotation_history(selected_tags)
-                                
-                            if GIST_STORAGE_AVAILABLE:
-                                save_to_history(recap_text)
-                            return "\n" + recap_text + "\n"
-                    except Exception as e2:
-                        print(f"   Retry failed: {e2}")
-                
-                if 'quota' in error_msg or 'resource_exhausted' in error_msg or '429' in error_msg:
-                    print(f"   Quota exceeded for {model_name}, trying next model...")
-                    last_error = model_error
-                    continue
-                else:
-                    last_error = model_error
-                    continue
-        
-        # All models failed
-        print(f"❌ All models failed. Last error: {last_error}")
-        print("💡 Tip: Wait a few minutes for quota reset, or check your API key at https://makersuite.google.com/")
-        return ""
+        # 503 UNAVAILABLE at EU open (07:00 UTC) typically lasts 30-50 minutes, so the
+        # recap gets a long deadline to wait for a model to come back
+        recap_text, _ = gemini_gateway.generate(
+            prompt, "daily_recap", temperature=0.7, search=True,
+            deadline_seconds=gemini_gateway.GEMINI_RECAP_DEADLINE_SECONDS
+        )
+        if not recap_text:
+            print("❌ All models failed for AI news recap")
+            print("💡 Tip: Wait a few minutes for quota reset, or check your API key at https://makersuite.google.com/")
+            return ""
+
+        # Post-process: remove intro text and any $ tags from market section
+        recap_text = _remove_intro_text(recap_text)
+        recap_text = _remove_market_section_tags(recap_text)
+
+        # Post-process: ensure only valid portfolio tags are used and limit count
+        recap_text = _limit_tags_in_text(recap_text, all_allowed_for_validation, max_tags)
+        recap_text = _clean_robotic_phrases(recap_text)
+
+        # Update rotation history with the tags actually selected for the post
+        if selected_tags:
+            update_rotation_history(selected_tags)
+
+        # Save to history (using Gist storage)
+        if GIST_STORAGE_AVAILABLE:
+            save_to_history(recap_text)
+
+        return "\n" + recap_text + "\n"
             
     except Exception as e:
         print(f"❌ Error generating AI news recap: {e}")
@@ -1225,8 +987,6 @@ def generate_decision_post(
     if not api_key:
         return ""
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     weights_context = ""
     if current_weights:
         top_holdings = sorted(current_weights.items(), key=lambda x: x[1], reverse=True)[:8]
@@ -1260,27 +1020,12 @@ FORMAT: Plain text, no HTML. Use emojis naturally (2-3 max). No bullet lists.
 Output ONLY the post text, no introduction or explanation."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config = types.GenerateContentConfig(temperature=0.85)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config,
-                )
-                if response and response.text:
-                    print(f"✅ Decision post generated with {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "decision_post")
-                    return response.text.strip()
-            except Exception as exc:
-                print(f"⚠️ Decision post model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print("❌ All models failed for decision post")
-        return ""
+        text, _ = gemini_gateway.generate(prompt, "decision_post", temperature=0.85)
+        if not text:
+            print("❌ All models failed for decision post")
+            return ""
+
+        return text
 
     except Exception as exc:
         print(f"❌ Error generating decision post: {exc}")
@@ -1313,8 +1058,6 @@ def generate_empathy_post(
     if not api_key:
         return ""
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     # Determine emotional context
     if weekly_perf is not None and weekly_perf < -2:
         mood = f"difficult week (portfolio: {weekly_perf:+.1f}% this week)"
@@ -1352,27 +1095,12 @@ FORMAT: Plain text. 2-4 natural emojis. No bullet lists. Conversational paragrap
 Output ONLY the post text, no introduction or explanation."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config = types.GenerateContentConfig(temperature=0.90)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config,
-                )
-                if response and response.text:
-                    print(f"✅ Empathy post generated with {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "empathy_post")
-                    return response.text.strip()
-            except Exception as exc:
-                print(f"⚠️ Empathy post model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print("❌ All models failed for empathy post")
-        return ""
+        text, _ = gemini_gateway.generate(prompt, "empathy_post", temperature=0.90)
+        if not text:
+            print("❌ All models failed for empathy post")
+            return ""
+
+        return text
 
     except Exception as exc:
         print(f"❌ Error generating empathy post: {exc}")
@@ -1408,8 +1136,6 @@ def generate_copy_trading_post(
     if not api_key:
         return _copy_trading_fallback(history_stats_text, gain_history, portfolio_perf, rankings_data)
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     # Build rankings and copier context if available from live eToro API
     rankings_context = ""
     if rankings_data:
@@ -1497,27 +1223,12 @@ REGOLE OBBLIGATORIE:
 Output ONLY the Italian post text, no introduction or wrapping."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config = types.GenerateContentConfig(temperature=0.88)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config,
-                )
-                if response and response.text:
-                    print(f"✅ Copy trading post generated with {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "copy_trading_post")
-                    return response.text.strip()
-            except Exception as exc:
-                print(f"⚠️ Copy trading post model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print("❌ All models failed for copy trading post — using fallback")
-        return _copy_trading_fallback(history_stats_text, gain_history, portfolio_perf, rankings_data)
+        text, _ = gemini_gateway.generate(prompt, "copy_trading_post", temperature=0.88)
+        if not text:
+            print("❌ All models failed for copy trading post — using fallback")
+            return _copy_trading_fallback(history_stats_text, gain_history, portfolio_perf, rankings_data)
+
+        return text
 
     except Exception as exc:
         print(f"❌ Error generating copy trading post: {exc}")
@@ -1627,13 +1338,11 @@ def generate_stock_focus_post(ticker: str = None) -> tuple[str, str]:
         print("⚠️ GEMINI_API_KEY not set, skipping stock focus post generation")
         return ticker, ""
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     # Fetch live weight for this specific ticker
     weight_str = ""
     try:
-        from finance_fetcher import fetch_portfolio_weights
-        weights = fetch_portfolio_weights()
+        import market_context
+        weights = market_context.get_context().portfolio_weights()
         w = weights.get(ticker, 0.0)
         if w > 0:
             weight_str = f"- Peso attuale certificato in portafoglio: {w:.2f}%\n"
@@ -1663,28 +1372,13 @@ REGOLE PER IL TESTO (in ITALIANO):
 Output ONLY the post text in Italian, no extra conversational preamble."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config_gen = types.GenerateContentConfig(temperature=0.85)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config_gen,
-                )
-                if response and response.text:
-                    print(f"✅ Stock Focus post generated for {ticker} using {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "stock_focus_post")
-                    cleaned_post = _clean_robotic_phrases(response.text.strip())
-                    return ticker, cleaned_post
-            except Exception as exc:
-                print(f"⚠️ Stock focus model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print(f"❌ All models failed for stock focus post on {ticker}")
-        return ticker, ""
+        text, _ = gemini_gateway.generate(prompt, "stock_focus_post", temperature=0.85)
+        if not text:
+            print(f"❌ All models failed for stock focus post on {ticker}")
+            return ticker, ""
+
+        cleaned_post = _clean_robotic_phrases(text)
+        return ticker, cleaned_post
 
     except Exception as exc:
         print(f"❌ Error generating stock focus post: {exc}")
@@ -1714,8 +1408,6 @@ def generate_weekly_portfolio_outlook() -> str:
         print("⚠️ GEMINI_API_KEY not set, skipping portfolio outlook post")
         return ""
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     prompt = f"""Sei Andrea Ravalli, un investitore privato italiano su eToro.
 Scrivi il post del Sabato pomeriggio per i tuoi follower e copier focalizzato su:
 "COSA CI ASPETTA NELLA PROSSIMA SETTIMANA PER I TITOLI IN PORTAFOGLIO".
@@ -1736,27 +1428,12 @@ REGOLE PER IL TESTO (in ITALIANO):
 Output ONLY the post text in Italian."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config_gen = types.GenerateContentConfig(temperature=0.85)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config_gen,
-                )
-                if response and response.text:
-                    print(f"✅ Portfolio Outlook post generated using {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "portfolio_outlook_post")
-                    return response.text.strip()
-            except Exception as exc:
-                print(f"⚠️ Portfolio outlook model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print("❌ All models failed for portfolio outlook post")
-        return ""
+        text, _ = gemini_gateway.generate(prompt, "portfolio_outlook_post", temperature=0.85)
+        if not text:
+            print("❌ All models failed for portfolio outlook post")
+            return ""
+
+        return text
 
     except Exception as exc:
         print(f"❌ Error generating portfolio outlook post: {exc}")
@@ -1780,8 +1457,6 @@ def generate_weekly_macro_outlook() -> str:
         print("⚠️ GEMINI_API_KEY not set, skipping macro outlook post")
         return ""
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     prompt = f"""Sei Andrea Ravalli, un investitore privato italiano su eToro.
 Scrivi il post del Sabato pomeriggio per i tuoi follower e copier focalizzato su:
 "COSA CI ASPETTA NELLA PROSSIMA SETTIMANA A LIVELLO MACROECONOMICO GLOBALE".
@@ -1799,27 +1474,12 @@ REGOLE PER IL TESTO (in ITALIANO):
 Output ONLY the post text in Italian."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config_gen = types.GenerateContentConfig(temperature=0.85)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config_gen,
-                )
-                if response and response.text:
-                    print(f"✅ Global Macro Outlook post generated using {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "macro_outlook_post")
-                    return response.text.strip()
-            except Exception as exc:
-                print(f"⚠️ Macro outlook model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print("❌ All models failed for macro outlook post")
-        return ""
+        text, _ = gemini_gateway.generate(prompt, "macro_outlook_post", temperature=0.85)
+        if not text:
+            print("❌ All models failed for macro outlook post")
+            return ""
+
+        return text
 
     except Exception as exc:
         print(f"❌ Error generating macro outlook post: {exc}")
@@ -1907,8 +1567,6 @@ La sessione evidenzia una fase di consolidamento con volumi e sentiment allineat
         print("ℹ️ GEMINI_API_KEY missing, using high-quality fallback template for crypto recap")
         return "Daily crypto recap", fallback_text
 
-    models_to_try = list(DEFAULT_GEMINI_MODELS)
-
     prompt = f"""Sei Andrea Ravalli, un Popular Investor italiano su eToro.
 Scrivi un post giornaliero in ITALIANO dedicato all'aggiornamento del mercato CRYPTO da pubblicare su eToro e Telegram.
 
@@ -1929,28 +1587,13 @@ REGOLE PER IL POST:
 Output ONLY the post text in Italian."""
 
     try:
-        client = genai.Client(api_key=api_key)
-        config_gen = types.GenerateContentConfig(temperature=0.8)
-
-        for model_name in models_to_try:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config_gen,
-                )
-                if response and response.text:
-                    print(f"✅ Crypto Daily Recap post generated using {model_name}")
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "crypto_daily_post")
-                    cleaned_post = _clean_robotic_phrases(response.text.strip())
-                    return "Daily crypto recap", cleaned_post
-            except Exception as exc:
-                print(f"⚠️ Crypto recap model {model_name} failed: {exc}")
-                time.sleep(1)
-
-        print("❌ All models failed for crypto recap post, using fallback")
-        return "Daily crypto recap", fallback_text
+        text, _ = gemini_gateway.generate(prompt, "crypto_daily_post", temperature=0.8)
+        if not text:
+            print("❌ All models failed for crypto recap post, using fallback")
+            return "Daily crypto recap", fallback_text
+
+        cleaned_post = _clean_robotic_phrases(text)
+        return "Daily crypto recap", cleaned_post
 
     except Exception as exc:
         print(f"❌ Error generating crypto recap post: {exc}")
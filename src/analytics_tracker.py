@@ -8,7 +8,8 @@ and generates an interactive HTML dashboard for GitHub Pages.
 
 import os
 import json
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, List, Optional
 import etoro_client
 import gist_storage
@@ -22,6 +23,13 @@ DOCS_INDEX_HTML = os.path.join(
     "docs", "index.html"
 )
 
+# Posts older than this stop collecting engagement: they get one last sync, then are frozen
+ENGAGEMENT_WINDOW_DAYS = int(os.environ.get("ENGAGEMENT_WINDOW_DAYS", "14"))
+# Failed final syncs after which a post past the window is frozen anyway (deleted or unreachable posts)
+FINAL_SYNC_ATTEMPTS = int(os.environ.get("FINAL_SYNC_ATTEMPTS", "3"))
+# Concurrent get_post_metrics() calls (each one is two requests on the pooled eToro session)
+METRICS_SYNC_WORKERS = int(os.environ.get("METRICS_SYNC_WORKERS", "4"))
+
 
 def load_local_analytics() -> Dict[str, Any]:
     """Load analytics database from local disk or initialize default structure."""
@@ -59,6 +67,7 @@ def load_local_analytics() -> Dict[str, Any]:
 def save_local_analytics(data: Dict[str, Any]):
     """Save analytics database to local disk."""
     os.makedirs(os.path.dirname(ANALYTICS_FILE), exist_ok=True)
+    gist_storage.compact(data, gist_storage.ANALYTICS_RETENTION_POLICIES)
     data["last_updated"] = datetime.utcnow().isoformat()
     with open(ANALYTICS_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
@@ -114,29 +123,67 @@ def record_post(
     print(f"📊 Analytics: Recorded {platform} post {post_id} ({session_name})")
 
 
-def sync_etoro_metrics() -> Dict[str, Any]:
+def _is_in_engagement_window(post: Dict[str, Any], cutoff: datetime) -> bool:
+    """True if the post was published after `cutoff` (unknown dates count as recent)."""
+    try:
+        published = datetime.fromisoformat(post.get("published_at", "").replace("Z", "+00:00"))
+    except ValueError:
+        return True
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published >= cutoff
+
+
+def sync_etoro_metrics(window_days: Optional[int] = None) -> Dict[str, Any]:
     """
-    Poll live engagement metrics from eToro API for all tracked posts.
+    Poll live engagement metrics from eToro API for the tracked posts that can still change.
+
+    Only posts published within the engagement window (`window_days`, default
+    ENGAGEMENT_WINDOW_DAYS) are refreshed. A post that has left the window gets one
+    final sync (retried up to FINAL_SYNC_ATTEMPTS runs if it fails) and is then frozen, so runtime no longer grows with the post history.
+    Due posts are fetched concurrently on a pool of METRICS_SYNC_WORKERS threads.
     """
     data = load_local_analytics()
     posts = data.get("posts", [])
-    updated_count = 0
+    window_days = ENGAGEMENT_WINDOW_DAYS if window_days is None else window_days
+    sync_started = datetime.utcnow()
+    cutoff = sync_started.replace(tzinfo=timezone.utc) - timedelta(days=window_days)
+
+    due = [
+        p for p in posts
+        if p.get("platform") == "etoro" and p.get("id") and not p.get("frozen")
+    ]
+    frozen_count = sum(1 for p in posts if p.get("platform") == "etoro" and p.get("frozen"))
+
+    results = []
+    if due:
+        workers = min(METRICS_SYNC_WORKERS, len(due))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="etoro-metrics") as pool:
+            results = list(pool.map(lambda p: etoro_client.get_post_metrics(p["id"]), due))
 
-    for p in posts:
-        if p.get("platform") == "etoro" and p.get("id"):
-            post_id = p["id"]
-            metrics = etoro_client.get_post_metrics(post_id)
-            if metrics:
-                p["likes"] = metrics.get("likes", 0)
-                p["comments"] = metrics.get("comments", 0)
-                p["shares"] = metrics.get("shares", 0)
-                p["last_synced"] = datetime.utcnow().isoformat()
-                updated_count += 1
+    updated_count = 0
+    for p, metrics in zip(due, results):
+        if metrics:
+            p["likes"] = metrics.get("likes", 0)
+            p["comments"] = metrics.get("comments", 0)
+            p["shares"] = metrics.get("shares", 0)
+            p["last_synced"] = datetime.utcnow().isoformat()
+            updated_count += 1
+        if _is_in_engagement_window(p, cutoff):
+            continue
+        # Past the window the counts are final: freeze after the last successful sync, or once
+        # the final sync has failed FINAL_SYNC_ATTEMPTS times (deleted posts keep their last values)
+        if not metrics:
+            p["final_sync_failures"] = p.get("final_sync_failures", 0) + 1
+        if metrics or p["final_sync_failures"] >= FINAL_SYNC_ATTEMPTS:
+            p["frozen"] = True
 
     # Remove any old seed/deleted posts that returned 404
     data["posts"] = [p for p in posts if p.get("id") not in ["41f4c7dc-402a-4ce6-a7fe-49b819f074d2", "fb2dfe40-9d61-11f1-8080-800019b76646"]]
+    data["metrics_synced_at"] = sync_started.isoformat()
     save_local_analytics(data)
-    print(f"✓ Synced engagement metrics for {updated_count} eToro posts")
+    print(f"✓ Synced engagement metrics for {updated_count}/{len(due)} eToro posts "
+          f"({frozen_count} older than {window_days} days frozen)")
     return data
 
 
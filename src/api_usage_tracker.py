@@ -8,15 +8,27 @@ output/gemini_api_usage.json for the artifact upload.
 """
 
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo('America/Los_Angeles')
+except Exception:
+    QUOTA_TZ = timezone(timedelta(hours=-8))
+
 # File to store API usage data (local, per-run copy for artifact upload)
 USAGE_FILE = Path("output/gemini_api_usage.json")
 
 # Gist key used to persist usage across runs
 GIST_KEY = "gemini_api_usage"
 
+# Gemini daily quotas reset at midnight Pacific time (QUOTA_TZ above)
+def quota_date(now: datetime = None) -> str:
+    """The Gemini quota day (YYYY-MM-DD, Pacific time) that `now` (default: now) falls in."""
+    return (now or datetime.now(timezone.utc)).astimezone(QUOTA_TZ).strftime("%Y-%m-%d")
+
+
 # Lazy-import gist_storage so this module works even without it
 try:
     import gist_storage as _gist
@@ -111,6 +123,10 @@ def log_api_request(model_name: str, success: bool, request_type: str = "recap")
     else:
         data["summary"]["daily"][today]["by_model"][model_name]["failed"] += 1
     
+    # Per-model count for the quota day (resets at midnight Pacific, not on the local date)
+    quota_day = data["summary"].setdefault("quota_daily", {}).setdefault(quota_date(), {})
+    quota_day[model_name] = quota_day.get(model_name, 0) + 1
+
     # Monthly count
     if this_month not in data["summary"]["monthly"]:
         data["summary"]["monthly"][this_month] = {"total": 0, "successful": 0, "failed": 0}
@@ -124,6 +140,11 @@ def log_api_request(model_name: str, success: bool, request_type: str = "recap")
     save_usage_data(data)
     print(f"📊 API usage logged: {model_name} ({'✅' if success else '❌'})")
 
+def get_model_usage(day: str = None) -> dict:
+    """Return {model: requests attempted} for the quota `day` (YYYY-MM-DD, default the current one)."""
+    day = day or quota_date()
+    return dict(load_usage_data().get("summary", {}).get("quota_daily", {}).get(day, {}))
+
 def generate_usage_report():
     """Generate a human-readable usage report"""
     data = load_usage_data()
@@ -4,17 +4,22 @@ import seaborn as sns
 import pandas as pd
 import os
 import matplotlib.dates as mdates
+import market_context
 
-def generate_performance_chart(portfolio_series, benchmark_df, output_path='output/performance_chart.png'):
+def generate_performance_chart(portfolio_series, benchmark_df=None, output_path='output/performance_chart.png'):
     """
     Generate a line chart comparing portfolio performance vs benchmarks.
     
     Args:
         portfolio_series (pd.Series): Cumulative return of portfolio % (index is Date)
-        benchmark_df (pd.DataFrame): Cumulative return of benchmarks % (index is Date, cols are tickers)
+        benchmark_df (pd.DataFrame): Cumulative return of benchmarks % (index is Date, cols are tickers).
+            Defaults to the run's shared benchmark history since 2020.
         output_path (str): Path to save the image
     """
     print("📊 Generating performance chart...")
+
+    if benchmark_df is None:
+        benchmark_df = market_context.get_context().benchmark_history(start_date='2020-01-01')
     
     # Set dark theme
     plt.style.use('dark_background')
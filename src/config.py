@@ -1,18 +1,28 @@
 """
 Configuration file for portfolio ticker mappings, company names, and emoji
+
+PORTFOLIO_TICKERS and EMOJI_MAP are resolved on first access from the memoized
+portfolio_manager snapshot, so importing this module does no network I/O.
 """
 
 import os
-from portfolio_manager import get_tickers, get_emojis
+import portfolio_manager
+
+_LAZY_SETTINGS = {
+    'PORTFOLIO_TICKERS': portfolio_manager.get_tickers,
+    'EMOJI_MAP': portfolio_manager.get_emojis,
+}
+
 
-# Load dynamically from JSON
-try:
-    PORTFOLIO_TICKERS = get_tickers()
-    EMOJI_MAP = get_emojis()
-except Exception:
-    # Fallback if manager fails or during migration
-    PORTFOLIO_TICKERS = {}
-    EMOJI_MAP = {}
+def __getattr__(name):
+    """Load PORTFOLIO_TICKERS / EMOJI_MAP on first access (always the current snapshot)."""
+    if name not in _LAZY_SETTINGS:
+        raise AttributeError(f"module 'config' has no attribute '{name}'")
+    try:
+        return _LAZY_SETTINGS[name]()
+    except Exception:
+        # Fallback if manager fails or during migration
+        return {}
 
 # Google Sheets configuration
 GOOGLE_SHEETS_ID = os.environ.get('SPREADSHEET_ID', '1jK6MlFxO6Im0eBfUP1eOjzW0Nii87jABEHiBnsjP52U')
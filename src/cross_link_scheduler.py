@@ -31,6 +31,7 @@ if os.path.exists(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(_
                 os.environ[k.strip()] = v.strip()
 
 import etoro_client
+import market_context
 from etoro_sender import _strip_html
 
 # ── 1. ASSET PROFILES BY CATEGORY ─────────────────────────────────────────────
@@ -243,6 +244,10 @@ def select_dynamic_assets(
     def_selected = None
     etf_selected = None
 
+    # Fall back to the prices already loaded in this run (never triggers a fetch)
+    if market_data is None:
+        market_data = market_context.get_context().get('stock_data')
+
     if market_data and isinstance(market_data, dict):
         # Pick top traded / mover if present
         def _best_mover(keys: List[str]) -> Optional[str]:
@@ -332,12 +337,13 @@ def build_dynamic_cross_link_comments(
 
 def run_comments_sequence(
     post_id: str,
-    interval_seconds: int = 5,
+    interval_seconds: int = 0,
     session_name: Optional[str] = None,
     market_data: Optional[Dict[str, Any]] = None
 ):
     """
-    Publish all 3 specialized comments spaced by `interval_seconds` (default 5s).
+    Publish all 3 specialized comments, paced by the eToro comment budget (5s apart
+    by default, see etoro_client.WRITE_BUDGETS) plus an optional extra `interval_seconds`.
     """
     comments = build_dynamic_cross_link_comments(
         session_name=session_name,
@@ -346,7 +352,8 @@ def run_comments_sequence(
 
     print("=" * 60)
     print(f"🚀 STARTING DYNAMIC 3-COMMENT CROSSLINKING SEQUENCE ON POST: {post_id}")
-    print(f"⏱️ Interval between comments: {interval_seconds}s")
+    if interval_seconds:
+        print(f"⏱️ Interval between comments: {interval_seconds}s")
     for idx, c in enumerate(comments, 1):
         print(f"   • Comment {idx}: {c['name']}")
     print("=" * 60)
@@ -370,7 +377,7 @@ def run_comments_sequence(
         else:
             print(f"❌ Comment {idx} failed: {res.get('error')}")
 
-        if idx < len(comments):
+        if interval_seconds and idx < len(comments):
             print(f"⏳ Waiting {interval_seconds}s before next comment...")
             time.sleep(interval_seconds)
 
@@ -381,7 +388,7 @@ def run_comments_sequence(
 
 if __name__ == "__main__":
     target_post = sys.argv[1] if len(sys.argv) > 1 else "41f4c7dc-402a-4ce6-a7fe-49b819f074d2"
-    delay = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    delay = int(sys.argv[2]) if len(sys.argv) > 2 else 0
     
     # Preview generated dynamic comments
     print("\n📋 PREVIEW OF DYNAMIC 3-TYPE COMMENTS:\n")
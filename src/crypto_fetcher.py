@@ -13,6 +13,8 @@ import time
 import requests
 from typing import Dict, Any, List, Optional
 
+import yahoo_fetch
+
 # Supported eToro Cryptos Metadata
 CRYPTO_METADATA = {
     "BTC": {
@@ -213,18 +215,20 @@ def fetch_crypto_from_binance(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
 
 def fetch_crypto_from_yfinance(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
     """
-    Fallback: fetch crypto data using yfinance.
+    Fallback: fetch crypto data using yfinance (symbols fetched concurrently via yahoo_fetch).
     """
     results = {}
     try:
         import yfinance as yf
-        for sym in symbols:
-            clean_sym = sym.upper().replace("$", "").replace("-USD", "")
+        clean_syms = [sym.upper().replace("$", "").replace("-USD", "") for sym in symbols]
+
+        def _history(clean_sym):
+            meta = CRYPTO_METADATA.get(clean_sym, {})
+            return yf.Ticker(meta.get("yahoo_symbol", f"{clean_sym}-USD")).history(period="5d")
+
+        for clean_sym, hist in zip(clean_syms, yahoo_fetch.map_concurrent(_history, clean_syms)):
             meta = CRYPTO_METADATA.get(clean_sym, {})
-            yf_ticker = meta.get("yahoo_symbol", f"{clean_sym}-USD")
-            t = yf.Ticker(yf_ticker)
-            hist = t.history(period="5d")
-            if len(hist) >= 2:
+            if hist is not None and len(hist) >= 2:
                 cur_price = float(hist["Close"].iloc[-1])
                 prev_price = float(hist["Close"].iloc[-2])
                 change_24h = ((cur_price - prev_price) / prev_price) * 100
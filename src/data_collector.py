@@ -13,6 +13,8 @@ sys.path.insert(0, os.path.dirname(__file__))
 import pandas as pd
 import finance_fetcher
 import gist_storage
+import market_context
+import pipeline
 import formatter
 import social_publisher
 import chart_generator
@@ -20,42 +22,79 @@ import pie_chart_generator
 import cover_generator
 import winners_losers_card
 import etoro_history
+import portfolio_manager
 
-def main():
-    """
-    Main function to orchestrate data collection and recap generation
-    """
-    
-    print("Starting daily portfolio recap generation...~")
-    print("=" * 50)
-    
-    # Step 1: Get yfinance data for all symbols
-    stock_data = finance_fetcher.fetch_stock_data()
+# ---------------------------------------------------------------------------
+# Pipeline stages
+# Each stage reads its inputs from `state` and returns a dict of outputs.
+# ---------------------------------------------------------------------------
+
+# Open sessions only report today's move: a quote refresh replaces the 1y history load
+QUOTE_REFRESH_SESSIONS = ('european market open', 'u.s. market open')
+
+
+def stage_stock_data(state):
+    """Step 1: Get yfinance data for all symbols."""
+    if state['market_session'].lower() in QUOTE_REFRESH_SESSIONS:
+        stock_data = state['ctx'].quote_stock_data()
+    else:
+        stock_data = state['ctx'].stock_data()
     print(f"Successfully fetched data for {len(stock_data)} symbols")
     print("=" * 50)
-    
-    # Step 2: Calculate portfolio daily performance (will auto-fetch weights from BullAware)
-    # We fetch weights once to reuse them for both Daily and YTD calculations
+    return {'stock_data': stock_data}
+
+
+def stage_portfolio_weights(state):
+    """Step 2: Fetch weights once to reuse them for Daily, YTD, period changes and pie charts."""
     print("📊 Fetching portfolio weights...")
-    portfolio_weights = finance_fetcher.fetch_portfolio_weights_from_bullaware()
-    
-    portfolio_daily = finance_fetcher.calculate_portfolio_daily_change(stock_data, portfolio_weights)
+    return {'portfolio_weights': state['ctx'].portfolio_weights()}
+
+
+def stage_portfolio_sync(state):
+    """Step 2a: Align the stored portfolio config with the live positions (saved only on change)."""
+    try:
+        return {'portfolio_sync': portfolio_manager.sync_portfolio(state['portfolio_weights'])}
+    except Exception as e:
+        print(f"Error during portfolio sync: {e}")
+        return {}
+
+
+def stage_attribution(state):
+    """Step 2b: Weighted returns and per-position contributions for every period in one pass."""
+    attribution = finance_fetcher.calculate_portfolio_attribution(state['stock_data'], state['portfolio_weights'])
+    return {'attribution': attribution}
+
+
+def stage_portfolio_daily(state):
+    """Step 2c: Calculate portfolio daily performance."""
+    portfolio_daily = finance_fetcher.calculate_portfolio_weighted_change(
+        state['stock_data'], state['portfolio_weights'], metric='daily_change', attribution=state['attribution'])
     print(f"Portfolio daily performance: {portfolio_daily:.2f}%")
     print("=" * 50)
-    
-    # Step 2b: Get reliable Portfolio YTD (Annual Yield) from eToro public API
-    # Data comes directly from eToro's stats page - no auth required
+    return {'portfolio_daily': portfolio_daily}
+
+
+def stage_portfolio_ytd(state):
+    """Step 2d: Get reliable Portfolio YTD (Annual Yield) from eToro public API."""
     print("📈 Fetching Portfolio YTD from eToro...")
-    portfolio_ytd = finance_fetcher.fetch_portfolio_ytd_from_etoro()
-    
-    # Fallback to calculated YTD if BullAware fails
-    if portfolio_ytd is None:
-        print("⚠️ Falling back to calculated YTD from market data...")
-        portfolio_ytd = finance_fetcher.calculate_portfolio_ytd(stock_data, portfolio_weights)
-    
-    # Step 3: Compute cumulative performance from eToro monthly history + YTD
+    return {'portfolio_ytd': state['ctx'].portfolio_ytd()}
+
+
+def stage_portfolio_history(state):
+    """Step 3a: eToro monthly history (cumulative series since 2020)."""
+    return {'port_hist_etoro': state['ctx'].portfolio_history(start_year=2020)}
+
+
+def stage_cumulative_perf(state):
+    """Step 3b: Compute cumulative performance from eToro monthly history + YTD."""
     print("📊 Computing cumulative performance from eToro data...")
-    port_hist_etoro = finance_fetcher.fetch_portfolio_history_from_etoro(start_year=2020)
+    portfolio_ytd = state['portfolio_ytd']
+
+    # Fallback to calculated YTD from market data (only when prices are part of this session)
+    if portfolio_ytd is None and state.get('stock_data'):
+        print("⚠️ Falling back to calculated YTD from market data...")
+        portfolio_ytd = finance_fetcher.calculate_portfolio_ytd(state['stock_data'], state.get('portfolio_weights'))
+    port_hist_etoro = state['port_hist_etoro']
     five_year_return = 156.0  # fallback (approx cumulative from 2020)
     if port_hist_etoro is not None and not port_hist_etoro.empty and portfolio_ytd is not None:
         current_year = pd.Timestamp.now().year
@@ -76,89 +115,78 @@ def main():
         'dividend': None
     }
     print("=" * 50)
-    
-    # Step 4: Get benchmark comparison data
-    benchmark_data = finance_fetcher.fetch_benchmarks_performance(start_date='2020-01-01')
+    return {'five_year_return': five_year_return, 'sheets_data': sheets_data}
+
+
+def stage_benchmarks(state):
+    """Step 4: Get benchmark comparison data."""
+    benchmark_data = state['ctx'].benchmark_performance(start_date='2020-01-01')
     print("=" * 50)
-    
-    # Step 4b: Calculate weekly/monthly performance if needed
-    market_session = os.getenv('MARKET_SESSION', 'Daily recap')
-    is_weekly = "WEEKLY" in market_session.upper()
-    is_monthly = "MONTHLY" in market_session.upper()
-    
-    portfolio_weekly = None
-    portfolio_monthly = None
-    
-    if is_weekly:
+    return {'benchmark_data': benchmark_data}
+
+
+def stage_period_perf(state):
+    """Step 4b: Calculate weekly/monthly performance if needed."""
+    market_session = state['market_session']
+    outputs = {}
+
+    if "WEEKLY" in market_session.upper():
         print("📊 Calculating WEEKLY portfolio performance...")
-        portfolio_weekly = finance_fetcher.calculate_portfolio_weighted_change(stock_data, portfolio_weights, metric='weekly_change')
+        outputs['portfolio_weekly'] = finance_fetcher.calculate_portfolio_weighted_change(
+            state['stock_data'], state['portfolio_weights'], metric='weekly_change', attribution=state['attribution'])
         print("=" * 50)
-    
-    if is_monthly:
+
+    if "MONTHLY" in market_session.upper():
         print("📊 Calculating MONTHLY portfolio performance...")
-        portfolio_monthly = finance_fetcher.calculate_portfolio_weighted_change(stock_data, portfolio_weights, metric='monthly_change')
+        outputs['portfolio_monthly'] = finance_fetcher.calculate_portfolio_weighted_change(
+            state['stock_data'], state['portfolio_weights'], metric='monthly_change', attribution=state['attribution'])
         print("=" * 50)
-    
-    
-    # Step 5: Generate Performance Chart
+
+    return outputs
+
+
+def stage_perf_history(state):
+    """Step 5a: Load perf history from Gist (replaces Sheets "Storico" tab)."""
+    return {'port_hist': gist_storage.get_perf_history()}
+
+
+def stage_perf_chart(state):
+    """Step 5b: Update the Gist perf history / ATH and generate the performance chart."""
     print("📈 Generating performance comparison chart...")
     chart_path = None
     ath_distance = None
     try:
-        current_perf = five_year_return
-
-        # Load history from Gist (replaces Sheets "Storico" tab)
-        port_hist_records = gist_storage.get_perf_history()
-
-        if port_hist_records:
-            df = pd.DataFrame(port_hist_records)
-            df['Date'] = pd.to_datetime(df['date'])
-            df.rename(columns={'perf': 'Performance', 'ath': 'ATH'}, inplace=True)
-            port_hist = df[['Date', 'Performance', 'ATH']].reset_index(drop=True)
-        else:
-            port_hist = None
+        current_perf = state['five_year_return']
+        port_hist_etoro = state['port_hist_etoro']
+        port_hist = state['port_hist']
 
         # Seed from eToro monthly history if Gist is empty
-        if port_hist is None or len(port_hist) < 2:
+        if len(port_hist) < 2:
             print("   ⚠️ No history in Gist, seeding from eToro monthly data...")
             if port_hist_etoro is not None and not port_hist_etoro.empty:
-                max_so_far = -999.0
-                seed_records = []
-                for index, current_cum in port_hist_etoro.items():
-                    current_cum = float(current_cum)
-                    if current_cum > max_so_far:
-                        max_so_far = current_cum
-                    seed_records.append({'date': index.strftime('%Y-%m-%d'), 'perf': current_cum, 'ath': max_so_far})
+                seed_records = [
+                    {'date': index.strftime('%Y-%m-%d'), 'perf': float(current_cum)}
+                    for index, current_cum in port_hist_etoro.items()
+                ]
                 gist_storage.seed_perf_history(seed_records)
-                port_hist_records = gist_storage.get_perf_history()
-                if port_hist_records:
-                    df = pd.DataFrame(port_hist_records)
-                    df['Date'] = pd.to_datetime(df['date'])
-                    df.rename(columns={'perf': 'Performance', 'ath': 'ATH'}, inplace=True)
-                    port_hist = df[['Date', 'Performance', 'ATH']].reset_index(drop=True)
-
-        ath_value = current_perf
-        if port_hist is not None and not port_hist.empty:
-            max_hist_perf = port_hist['Performance'].max()
-            ath_value = float(max(max_hist_perf, current_perf))
+                port_hist = gist_storage.get_perf_history()
+
+        if not port_hist.empty:
             current_perf_float = float(current_perf)
 
-            # Upsert today's snapshot into Gist
+            # Upsert today's snapshot into Gist; the index keeps the running ATH
             today_str = pd.Timestamp.now().strftime('%Y-%m-%d')
-            gist_storage.upsert_perf_record(today_str, current_perf_float, ath_value)
+            perf_index = gist_storage.upsert_perf_record(today_str, current_perf_float)
+            ath_value = perf_index.ath
 
-            # Prepare deduplicated series for chart
-            port_hist = port_hist.drop_duplicates(subset='Date', keep='last')
-            port_hist.set_index('Date', inplace=True)
-            port_series = port_hist['Performance']
+            # Dates are unique in the stored series, so it goes to the chart as is
+            port_series = port_hist.rename('Performance')
 
-            bench_hist = finance_fetcher.fetch_benchmarks_history(start_date='2020-01-01')
+            bench_hist = state['ctx'].benchmark_history(start_date='2020-01-01')
             if not bench_hist.empty:
                 chart_path = chart_generator.generate_performance_chart(port_series, bench_hist)
 
-            ath_distance = current_perf_float - ath_value
-            if ath_distance >= 0:
-                ath_distance = 0.0  # True new ATH
+            ath_distance = perf_index.drawdown  # 0.0 on a new ATH
             print(f"📊 Calculated ATH Distance: {ath_distance:.2f}% (ATH: {ath_value:.2f}%, Current: {current_perf_float:.2f}%)")
         else:
             print("⚠️ Skipping chart generation due to missing data")
@@ -168,24 +196,27 @@ def main():
         import traceback
         traceback.print_exc()
 
-    # Step 6: Generate formatted recap
+    return {'chart_path': chart_path, 'ath_distance': ath_distance}
+
+
+def stage_recap_text(state):
+    """Steps 6-7: Generate the formatted recap and save it to output/recap.txt."""
     recap = formatter.generate_recap(
-        stock_data, 
-        portfolio_daily, 
-        sheets_data, 
-        benchmark_data, 
-        portfolio_weekly=portfolio_weekly,
-        portfolio_monthly=portfolio_monthly,
-        ath_distance=ath_distance
+        state['stock_data'],
+        state['portfolio_daily'],
+        state['sheets_data'],
+        benchmark_data=state['benchmark_data'],
+        portfolio_weekly=state['portfolio_weekly'],
+        portfolio_monthly=state['portfolio_monthly'],
+        ath_distance=state['ath_distance']
     )
-    
-    # Step 7: Save to file
+
     os.makedirs('output', exist_ok=True)
     output_path = 'output/recap.txt'
-    
+
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(recap)
-    
+
     print(f"Recap saved to {output_path}")
     print("=" * 50)
     print("RECAP OUTPUT:")
@@ -193,39 +224,50 @@ def main():
     print(recap)
     print("=" * 50)
     print("Daily portfolio recap generation completed successfully!")
+    return {'recap_path': output_path}
 
-    # Step 8: Publish to all social platforms
-    print("=" * 50)
-    print("Publishing recap to social platforms...")
 
-    # Generate cover image for the session
+def stage_cover(state):
+    """Generate cover image for the session."""
     ai_cover_path = None
     try:
         ai_cover_path = cover_generator.generate_cover(
-            session_name=market_session,
-            portfolio_daily=portfolio_daily,
+            session_name=state['market_session'],
+            portfolio_daily=state['portfolio_daily'],
             output_path='output/ai_cover.png',
         )
     except Exception as exc:
         print(f"Warning: cover image generation failed: {exc}")
+    return {'ai_cover_path': ai_cover_path}
+
 
-    # Generate Top & Flop card (16:9 landscape format)
+def stage_top_flop_card(state):
+    """Generate Top & Flop card (16:9 landscape format)."""
     engagement_card_path = None
     try:
-        from config import EMOJI_MAP
+        from portfolio_manager import get_emojis
         engagement_card_path = winners_losers_card.build_card_from_stock_data(
-            stock_data=stock_data,
-            session_name=market_session,
-            emoji_map=EMOJI_MAP,
+            stock_data=state['stock_data'],
+            session_name=state['market_session'],
+            emoji_map=get_emojis(),
             output_path='output/winners_losers.png',
         )
     except Exception as exc:
         print(f"Warning: Top & Flop card generation failed: {exc}")
+    return {'engagement_card_path': engagement_card_path}
+
+
+def stage_pie_chart_type(state):
+    """Advance the pie chart rotation (alternates each session via Gist counter)."""
+    return {'pie_type': gist_storage.get_next_pie_chart_type()}
+
 
-    # Generate pie chart (alternates each session via Gist counter)
+def stage_pie_chart(state):
+    """Generate the pie chart selected by the rotation counter."""
+    portfolio_weights = state['portfolio_weights']
+    pie_type = state['pie_type']
     pie_chart_path = None
     try:
-        pie_type = gist_storage.get_next_pie_chart_type()
         print(f"🥧 Generating pie chart: {pie_type}")
         os.makedirs('output', exist_ok=True)
         if pie_type == 'allocation':
@@ -249,22 +291,124 @@ def main():
                 )
     except Exception as exc:
         print(f"⚠️ Pie chart generation failed: {exc}")
+    return {'pie_chart_path': pie_chart_path}
 
+
+def stage_publish(state):
+    """Step 8: Publish to all social platforms."""
+    print("=" * 50)
+    print("Publishing recap to social platforms...")
     social_publisher.publish_all(
-        recap_file_path=output_path,
-        image_path=chart_path,
-        pie_chart_path=pie_chart_path,
-        ai_cover_path=ai_cover_path,
-        engagement_card_path=engagement_card_path,
+        recap_file_path=state['recap_path'],
+        image_path=state['chart_path'],
+        pie_chart_path=state['pie_chart_path'],
+        ai_cover_path=state['ai_cover_path'],
+        engagement_card_path=state['engagement_card_path'],
         data={
-            "portfolio_daily": portfolio_daily,
-            "stock_data": stock_data,
-            "portfolio_weights": portfolio_weights or {},
-            "portfolio_perf": five_year_return,
-            "portfolio_weekly": portfolio_weekly,
+            "portfolio_daily": state['portfolio_daily'],
+            "stock_data": state['stock_data'],
+            "portfolio_weights": state['portfolio_weights'] or {},
+            "portfolio_perf": state['five_year_return'],
+            "portfolio_weekly": state['portfolio_weekly'],
         }
     )
     print("=" * 50)
+    return {}
+
+
+# Independent network fetches (prices, weights, YTD, eToro history, benchmarks, Gist state)
+# have no requirements and run concurrently; derived stages wait only for their inputs.
+# matplotlib's pyplot state is global, so the two chart stages share a lock.
+STAGES = {
+    'stock_data':        {'func': stage_stock_data},
+    'portfolio_weights': {'func': stage_portfolio_weights},
+    'portfolio_sync':    {'func': stage_portfolio_sync, 'requires': ('portfolio_weights',)},
+    'attribution':       {'func': stage_attribution, 'requires': ('stock_data', 'portfolio_weights')},
+    'portfolio_daily':   {'func': stage_portfolio_daily, 'requires': ('attribution',)},
+    'portfolio_ytd':     {'func': stage_portfolio_ytd},
+    'portfolio_history': {'func': stage_portfolio_history},
+    'cumulative_perf':   {'func': stage_cumulative_perf, 'requires': ('portfolio_ytd', 'portfolio_history'),
+                          'after': ('stock_data', 'portfolio_weights')},
+    'benchmarks':        {'func': stage_benchmarks},
+    'period_perf':       {'func': stage_period_perf, 'requires': ('attribution',)},
+    'perf_history':      {'func': stage_perf_history},
+    'perf_chart':        {'func': stage_perf_chart, 'requires': ('cumulative_perf', 'benchmarks', 'perf_history'),
+                          'lock': 'matplotlib'},
+    'recap_text':        {'func': stage_recap_text,
+                          'requires': ('portfolio_daily', 'cumulative_perf', 'benchmarks', 'period_perf', 'perf_chart'),
+                          'after': ('portfolio_sync',)},
+    'cover':             {'func': stage_cover, 'requires': ('portfolio_daily',)},
+    'top_flop_card':     {'func': stage_top_flop_card, 'requires': ('stock_data',), 'after': ('portfolio_sync',)},
+    'pie_chart_type':    {'func': stage_pie_chart_type},
+    'pie_chart':         {'func': stage_pie_chart, 'requires': ('portfolio_weights', 'pie_chart_type'),
+                          'lock': 'matplotlib'},
+    # Publishing always runs last, whatever else the session needed
+    'publish':           {'func': stage_publish,
+                          'after': ('recap_text', 'cover', 'top_flop_card', 'pie_chart', 'cumulative_perf', 'period_perf')},
+}
+
+FULL_RECAP_PLAN = ['portfolio_sync', 'recap_text', 'cover', 'top_flop_card', 'pie_chart', 'publish']
+
+# Sessions that branch off in social_publisher.publish_all() only need the stages
+# whose outputs they actually consume. Matched in the same order as publish_all().
+SESSION_PLANS = [
+    # Decision & empathy posts: cumulative perf + weights + pie chart, Top & Flop card on eToro
+    ('monday decision post',     ['cumulative_perf', 'portfolio_weights', 'pie_chart', 'top_flop_card', 'publish']),
+    # Stock focus and crypto generate their own data and cards
+    ('stock focus',              ['publish']),
+    ('crypto',                   ['publish']),
+    # Outlooks and copy trading reuse the Top & Flop card as their visual
+    ('weekly portfolio outlook', ['top_flop_card', 'publish']),
+    ('weekly macro outlook',     ['top_flop_card', 'publish']),
+    ('copy trading post',        ['cumulative_perf', 'top_flop_card', 'publish']),
+]
+
+
+def get_session_plan(market_session):
+    """Return the list of stages the given session needs (full recap by default)."""
+    session_lower = market_session.lower()
+    for marker, plan in SESSION_PLANS:
+        if marker in session_lower:
+            return plan
+    return FULL_RECAP_PLAN
+
+
+def main():
+    """
+    Main function to orchestrate data collection and recap generation
+    """
+    
+    print("Starting daily portfolio recap generation...~")
+    print("=" * 50)
+
+    market_session = os.getenv('MARKET_SESSION', 'Daily recap')
+
+    # Every fetch goes through the run-scoped context, so later consumers
+    # (chart, formatter, infographics, cross-link comments) reuse the same data.
+    state = {
+        'ctx': market_context.get_context(),
+        'market_session': market_session,
+        # Defaults for outputs of stages a session may not run
+        'stock_data': {},
+        'portfolio_weights': {},
+        'portfolio_daily': 0.0,
+        'five_year_return': None,
+        'portfolio_weekly': None,
+        'portfolio_monthly': None,
+        # No default: without this run's recap_text the generic path must not repost an old recap.txt
+        'recap_path': None,
+        'chart_path': None,
+        'pie_chart_path': None,
+        'ai_cover_path': None,
+        'engagement_card_path': None,
+    }
+
+    pipeline.run_plan(STAGES, get_session_plan(market_session), state)
+    # One PATCH for every Gist change the session made (perf history, pie rotation, post IDs...)
+    if not gist_storage.flush():
+        print("❌ Could not save this session's changes to the Gist")
+        sys.exit(1)
+
 
 if __name__ == '__main__':
     main()
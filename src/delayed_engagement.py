@@ -28,6 +28,7 @@ if os.path.exists(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(_
 
 import etoro_client
 import gist_storage
+import market_context
 import analytics_tracker
 from etoro_sender import _strip_html
 from cross_link_scheduler import AI_TECH_PROFILES, DEFENSIVE_VALUE_PROFILES, ETF_MACRO_PROFILES
@@ -36,7 +37,7 @@ from cross_link_scheduler import AI_TECH_PROFILES, DEFENSIVE_VALUE_PROFILES, ETF
 def get_copier_stats_text() -> str:
     """Fetch live certified trader rankings and format a transparency snippet."""
     try:
-        rankings = etoro_client.fetch_trader_rankings(period="CurrYear")
+        rankings = market_context.get_context().trader_rankings(period="CurrYear")
         if rankings:
             risk = rankings.get("riskScore", 3)
             win_ratio = rankings.get("winRatio", 67.6)
@@ -161,7 +162,6 @@ def process_user_comments(post_id: str, my_username: str = "AndreaRavalli") -> i
                 if etoro_client.like_comment(post_id, c_id):
                     print(f"   ❤️ Liked comment {c_id} from @{owner_username}")
                     liked_count += 1
-                time.sleep(1)
 
     except Exception as e:
         print(f"⚠️ Error processing user comments: {e}")
@@ -173,7 +173,7 @@ def run_delayed_engagement(
     post_id: Optional[str] = None,
     session_name: Optional[str] = None,
     force: bool = False,
-    interval_seconds: int = 6,
+    interval_seconds: int = 0,
 ) -> Dict[str, Any]:
     """
     Main orchestrator for delayed follow-up engagement.
@@ -237,7 +237,7 @@ def run_delayed_engagement(
         print(f"   • Comment {idx}: {c['title']}")
 
     # Step 4: Publish Comments
-    print(f"\n📢 Publishing {len(comments)} Wave-2 comments with {interval_seconds}s interval...")
+    print(f"\n📢 Publishing {len(comments)} Wave-2 comments...")
     published_count = 0
     for idx, c in enumerate(comments, 1):
         clean_text = _strip_html(c["text"])
@@ -254,7 +254,7 @@ def run_delayed_engagement(
         else:
             print(f"❌ Comment {idx} failed: {res.get('error')}")
 
-        if idx < len(comments):
+        if interval_seconds and idx < len(comments):
             print(f"⏳ Waiting {interval_seconds}s...")
             time.sleep(interval_seconds)
 
@@ -35,28 +35,11 @@ import etoro_sender
 import telegram_sender
 import gist_storage
 import analytics_tracker
+import yahoo_fetch
 from etoro_sender import _strip_html
 
-try:
-    from google import genai
-    from google.genai import types
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
-
-try:
-    from api_usage_tracker import log_api_request
-    API_TRACKER_AVAILABLE = True
-except ImportError:
-    API_TRACKER_AVAILABLE = False
-
-
-DEFAULT_GEMINI_MODELS = [
-    'gemini-3.7-flash',
-    'gemini-3.6-flash',
-    'gemini-3.5-flash',
-    'gemini-2.5-flash',
-]
+import gemini_gateway
+from gemini_gateway import GENAI_AVAILABLE
 
 # Baseline dividend profiles for portfolio holdings
 DIVIDEND_PROFILES = {
@@ -232,37 +215,40 @@ def fetch_dynamic_dividend_metrics(ticker: str) -> Dict[str, Any]:
     }
     url = f"https://query1.finance.yahoo.com/v8/finance/chart/{clean_sym}?events=div&interval=1mo&range=1y"
 
-    try:
+    def _get_chart():
         req = urllib.request.Request(url, headers=headers)
         with urllib.request.urlopen(req, timeout=4) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
-            result = data.get('chart', {}).get('result', [])
-            if result:
-                res = result[0]
-                meta = res.get('meta', {})
-                events = res.get('events', {}).get('dividends', {})
-                price = meta.get('regularMarketPrice') or meta.get('previousClose') or 0.0
-                currency = meta.get('currency', 'USD')
-                
-                div_sum = sum(float(v.get('amount', 0.0)) for v in events.values())
-                yield_pct = (div_sum / price * 100.0) if (price and price > 0 and div_sum > 0) else None
-
-                last_event = list(events.values())[-1] if events else {}
-                last_amt = float(last_event.get('amount', 0.0)) if last_event else 0.0
-                last_ts = last_event.get('date')
-                last_dt_str = datetime.fromtimestamp(last_ts, tz=timezone.utc).strftime('%d %B %Y') if last_ts else None
-                last_tranche_pct = (last_amt / price * 100.0) if (price and price > 0 and last_amt > 0) else None
-
-                return {
-                    "live_price": price,
-                    "currency": currency,
-                    "live_annual_dividend_sum": div_sum,
-                    "live_yield_pct": yield_pct,
-                    "last_dividend_amount": last_amt,
-                    "last_dividend_date": last_dt_str,
-                    "last_tranche_pct": last_tranche_pct,
-                    "dividends_count_1y": len(events),
-                }
+            return json.loads(resp.read().decode('utf-8'))
+
+    try:
+        data = yahoo_fetch.call(_get_chart, host=yahoo_fetch.host_of(url))
+        result = data.get('chart', {}).get('result', [])
+        if result:
+            res = result[0]
+            meta = res.get('meta', {})
+            events = res.get('events', {}).get('dividends', {})
+            price = meta.get('regularMarketPrice') or meta.get('previousClose') or 0.0
+            currency = meta.get('currency', 'USD')
+            
+            div_sum = sum(float(v.get('amount', 0.0)) for v in events.values())
+            yield_pct = (div_sum / price * 100.0) if (price and price > 0 and div_sum > 0) else None
+
+            last_event = list(events.values())[-1] if events else {}
+            last_amt = float(last_event.get('amount', 0.0)) if last_event else 0.0
+            last_ts = last_event.get('date')
+            last_dt_str = datetime.fromtimestamp(last_ts, tz=timezone.utc).strftime('%d %B %Y') if last_ts else None
+            last_tranche_pct = (last_amt / price * 100.0) if (price and price > 0 and last_amt > 0) else None
+
+            return {
+                "live_price": price,
+                "currency": currency,
+                "live_annual_dividend_sum": div_sum,
+                "live_yield_pct": yield_pct,
+                "last_dividend_amount": last_amt,
+                "last_dividend_date": last_dt_str,
+                "last_tranche_pct": last_tranche_pct,
+                "dividends_count_1y": len(events),
+            }
     except Exception as e:
         print(f"ℹ️ Dynamic dividend fetch fallback for {clean_sym} ({e})")
 
@@ -405,26 +391,9 @@ REGOLE PER IL POST:
 
 Output ONLY the post text in Italian."""
 
-    try:
-        client = genai.Client(api_key=api_key)
-        config_gen = types.GenerateContentConfig(temperature=0.7)
-
-        for model_name in DEFAULT_GEMINI_MODELS:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config_gen,
-                )
-                if response and response.text:
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "dividend_announcement_post")
-                    return f"Dividendi: {prof['cashtag']}", response.text.strip()
-            except Exception as exc:
-                print(f"   ⚠️ Gemini {model_name} failed: {exc}")
-                continue
-    except Exception as e:
-        print(f"⚠️ Gemini client error: {e}")
+    text, _ = gemini_gateway.generate(prompt, "dividend_announcement_post", temperature=0.7, api_key=api_key)
+    if text:
+        return f"Dividendi: {prof['cashtag']}", text
 
     return f"Dividendi: {prof['cashtag']}", fallback_text
 
@@ -454,8 +423,8 @@ def publish_dividend_post(
     weight = weight_override
     if weight is None:
         try:
-            from finance_fetcher import fetch_portfolio_weights
-            weights = fetch_portfolio_weights()
+            import market_context
+            weights = market_context.get_context().portfolio_weights()
             weight = weights.get(ticker, DEFAULT_WEIGHTS.get(ticker, 3.0))
         except Exception:
             weight = DEFAULT_WEIGHTS.get(ticker, 3.0)
@@ -10,17 +10,71 @@ Supports:
   • Monthly gain history (/api/v2/portfolios/{username}/gain/monthly)
   • Media attachment upload (/api/v1/attachments)
   • Social Feed post creation (/api/v1/posts)
+
+All calls share one pooled keep-alive Session (automatic retry with backoff on
+transient errors, one timeout policy) and credentials read once per process.
+Write endpoints (posts, polls, comments, likes, uploads) are paced by per-endpoint
+token buckets shared by every caller in the process, so callers just loop.
 """
 
 import os
 import json
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, Optional, List, Tuple
 
 import uuid
 
+from rate_limit import TokenBucket
+
 BASE_URL = "https://public-api.etoro.com"
 
+# Shared timeout policy: (connect, read) seconds; uploads and posts get a longer read window
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 25
+WRITE_TIMEOUT = 35
+
+# Transient failures retried by the session with exponential backoff (0.5s, 1s, 2s...).
+# GETs also retry on 429/5xx; POSTs only on connection errors, so a post is never published twice.
+MAX_RETRIES = int(os.environ.get("ETORO_MAX_RETRIES", "3"))
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 10
+
+
+def _write_budget(endpoint: str, rate: float, burst: int) -> Tuple[float, int]:
+    """(rate, burst) for a write endpoint, overridden by ETORO_WRITE_BUDGET_<ENDPOINT>="rate,burst"."""
+    name = f"ETORO_WRITE_BUDGET_{endpoint.upper()}"
+    value = os.environ.get(name)
+    if value:
+        try:
+            env_rate, env_burst = value.split(",")
+            return float(env_rate), int(env_burst)
+        except ValueError:
+            print(f"⚠️ Ignoring {name}={value!r} (expected 'rate,burst', e.g. '0.2,1')")
+    return rate, burst
+
+
+# Write budgets per endpoint: (sustained requests per second, burst). eToro does not publish
+# per-endpoint write limits, so these are conservative defaults: comments keep the 5s
+# spacing the commenters used to sleep (burst 1), posts and polls one every 30s.
+WRITE_BUDGETS = {
+    endpoint: _write_budget(endpoint, rate, burst)
+    for endpoint, (rate, burst) in {
+        "post": (1 / 30, 2),
+        "poll": (1 / 30, 1),
+        "comment": (1 / 5, 1),
+        "like": (1.0, 5),
+        "attachment": (0.5, 3),
+    }.items()
+}
+# A 429 on a write was not processed, so it is safe to send again after Retry-After
+WRITE_MAX_RETRIES = 2
+WRITE_RETRY_AFTER_DEFAULT = 10
+
 MARKET_IDS = {
     # Tech, AI & Semiconductors
     "PLTR": 7991,
@@ -79,18 +133,113 @@ MARKET_IDS = {
 }
 
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_credentials: Optional[Tuple[Optional[str], Optional[str], str]] = None
+_base_headers: Optional[Dict[str, str]] = None
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled Session used for every eToro API call."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                connect=MAX_RETRIES,
+                read=MAX_RETRIES,
+                status=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({"GET", "HEAD"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _request(method: str, url: str, timeout: Any = None, **kwargs) -> requests.Response:
+    """Send one request through the pooled session with the shared timeout policy."""
+    return get_session().request(method, url, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+
+
+def _get(url: str, **kwargs) -> requests.Response:
+    """GET through the pooled session (retried on connection errors, 429 and 5xx)."""
+    return _request("GET", url, **kwargs)
+
+
+def _post(url: str, timeout: Any = None, **kwargs) -> requests.Response:
+    """POST through the pooled session with the longer write timeout."""
+    return _request("POST", url, timeout=timeout or (CONNECT_TIMEOUT, WRITE_TIMEOUT), **kwargs)
+
+
+_budgets: Dict[str, TokenBucket] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_write_budget(endpoint: str):
+    """Process-wide token bucket pacing one write endpoint (see WRITE_BUDGETS)."""
+    with _budgets_lock:
+        if endpoint not in _budgets:
+            rate, burst = WRITE_BUDGETS[endpoint]
+            _budgets[endpoint] = TokenBucket(rate, burst)
+        return _budgets[endpoint]
+
+
+def _paced_post(endpoint: str, url: str, **kwargs) -> requests.Response:
+    """POST under the endpoint's write budget, waiting out 429 responses (Retry-After)."""
+    attempt = 0
+    while True:
+        get_write_budget(endpoint).acquire()
+        resp = _post(url, **kwargs)
+        if resp.status_code != 429 or attempt >= WRITE_MAX_RETRIES:
+            return resp
+        attempt += 1
+        try:
+            wait = float(resp.headers.get("Retry-After", WRITE_RETRY_AFTER_DEFAULT))
+        except ValueError:
+            wait = WRITE_RETRY_AFTER_DEFAULT
+        print(f"   ⏳ eToro {endpoint} rate limited, retry {attempt}/{WRITE_MAX_RETRIES} in {wait:.0f}s")
+        time.sleep(wait)
+
+
+def get_market_id(ticker: str) -> Optional[int]:
+    """eToro numeric market ID for a ticker symbol (MARKET_IDS plus every instrument resolved so far)."""
+    import etoro_instruments
+    return etoro_instruments.market_id(ticker)
+
+
 def get_market_ids_for_tickers(tickers: List[str]) -> List[int]:
     """Resolve a list of ticker symbols into eToro numeric market IDs."""
     ids = []
     for t in tickers:
-        clean = t.replace("$", "").strip().upper()
-        if clean in MARKET_IDS:
-            ids.append(MARKET_IDS[clean])
+        market_id = get_market_id(t)
+        if market_id is not None:
+            ids.append(market_id)
     return ids
 
 
 def get_credentials() -> Tuple[Optional[str], Optional[str], str]:
-    """Retrieve eToro credentials from environment or local .env file."""
+    """Retrieve eToro credentials (environment first, then local .env), read once per process."""
+    global _credentials
+    if _credentials is None:
+        _credentials = _load_credentials()
+    return _credentials
+
+
+def reset_credentials() -> None:
+    """Forget cached credentials and headers (e.g. after changing the environment)."""
+    global _credentials, _base_headers
+    _credentials = None
+    _base_headers = None
+
+
+def _load_credentials() -> Tuple[Optional[str], Optional[str], str]:
+    """Read eToro credentials from environment or local .env file."""
     user_key = os.environ.get("ETORO_USER_KEY")
     api_key = os.environ.get("ETORO_API_KEY")
     username = os.environ.get("ETORO_USERNAME")
@@ -118,16 +267,19 @@ def get_credentials() -> Tuple[Optional[str], Optional[str], str]:
 
 
 def get_headers() -> Optional[Dict[str, str]]:
-    """Build request headers with authentication and fresh x-request-id."""
-    user_key, api_key, _ = get_credentials()
-    if not user_key:
-        return None
-    return {
-        "User-Agent": "PortfolioRecapBot/1.0 (Mozilla/5.0)",
-        "x-user-key": user_key.strip(),
-        "x-api-key": api_key.strip(),
-        "x-request-id": str(uuid.uuid4()),
-    }
+    """Build request headers: cached authentication headers plus a fresh x-request-id."""
+    global _base_headers
+    if _base_headers is None:
+        user_key, api_key, _ = get_credentials()
+        if not user_key:
+            return None
+        _base_headers = {
+            "User-Agent": "PortfolioRecapBot/1.0 (Mozilla/5.0)",
+            "x-user-key": user_key.strip(),
+            "x-api-key": api_key.strip(),
+        }
+    # Callers add Content-Type etc., so each request gets its own copy
+    return {**_base_headers, "x-request-id": str(uuid.uuid4())}
 
 
 def is_configured() -> bool:
@@ -147,7 +299,7 @@ def verify_connection() -> Dict[str, Any]:
 
     url = f"{BASE_URL}/api/v1/me"
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = _get(url, headers=headers)
         if resp.status_code == 200:
             data = resp.json()
             return {
@@ -180,12 +332,9 @@ def fetch_portfolio_weights() -> Dict[str, float]:
     _, _, username = get_credentials()
     username = username or "AndreaRavalli"
 
-    # Known eToro Instrument ID to Ticker mapping derived from authoritative MARKET_IDS
-    ID_TO_TICKER = {v: k for k, v in MARKET_IDS.items()}
-
     url = f"{BASE_URL}/api/v1/user-info/people/{username}/portfolio/live"
     try:
-        resp = requests.get(url, headers=headers, timeout=25)
+        resp = _get(url, headers=headers)
         if resp.status_code != 200:
             print(f"⚠️ eToro API returned HTTP {resp.status_code}: {resp.text}")
             return {}
@@ -208,25 +357,9 @@ def fetch_portfolio_weights() -> Dict[str, float]:
             current_val_by_inst[iid] += cur_val
             total_val += cur_val
 
-        # Find all unmapped instrument IDs in the current portfolio
-        unmapped_iids = [iid for iid in current_val_by_inst.keys() if iid not in ID_TO_TICKER]
-        if unmapped_iids:
-            print(f"🔎 Dynamically resolving {len(unmapped_iids)} new/unmapped eToro instrument IDs: {unmapped_iids}...")
-            try:
-                ids_str = ",".join(str(i) for i in unmapped_iids)
-                meta_url = f"{BASE_URL}/api/v1/market-data/instruments?instrumentIds={ids_str}"
-                meta_resp = requests.get(meta_url, headers=headers, timeout=10)
-                if meta_resp.status_code == 200:
-                    meta_data = meta_resp.json()
-                    for item in meta_data.get("instrumentDisplayDatas", []):
-                        iid_res = item.get("instrumentID")
-                        sym_res = item.get("symbolFull")
-                        name_res = item.get("instrumentDisplayName", sym_res)
-                        if iid_res and sym_res:
-                            ID_TO_TICKER[iid_res] = sym_res
-                            print(f"   ✓ Auto-resolved new eToro asset: ID {iid_res} -> ${sym_res} ({name_res})")
-            except Exception as res_err:
-                print(f"   ⚠️ Dynamic instrument resolution error: {res_err}")
+        # Instrument ID → ticker from the persistent resolver (new IDs are batch-resolved once)
+        import etoro_instruments
+        ID_TO_TICKER = etoro_instruments.resolve_ids(current_val_by_inst.keys())
 
         weights = {}
         for iid, cur in current_val_by_inst.items():
@@ -247,6 +380,26 @@ def fetch_portfolio_weights() -> Dict[str, float]:
         return {}
 
 
+def fetch_instruments(instrument_ids: List[int]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetch display metadata (symbolFull, instrumentDisplayName, ...) for many instruments
+    in one GET /api/v1/market-data/instruments request. None if the request failed.
+    """
+    headers = get_headers()
+    if not headers:
+        return None
+    if not instrument_ids:
+        return []
+
+    ids_str = ",".join(str(i) for i in instrument_ids)
+    url = f"{BASE_URL}/api/v1/market-data/instruments"
+    resp = _get(url, headers=headers, params={"instrumentIds": ids_str})
+    if resp.status_code != 200:
+        print(f"   ⚠️ eToro instrument metadata returned HTTP {resp.status_code}")
+        return None
+    return resp.json().get("instrumentDisplayDatas", [])
+
+
 def fetch_portfolio_breakdown() -> Optional[Dict[str, Any]]:
     """Fetch full instrument breakdown details including PnL, margin and positions."""
     headers = get_headers()
@@ -255,7 +408,7 @@ def fetch_portfolio_breakdown() -> Optional[Dict[str, Any]]:
 
     url = f"{BASE_URL}/api/v2/trading/info/instrument-breakdown"
     try:
-        resp = requests.get(url, headers=headers, timeout=25)
+        resp = _get(url, headers=headers)
         if resp.status_code == 200:
             return resp.json()
         return None
@@ -275,7 +428,7 @@ def fetch_gain_history(granularity: str = "monthly") -> Optional[List[Dict[str,
     _, _, username = get_credentials()
     url = f"{BASE_URL}/api/v2/portfolios/{username}/gain/{granularity}"
     try:
-        resp = requests.get(url, headers=headers, timeout=25)
+        resp = _get(url, headers=headers)
         if resp.status_code == 200:
             data = resp.json()
             return data.get("data", [])
@@ -299,7 +452,7 @@ def fetch_trader_rankings(period: str = "CurrYear") -> Optional[Dict[str, Any]]:
     username = username or "AndreaRavalli"
     url = f"{BASE_URL}/api/v2/portfolios/{username}/rankings"
     try:
-        resp = requests.get(url, headers=headers, params={"period": period}, timeout=25)
+        resp = _get(url, headers=headers, params={"period": period})
         if resp.status_code == 200:
             data = resp.json().get("data", {})
             if data:
@@ -336,10 +489,11 @@ def upload_attachment(file_path: str) -> Optional[Dict[str, Any]]:
 
     try:
         with open(file_path, "rb") as f:
-            files = {"file": (filename, f, content_type)}
-            # Note: Do not specify Content-Type header manually when using files in requests
-            upload_headers = {k: v for k, v in headers.items() if k.lower() != "content-type"}
-            resp = requests.post(url, headers=upload_headers, files=files, timeout=35)
+            # Bytes rather than the file handle, so a rate-limited upload can be resent
+            files = {"file": (filename, f.read(), content_type)}
+        # Note: Do not specify Content-Type header manually when using files in requests
+        upload_headers = {k: v for k, v in headers.items() if k.lower() != "content-type"}
+        resp = _paced_post("attachment", url, headers=upload_headers, files=files)
 
         if resp.status_code in (200, 201):
             data = resp.json()
@@ -390,7 +544,7 @@ def create_post(
         body["taggedUserIds"] = tagged_user_ids
 
     try:
-        resp = requests.post(url, headers=headers, json=body, timeout=30)
+        resp = _paced_post("post", url, headers=headers, json=body)
         if resp.status_code in (200, 201):
             data = resp.json()
             post_id = data.get("id")
@@ -424,7 +578,7 @@ def get_post_metrics(post_id: str, exclude_author: bool = True) -> Optional[Dict
 
     url = f"{BASE_URL}/api/v1/posts/{post_id}"
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = _get(url, headers=headers)
         if resp.status_code == 200:
             data = resp.json()
             post_owner = data.get("post", {}).get("owner", {})
@@ -450,7 +604,7 @@ def get_post_metrics(post_id: str, exclude_author: bool = True) -> Optional[Dict
             comments = 0
             try:
                 c_url = f"{BASE_URL}/api/v1/posts/{post_id}/comments"
-                c_resp = requests.get(c_url, headers=headers, timeout=10)
+                c_resp = _get(c_url, headers=headers)
                 if c_resp.status_code == 200:
                     c_data = c_resp.json()
                     c_list = c_data.get("comments", [])
@@ -514,7 +668,7 @@ def add_post_comment(
         body["attachments"] = [{"id": att_id, "type": "Image"} for att_id in attachment_ids]
 
     try:
-        resp = requests.post(url, headers=headers, json=body, timeout=20)
+        resp = _paced_post("comment", url, headers=headers, json=body)
         if resp.status_code in (200, 201):
             data = resp.json()
             comment_id = data.get("id")
@@ -558,7 +712,7 @@ def create_poll_post(
         body["marketIds"] = market_ids
 
     try:
-        resp = requests.post(url, headers=headers, json=body, timeout=30)
+        resp = _paced_post("poll", url, headers=headers, json=body)
         if resp.status_code in (200, 201):
             data = resp.json()
             post_id = data.get("id")
@@ -581,7 +735,7 @@ def like_comment(post_id: str, comment_id: str) -> bool:
         return False
     url = f"{BASE_URL}/api/v1/posts/{post_id}/comments/{comment_id}/likes"
     try:
-        resp = requests.post(url, headers=headers, timeout=15)
+        resp = _paced_post("like", url, headers=headers)
         return resp.status_code in (200, 201, 204)
     except Exception as e:
         print(f"⚠️ Error liking comment {comment_id}: {e}")
@@ -597,7 +751,7 @@ def like_post(post_id: str) -> bool:
         return False
     url = f"{BASE_URL}/api/v1/posts/{post_id}/likes"
     try:
-        resp = requests.post(url, headers=headers, timeout=15)
+        resp = _paced_post("like", url, headers=headers)
         return resp.status_code in (200, 201, 204)
     except Exception as e:
         print(f"⚠️ Error liking post {post_id}: {e}")
@@ -613,7 +767,7 @@ def get_post_comments(post_id: str) -> List[Dict[str, Any]]:
         return []
     url = f"{BASE_URL}/api/v1/posts/{post_id}/comments"
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
+        resp = _get(url, headers=headers)
         if resp.status_code == 200:
             data = resp.json()
             return data.get("comments", []) if isinstance(data, dict) else []
@@ -634,7 +788,7 @@ def reply_to_comment(post_id: str, comment_id: str, message: str, language: str
     url = f"{BASE_URL}/api/v1/posts/{post_id}/comments/{comment_id}/replies"
     body = {"message": message, "language": language}
     try:
-        resp = requests.post(url, headers=headers, json=body, timeout=20)
+        resp = _paced_post("comment", url, headers=headers, json=body)
         if resp.status_code in (200, 201):
             data = resp.json()
             return {"success": True, "id": data.get("id"), "data": data}
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+eToro Instrument Resolver
+=========================
+Persistent cache of eToro instrument ID ↔ symbol (plus display name), stored in
+data/etoro_instruments.json and mirrored to the 'etoro_instruments' key of the Gist
+so CI runners with a fresh checkout share what previous runs resolved.
+
+The cache is seeded from etoro_client.MARKET_IDS. IDs missing from it are looked up
+in the Gist first, then batch-resolved in a single /market-data/instruments request,
+so repeat runs need no resolution calls at all. IDs eToro cannot resolve are cached
+too (entries without a symbol) and only asked again after UNRESOLVED_TTL_DAYS.
+
+Usage:
+    import etoro_instruments
+    symbols = etoro_instruments.resolve_ids([1137, 100026])   # {1137: 'NVDA', ...}
+    market_id = etoro_instruments.market_id('$nvda')           # 1137
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+CACHE_FILE = os.environ.get(
+    'ETORO_INSTRUMENTS_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'etoro_instruments.json')
+)
+
+# IDs eToro returned nothing for (delisted, restricted) are not requested again for this long
+UNRESOLVED_TTL_DAYS = int(os.environ.get('ETORO_UNRESOLVED_TTL_DAYS', '3'))
+
+_cache: Optional[Dict[str, Any]] = None
+_symbol_index: Optional[Dict[str, int]] = None
+_gist_merged = False
+_lock = threading.RLock()
+
+
+def _normalize(symbol: str) -> str:
+    return symbol.replace('$', '').strip().upper()
+
+
+def _load() -> Dict[str, Any]:
+    """Load the cache from disk once per process, seeded from MARKET_IDS (caller holds _lock)."""
+    global _cache
+    if _cache is None:
+        _cache = {'instruments': {}}
+        if os.path.exists(CACHE_FILE):
+            try:
+                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                    _cache.update(json.load(f))
+            except Exception as e:
+                print(f"⚠️ Error reading eToro instrument cache: {e}")
+        # MARKET_IDS is authoritative: its symbols override anything cached for the same ID
+        from etoro_client import MARKET_IDS
+        instruments = _cache['instruments']
+        for symbol, iid in MARKET_IDS.items():
+            entry = instruments.get(str(iid), {})
+            if entry.get('symbol') != symbol or entry.get('source') != 'config':
+                instruments[str(iid)] = {'symbol': symbol, 'name': entry.get('name'),
+                                         'source': 'config', 'updated': datetime.now().isoformat()}
+    return _cache
+
+
+def _save():
+    """Persist the cache (caller holds _lock)."""
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        tmp_path = CACHE_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_cache, f, indent=2, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, CACHE_FILE)
+    except Exception as e:
+        print(f"⚠️ Error saving eToro instrument cache: {e}")
+
+
+def _index() -> Dict[str, int]:
+    """Reverse symbol → ID index, rebuilt lazily after every change (caller holds _lock)."""
+    global _symbol_index
+    if _symbol_index is None:
+        _symbol_index = {}
+        for iid, entry in _load()['instruments'].items():
+            if not entry.get('symbol'):
+                continue
+            # Config entries win over auto-resolved ones for the same symbol
+            key = _normalize(entry['symbol'])
+            if key not in _symbol_index or entry.get('source') == 'config':
+                _symbol_index[key] = int(iid)
+    return _symbol_index
+
+
+def _is_known(entry: Optional[dict], now: datetime) -> bool:
+    """True for a resolved entry, or an unresolved one still within UNRESOLVED_TTL_DAYS."""
+    if not entry:
+        return False
+    if entry.get('symbol'):
+        return True
+    try:
+        return now - datetime.fromisoformat(entry['updated']) < timedelta(days=UNRESOLVED_TTL_DAYS)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _store(entries: Dict[str, dict]) -> int:
+    """
+    Merge {str(iid): entry} into the cache (caller holds _lock). Resolved IDs are kept;
+    an unresolved entry is replaced by a resolved one or by a newer miss.
+    """
+    global _symbol_index
+    instruments = _load()['instruments']
+    added = 0
+    for iid, entry in entries.items():
+        current = instruments.get(iid)
+        if current and current.get('symbol'):
+            continue
+        if current and not entry.get('symbol') and current.get('updated', '') >= entry.get('updated', ''):
+            continue
+        instruments[iid] = entry
+        added += 1
+    if added:
+        _symbol_index = None
+    return added
+
+
+def _merge_gist() -> int:
+    """Pull instruments resolved by other runs from the Gist, once per process (caller holds _lock)."""
+    global _gist_merged
+    if _gist_merged:
+        return 0
+    _gist_merged = True
+    try:
+        import gist_storage
+        added = _store(gist_storage.get_etoro_instruments())
+    except Exception as e:
+        print(f"⚠️ Could not read eToro instruments from Gist: {e}")
+        return 0
+    if added:
+        _save()
+    return added
+
+
+def _fetch_instruments(ids: Iterable[int]) -> Optional[Dict[str, dict]]:
+    """Resolve instrument IDs into cache entries with one eToro metadata request (None on failure)."""
+    import etoro_client
+    items = etoro_client.fetch_instruments(ids)
+    if items is None:
+        return None
+    stamp = datetime.now().isoformat()
+    resolved = {}
+    for item in items:
+        iid = item.get("instrumentID")
+        symbol = item.get("symbolFull")
+        if iid and symbol:
+            name = item.get("instrumentDisplayName", symbol)
+            resolved[str(iid)] = {'symbol': symbol, 'name': name, 'source': 'etoro', 'updated': stamp}
+            print(f"   ✓ Auto-resolved new eToro asset: ID {iid} -> ${symbol} ({name})")
+    return resolved
+
+
+def resolve_ids(ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Return {instrument_id: symbol} for every resolvable ID. Unknown IDs are looked up
+    in the Gist, then in one batched eToro request; new results are saved locally and
+    to the Gist. IDs that stay unknown are left out (and cached as unresolved).
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids if i is not None))
+    now = datetime.now()
+    with _lock:
+        instruments = _load()['instruments']
+        unknown = [i for i in ids if not _is_known(instruments.get(str(i)), now)]
+        if unknown:
+            _merge_gist()
+            unknown = [i for i in unknown if not _is_known(instruments.get(str(i)), now)]
+        if unknown:
+            print(f"🔎 Dynamically resolving {len(unknown)} new/unmapped eToro instrument IDs: {unknown}...")
+            try:
+                resolved = _fetch_instruments(unknown)
+            except Exception as e:
+                print(f"   ⚠️ Dynamic instrument resolution error: {e}")
+                resolved = None
+            # Only an answered request proves eToro does not know an ID
+            missed = [i for i in unknown if str(i) not in resolved] if resolved is not None else []
+            resolved = resolved or {}
+            if missed:
+                print(f"   ⚠️ eToro could not resolve IDs {missed}, not asking again for {UNRESOLVED_TTL_DAYS} days")
+                stamp = now.isoformat()
+                resolved.update({str(i): {'symbol': None, 'name': None, 'source': 'unresolved', 'updated': stamp}
+                                 for i in missed})
+            if _store(resolved):
+                _save()
+                try:
+                    import gist_storage
+                    gist_storage.save_etoro_instruments(
+                        {iid: entry for iid, entry in instruments.items() if entry.get('source') != 'config'}
+                    )
+                except Exception as e:
+                    print(f"⚠️ Could not save eToro instruments to Gist: {e}")
+        return {i: instruments[str(i)]['symbol'] for i in ids if instruments.get(str(i), {}).get('symbol')}
+
+
+def symbol_for(iid: int) -> Optional[str]:
+    """Cached symbol for an instrument ID (never triggers a lookup)."""
+    with _lock:
+        return _load()['instruments'].get(str(iid), {}).get('symbol')
+
+
+def name_for(iid: int) -> Optional[str]:
+    """Cached display name for an instrument ID, if eToro returned one."""
+    with _lock:
+        return _load()['instruments'].get(str(iid), {}).get('name')
+
+
+def market_id(symbol: str) -> Optional[int]:
+    """Reverse lookup: eToro instrument ID for a ticker ('$' prefix and case ignored)."""
+    with _lock:
+        return _index().get(_normalize(symbol))
@@ -6,7 +6,8 @@ try:
     import yfinance as yf
 except ImportError:
     yf = None
-from config import PORTFOLIO_TICKERS, BENCHMARKS
+from config import BENCHMARKS
+from portfolio_manager import get_tickers
 import requests
 try:
     from bs4 import BeautifulSoup
@@ -14,14 +15,9 @@ except ImportError:
     BeautifulSoup = None
 import os
 import re
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 import json
-try:
-    import pytz
-    NY_TZ = pytz.timezone('America/New_York')
-except ImportError:
-    pytz = None
-    NY_TZ = None
 try:
     import pandas as pd
 except ImportError:
@@ -30,18 +26,19 @@ try:
     import numpy as np
 except ImportError:
     np = None
+import price_store
+import weights_store
+import instrument_registry
+import trading_calendar
+import returns_engine
+import yahoo_fetch
+import market_context
 try:
     import etoro_client
     ETORO_CLIENT_AVAILABLE = True
 except ImportError:
     ETORO_CLIENT_AVAILABLE = False
 
-# Orario di apertura e chiusura della borsa USA (9:30 AM a 4:00 PM ET)
-US_OPEN_HOUR = 9
-US_OPEN_MINUTE = 30
-US_CLOSE_HOUR = 16
-US_CLOSE_MINUTE = 00
-
 # eToro public API configuration
 ETORO_USERNAME = 'AndreaRavalli'
 ETORO_CID = 7743547  # Customer ID, discovered via rankings API
@@ -79,14 +76,15 @@ def fetch_portfolio_ytd_from_etoro():
         # Method 1: Official eToro Public API / MCP rankings endpoint
         if ETORO_CLIENT_AVAILABLE and etoro_client.is_configured():
             print(f"   Fetching YTD from official eToro Public API (user: {ETORO_USERNAME})...")
-            rankings = etoro_client.fetch_trader_rankings(period="CurrYear")
+            ctx = market_context.get_context()
+            rankings = ctx.trader_rankings(period="CurrYear")
             if rankings and "gain" in rankings:
                 ytd_val = float(rankings["gain"]) * 100.0
                 print(f"✓ eToro Portfolio YTD (official API / rankings): {ytd_val:.2f}%")
                 return ytd_val
 
             # Method 1b: monthly gain history compound for current year
-            gain_history = etoro_client.fetch_gain_history(granularity="monthly")
+            gain_history = ctx.etoro_gain_history(granularity="monthly")
             if gain_history:
                 current_year_str = str(datetime.now().year)
                 ytd_compound = 1.0
@@ -151,43 +149,50 @@ def calculate_portfolio_ytd(stock_data, portfolio_weights=None):
     if not stock_data:
         return 0.0
         
-    # Fetch fresh weights from BullAware if not provided
+    # Reuse the run's live weights if not provided
     if portfolio_weights is None:
-        portfolio_weights = fetch_portfolio_weights_from_bullaware()
+        portfolio_weights = market_context.get_context().portfolio_weights()
         
     if not portfolio_weights:
         print("⚠️ No portfolio weights available for YTD calculation. Using equal weight fallback.")
-        total = sum(data['yearly_change'] for data in stock_data.values())
-        return total / len(stock_data)
-        
-    weighted_sum = 0.0
-    total_weight = 0.0
-    
-    for ticker, data in stock_data.items():
-        if ticker in portfolio_weights:
-            weight = portfolio_weights[ticker] / 100.0
-            weighted_sum += data['yearly_change'] * weight
-            total_weight += weight
-            
-    if total_weight == 0:
+
+    attribution = returns_engine.weighted_attribution(_stock_returns(stock_data), portfolio_weights)
+    if portfolio_weights and attribution['equal_weight']:
         return 0.0
-        
-    print(f"📊 Calculated Portfolio YTD: {weighted_sum:.2f}%")
-    return weighted_sum
 
+    portfolio_ytd = attribution['portfolio']['yearly_change']
+    if portfolio_weights:
+        print(f"📊 Calculated Portfolio YTD: {portfolio_ytd:.2f}%")
+    return portfolio_ytd
 
-def fetch_portfolio_weights():
+
+def fetch_portfolio_weights(max_age_minutes=None):
     """
     Fetch exact portfolio weights from official eToro API, falling back to BullAware if needed.
+
+    The latest snapshot in the local weights store is reused while it is younger than
+    `max_age_minutes` (default weights_store.WEIGHTS_TTL_MINUTES); every live fetch is
+    appended to the store's history.
     """
+    if max_age_minutes is None:
+        max_age_minutes = weights_store.WEIGHTS_TTL_MINUTES
+    cached = weights_store.load_latest(max_age_minutes=max_age_minutes)
+    if cached:
+        taken_at, weights = cached
+        print(f"📊 Reusing portfolio weights snapshot from {taken_at:%H:%M} UTC ({len(weights)} positions)")
+        return weights
+
     if ETORO_CLIENT_AVAILABLE and etoro_client.is_configured():
         print("📊 Fetching portfolio weights from official eToro API...")
         weights = etoro_client.fetch_portfolio_weights()
         if weights:
+            weights_store.save_snapshot(weights, source='etoro')
             return weights
         print("⚠️ Official eToro API returned empty weights, falling back to BullAware...")
 
-    return fetch_portfolio_weights_from_bullaware()
+    weights = fetch_portfolio_weights_from_bullaware()
+    weights_store.save_snapshot(weights, source='bullaware')
+    return weights
 
 
 def fetch_portfolio_weights_from_bullaware():
@@ -196,11 +201,6 @@ def fetch_portfolio_weights_from_bullaware():
     Extracts the 'positions' JSON data embedded in the Next.js page.
     Returns dict with {ticker: weight_percentage}
     """
-    if ETORO_CLIENT_AVAILABLE and etoro_client.is_configured():
-        weights = etoro_client.fetch_portfolio_weights()
-        if weights:
-            return weights
-
     print("📊 Fetching portfolio weights from BullAware...")
     
     try:
@@ -311,177 +311,375 @@ def fetch_portfolio_weights_from_bullaware():
         return {}
 
 
+# How many Yahoo symbols go into a single yf.download() request.
+# ~20 per chunk covers the whole portfolio in 2-3 round-trips without tripping Yahoo throttling.
+BULK_DOWNLOAD_CHUNK_SIZE = 20
+
+
+def _is_us_listing(yahoo_ticker):
+    """
+    Detect US listings via the instrument registry (cached Yahoo exchange code,
+    falling back to the symbol suffix: US stocks and ETFs carry none, crypto trades in USD).
+    """
+    return instrument_registry.is_us_listing(yahoo_ticker)
+
+
+def _missing_symbols(chunk, close):
+    """
+    Symbols of a bulk download that came back without data: yf.download swallows
+    per-symbol failures (429/5xx as well as delisted symbols) and returns NaN columns.
+    """
+    return [s for s in chunk if close is None or s not in close.columns or close[s].isna().all()]
+
+
+def download_close_matrix(yahoo_tickers, period='1y', start=None):
+    """
+    Download daily closes for many Yahoo symbols in a few bulk yf.download() calls.
+    Chunks run concurrently through yahoo_fetch, charged one request per symbol
+    against the shared Yahoo rate limit. Symbols the bulk call returned empty are
+    requested again up to YAHOO_MAX_RETRIES times, with jittered backoff; symbols that
+    keep coming back empty run after run are skipped (instrument_registry.no_data_symbols).
+
+    Returns a wide DataFrame (dates × Yahoo tickers) with a timezone-naive, normalized
+    DatetimeIndex. Markets closed on a given date simply show NaN in that row.
+    """
+    def _download(chunk):
+        if start:
+            raw = yf.download(chunk, start=start, auto_adjust=True, group_by='column',
+                              threads=True, progress=False)
+        else:
+            raw = yf.download(chunk, period=period, auto_adjust=True, group_by='column',
+                              threads=True, progress=False)
+        if raw is None or raw.empty:
+            return None, list(chunk)
+        if isinstance(raw.columns, pd.MultiIndex):
+            close = raw['Close']
+        else:
+            # Single-symbol frames may come back with flat OHLC columns
+            close = raw[['Close']].rename(columns={'Close': chunk[0]})
+        return close, _missing_symbols(chunk, close)
+
+    frames = []
+    pending = list(dict.fromkeys(yahoo_tickers))
+    skipped = instrument_registry.no_data_symbols(pending)
+    if skipped:
+        print(f"   🚫 Skipping symbols with no Yahoo prices lately: {', '.join(skipped)}")
+        pending = [s for s in pending if s not in skipped]
+    requested = list(pending)
+    for attempt in range(yahoo_fetch.YAHOO_MAX_RETRIES + 1):
+        chunks = [pending[i:i + BULK_DOWNLOAD_CHUNK_SIZE] for i in range(0, len(pending), BULK_DOWNLOAD_CHUNK_SIZE)]
+        last_attempt = attempt == yahoo_fetch.YAHOO_MAX_RETRIES
+        pending = []
+        for chunk, result in zip(chunks, yahoo_fetch.map_concurrent(_download, chunks, cost=len)):
+            close, missing = result or (None, list(chunk))
+            pending.extend(missing)
+            if close is not None:
+                close = close.drop(columns=[s for s in missing if s in close.columns])
+            if close is not None and not close.empty:
+                frames.append(close)
+        if not pending or last_attempt:
+            break
+        delay = yahoo_fetch.backoff_delay(attempt)
+        print(f"   ⏳ Bulk download returned no data for {len(pending)} symbols, "
+              f"retry {attempt + 1}/{yahoo_fetch.YAHOO_MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+
+    if pending:
+        print(f"   ⚠️ Bulk download returned no data for: {', '.join(pending)}")
+    instrument_registry.record_price_data([s for s in requested if s not in pending], pending)
+
+    if not frames:
+        return pd.DataFrame()
+
+    matrix = pd.concat(frames, axis=1)
+    matrix = matrix.loc[:, ~matrix.columns.duplicated()]
+    if matrix.index.tz is not None:
+        matrix.index = matrix.index.tz_convert(None)
+    matrix.index = pd.to_datetime(matrix.index).normalize()
+    # Collapse duplicate dates (mixed exchange timezones can split one session in two rows)
+    matrix = matrix.groupby(level=0).last()
+    return matrix.sort_index()
+
+
+def _is_settled(yahoo_ticker, refreshed_at):
+    """True if the symbol's exchange has not traded since its last download (calendar-based)."""
+    return trading_calendar.is_settled(trading_calendar.exchange_for_symbol(yahoo_ticker), refreshed_at)
+
+
+def fetch_close_matrix(yahoo_tickers, start):
+    """
+    Return daily closes (dates × Yahoo tickers) from `start`, served from the local price store.
+    Only the bars missing since each symbol's last stored date are downloaded and merged in
+    (a symbol whose history Yahoo has re-adjusted for a split or dividend is re-downloaded
+    whole); symbols whose market has been closed since their last download are not fetched.
+    """
+    tickers = list(dict.fromkeys(yahoo_tickers))
+    start_str = pd.Timestamp(start).strftime('%Y-%m-%d')
+    downloaded = []
+
+    plan = price_store.plan_updates(tickers, start, is_settled=_is_settled)
+    skipped = len(tickers) - sum(len(symbols) for symbols in plan.values())
+    if skipped:
+        print(f"   💤 {skipped} symbols up to date (markets closed since last download)")
+
+    for fetch_from, symbols in plan.items():
+        print(f"   📥 Updating {len(symbols)} symbols in price store from {fetch_from}...")
+        fetched_at = datetime.now(timezone.utc)
+        fresh = download_close_matrix(symbols, start=fetch_from)
+        if not fresh.empty:
+            # Auto-adjusted history shifts after a split or dividend: replace it whole
+            readjusted = price_store.find_readjusted(fresh)
+            fresh = fresh.drop(columns=readjusted)
+            price_store.save_closes(fresh)
+            if readjusted:
+                print(f"   🔁 Re-downloading full history of {', '.join(readjusted)} (split/dividend adjustment)")
+                first_stored = [first for first, _ in price_store.get_coverage(readjusted).values()]
+                full_from = min([pd.Timestamp(start)] + [pd.Timestamp(first) for first in first_stored])
+                history = download_close_matrix(readjusted, start=full_from.strftime('%Y-%m-%d'))
+                # Symbols whose history could not be fetched keep their old bars until the next run
+                history = history[[s for s in readjusted if s in history.columns and history[s].notna().any()]]
+                if not history.empty:
+                    price_store.replace_closes(history)
+                    fresh = pd.concat([fresh, history[history.index >= fresh.index.min()]], axis=1)
+            with_data = [s for s in symbols if s in fresh.columns and fresh[s].notna().any()]
+            price_store.mark_refreshed(with_data, when=fetched_at)
+            if fetch_from == start_str:
+                # Whatever starts later than `start` was listed later: never backfill it again
+                price_store.mark_backfilled(with_data, start_str)
+            downloaded.append(fresh)
+
+    closes = price_store.load_closes(tickers, start=start)
+    if closes.empty and downloaded:
+        # Store unavailable (e.g. read-only disk): fall back to what we just downloaded
+        closes = pd.concat(downloaded, axis=1)
+        closes = closes.loc[:, ~closes.columns.duplicated()]
+        closes = closes[closes.index >= pd.Timestamp(start)]
+    return closes
+
+
+def compute_period_changes(closes, now=None):
+    """
+    Derive daily, weekly, MTD and YTD changes from one ticker's close series.
+    Single-series convenience wrapper around returns_engine.period_returns().
+
+    Args:
+        closes: pandas Series of daily closes (NaN rows for closed-market days are dropped)
+        now: reference datetime for MTD/YTD windows (defaults to datetime.now())
+
+    Returns:
+        dict with daily_change, weekly_change, monthly_change, yearly_change
+    """
+    returns = returns_engine.period_returns(closes.to_frame(), now=now)
+    return {period: float(value) for period, value in returns.iloc[0].items()}
+
+
 def fetch_stock_data():
     """
-    Fetch daily, monthly, and YTD data for all portfolio tickers using yfinance
+    Fetch daily, weekly, monthly, and YTD data for all portfolio tickers using yfinance.
+
+    All symbols are read together as one wide close frame from the local price store
+    (topped up with a few bulk requests) and every period change is derived from it
+    in a single vectorized pass (returns_engine.period_returns).
     """
     stock_data = {}
-    
-    for ticker, (yahoo_ticker, descr) in PORTFOLIO_TICKERS.items():
-        yahoo_ticker = yahoo_ticker  # Use
-        company_name = descr  # Default to symbol
-        etoro_symbol = ticker
-        
-        try:
-            # Fetch stock info
-            stock = yf.Ticker(yahoo_ticker)
-            info = stock.info
-            
-            # 1. Ottieni l'orario corrente a New York
-            now_ny = datetime.now(NY_TZ)
-            
-            # 2. Determina se siamo in orario PRE-MARKET (prima delle 9:30 AM ET)
-            # L'orario di apertura è fissato alle 9:30 AM ET.
-            is_pre_market_hours = now_ny.hour < US_OPEN_HOUR or \
-                                (now_ny.hour == US_OPEN_HOUR and now_ny.minute < US_OPEN_MINUTE)
 
-            # Get company name
-            company_name = info.get('longName', info.get('shortName', yahoo_ticker))
-            
-            # Get current price
-            current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-            
-            # Fetch historical data for daily and monthly calculations
-            hist = stock.history(period='1y')
-            
-            if hist.empty:
+    portfolio_tickers = get_tickers()
+    yahoo_by_symbol = {
+        ticker: (yahoo_ticker, descr)
+        for ticker, (yahoo_ticker, descr) in portfolio_tickers.items()
+    }
+    # Names/exchanges come from the registry; only symbols it has never named hit Yahoo .info
+    instrument_registry.seed_from_config(portfolio_tickers)
+    instrument_registry.refresh([yahoo for yahoo, _ in yahoo_by_symbol.values()], fields=('name',))
+
+    print(f"📥 Loading 1y daily history for {len(yahoo_by_symbol)} tickers...")
+    one_year_ago = pd.Timestamp.now().normalize() - pd.DateOffset(years=1)
+    closes = fetch_close_matrix([yahoo for yahoo, _ in yahoo_by_symbol.values()], start=one_year_ago)
+
+    now = datetime.now()
+    returns = returns_engine.period_returns(closes, now=now)
+    now_utc = datetime.now(timezone.utc)
+
+    for etoro_symbol, (yahoo_ticker, descr) in yahoo_by_symbol.items():
+        try:
+            if yahoo_ticker not in closes.columns or closes[yahoo_ticker].dropna().empty:
                 print(f"No historical data for {etoro_symbol}")
                 continue
-            
-            # Calculate daily change
-            if len(hist) >= 2:
-                current = hist['Close'].iloc[-1]
-                previous = hist['Close'].iloc[-2]
-                daily_change = ((current - previous) / previous) * 100
-            else:
-                daily_change = 0.0
-            
-            # Calculate monthly change (MTD - Month-To-Date from start of current month)
-            # Use the same hist data we already fetched (period='1y') to ensure consistency
-            current_year = datetime.now().year
-            current_month = datetime.now().month
-            try:
-                # Use the existing hist data instead of making another API call
-                if not hist.empty:
-                    # Normalize timezone - handle both tz-aware and tz-naive indices
-                    hist_copy = hist.copy()
-                    if hist_copy.index.tz is not None:
-                        hist_copy.index = hist_copy.index.tz_convert(None)
-                    hist_copy.index = pd.to_datetime(hist_copy.index).normalize()
-                    
-                    current_month_start = pd.Timestamp(f'{current_year}-{current_month:02d}-01')
-                    mtd_hist_filtered = hist_copy[hist_copy.index >= current_month_start]
-                    
-                    # Debug: log data points for sample tickers to verify
-                    if etoro_symbol in ['INDO.PA', 'MSFT', 'NVDA', 'AZN.L', 'GLEN.L']:
-                        print(f"  [{etoro_symbol}] MTD data points: {len(mtd_hist_filtered)}, dates: {mtd_hist_filtered.index.tolist()}")
-                    
-                    if len(mtd_hist_filtered) >= 2:
-                        mtd_start = mtd_hist_filtered['Close'].iloc[0]
-                        mtd_current = mtd_hist_filtered['Close'].iloc[-1]
-                        monthly_change = ((mtd_current - mtd_start) / mtd_start) * 100
-                    elif len(mtd_hist_filtered) == 1:
-                        # Only one data point for this month - no change possible
-                        monthly_change = 0.0
-                        if etoro_symbol in ['INDO.PA', 'MSFT', 'NVDA']:
-                            print(f"  [{etoro_symbol}] Only 1 MTD point - setting monthly_change to 0.0")
-                    else:
-                        monthly_change = 0.0
-                else:
-                    monthly_change = 0.0
-            except Exception as e:
-                print(f"MTD calculation error for {etoro_symbol}: {e}")
-                import traceback
-                traceback.print_exc()
-                monthly_change = 0.0
-            
-            # Calculate YTD change (from January 1st of current year)
-            current_year = datetime.now().year
-            try:
-                ytd_hist = stock.history(start=f'{current_year}-01-01')
-                if len(ytd_hist) >= 2:
-                    ytd_start = ytd_hist['Close'].iloc[0]
-                    ytd_current = ytd_hist['Close'].iloc[-1]
-                    yearly_change = ((ytd_current - ytd_start) / ytd_start) * 100
-                else:
-                    yearly_change = 0.0
-            except Exception as e:
-                print(f"YTD calculation error for {etoro_symbol}: {e}")
-                yearly_change = 0.0
-            
-            
-            exchange = info.get('exchange', '')
-            # Expanded US exchanges list including NYSE Arca (PCX), Pink Sheets (PNK), BATS, etc.
-            us_exchanges = ['NASDAQ', 'NYSE', 'AMEX', 'NMS', 'NYQ', 'NAS', 'NGM', 'PCX', 'PNK', 'BTS', 'NCM']
-            is_us_stock = exchange in us_exchanges or 'USD' in yahoo_ticker
-
-            # Check if the asset has actually traded today
-            # If it's a US stock and it is pre-market, it has NOT traded effectively for "Today's" session.
-            # Even if it has pre-market volume, for a "Daily Recap" usually implies the main session or closed session.
-            # For "Morning Recap" (10:00 CET), US stocks are pre-market.
-            
-            has_traded_today = True
-            
-            if is_us_stock and is_pre_market_hours:
-                print(f"Day not yet started for {etoro_symbol} (Pre-market)")
-                daily_change = 0.0
-                has_traded_today = False
-            
-            # Additional safety: if daily_change is exactly 0.0 and volume is 0?
-            # yfinance sometimes attributes prev close to current.
-            # We explicitly flag it.
-
-            # Sanitize NaN values — yfinance can return NaN for tickers
-            # with missing or partial data (e.g. HK stocks on holidays)
-            import math
-            if math.isnan(daily_change):
-                print(f"⚠️  {etoro_symbol}: daily_change is NaN, setting to 0.0")
+
+            series = closes[yahoo_ticker].dropna()
+            changes = returns.loc[yahoo_ticker]
+            daily_change = changes['daily_change']
+
+            is_us_stock = _is_us_listing(yahoo_ticker)
+
+            # Check if the asset's exchange has actually traded today (holidays, weekends and
+            # pre-market included): e.g. at the 10:00 CET "Morning Recap" US stocks have not opened yet.
+            exchange = trading_calendar.exchange_for_symbol(yahoo_ticker)
+            has_traded_today = trading_calendar.has_traded_today(exchange, now_utc)
+            if not has_traded_today:
+                print(f"Day not yet started for {etoro_symbol} (Pre-market / market closed)")
                 daily_change = 0.0
-            if math.isnan(monthly_change):
-                print(f"⚠️  {etoro_symbol}: monthly_change is NaN, setting to 0.0")
-                monthly_change = 0.0
-            if math.isnan(yearly_change):
-                print(f"⚠️  {etoro_symbol}: yearly_change is NaN, setting to 0.0")
-                yearly_change = 0.0
 
             stock_data[etoro_symbol] = {
                 'yahoo_ticker': yahoo_ticker,
-                'company_name': company_name,
-                'price': current_price,
-                'daily_change': daily_change,
-                'weekly_change': 0.0,
-                'monthly_change': monthly_change,
-                'yearly_change': yearly_change,
+                'company_name': descr or instrument_registry.get_name(yahoo_ticker) or yahoo_ticker,
+                'price': float(series.iloc[-1]),
+                'daily_change': float(daily_change),
+                'weekly_change': float(changes['weekly_change']),
+                'monthly_change': float(changes['monthly_change']),
+                'yearly_change': float(changes['yearly_change']),
                 'has_traded_today': has_traded_today,
                 'is_us_stock': is_us_stock
             }
 
-            # Calculate weekly change (5 full trading days from previous Friday close)
-            if len(hist) >= 6:
-                current = hist['Close'].iloc[-1]
-                week_ago = hist['Close'].iloc[-6]
-                weekly_change = ((current - week_ago) / week_ago) * 100
-            elif len(hist) >= 2:
-                current = hist['Close'].iloc[-1]
-                week_ago = hist['Close'].iloc[0]
-                weekly_change = ((current - week_ago) / week_ago) * 100
-            else:
-                weekly_change = 0.0
+            print(f"{etoro_symbol} ({yahoo_ticker}): Daily {daily_change:.2f}%, Monthly {changes['monthly_change']:.2f}%, Yearly {changes['yearly_change']:.2f}%")
 
-            if math.isnan(weekly_change):
-                print(f"⚠️  {etoro_symbol}: weekly_change is NaN, setting to 0.0")
-                weekly_change = 0.0
-            stock_data[etoro_symbol]['weekly_change'] = weekly_change
-            
-            print(f"{etoro_symbol} ({yahoo_ticker}): Daily {daily_change:.2f}%, Monthly {monthly_change:.2f}%, Yearly {yearly_change:.2f}%")
-            
         except Exception as e:
-            print(f"Error fetching data for {etoro_symbol} ({yahoo_ticker}): {e}")
+            print(f"Error processing data for {etoro_symbol} ({yahoo_ticker}): {e}")
             continue
-    
+
+    # Keep the slow-moving periods for the quote-only refresh of the open sessions
+    price_store.save_period_snapshot({data['yahoo_ticker']: data for data in stock_data.values()})
     return stock_data
 
 
+# Yahoo's spark endpoint answers latest price + previous close for many symbols at once
+QUOTE_URL = 'https://query1.finance.yahoo.com/v7/finance/spark'
+# Symbols per spark request: the whole portfolio plus benchmarks fits in one call
+QUOTE_CHUNK_SIZE = 100
+# Headers for Yahoo's JSON endpoints (a browser User-Agent: the default one gets throttled)
+YAHOO_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json',
+}
+
+
+def _parse_spark(payload):
+    """Map a spark response to {symbol: {'price', 'previous_close'}} (both JSON layouts Yahoo serves)."""
+    quotes = {}
+    results = (payload.get('spark') or {}).get('result')
+    if results is not None:
+        # Legacy layout: {"spark": {"result": [{"symbol", "response": [{"meta": {...}}]}]}}
+        entries = []
+        for result in results:
+            for response in result.get('response') or []:
+                meta = response.get('meta') or {}
+                entries.append((result.get('symbol'), meta.get('regularMarketPrice'),
+                                meta.get('chartPreviousClose') or meta.get('previousClose')))
+    else:
+        # Current layout: {"AAPL": {"close": [...], "chartPreviousClose": ...}, ...}
+        entries = []
+        for symbol, data in payload.items():
+            if not isinstance(data, dict):
+                continue
+            closes = [c for c in (data.get('close') or []) if c is not None]
+            entries.append((symbol, closes[-1] if closes else None,
+                            data.get('chartPreviousClose') or data.get('previousClose')))
+
+    for symbol, price, previous_close in entries:
+        if symbol and price is not None:
+            quotes[symbol] = {'price': float(price),
+                              'previous_close': float(previous_close) if previous_close else None}
+    return quotes
+
+
+def fetch_quotes(yahoo_tickers):
+    """
+    Latest price and Yahoo's previous close for many symbols in one batched spark request
+    (a few KB, charged one request per symbol against the shared Yahoo rate limit).
+
+    Returns {yahoo_ticker: {'price': float, 'previous_close': float or None}}.
+    """
+    tickers = list(dict.fromkeys(yahoo_tickers))
+    chunks = [tickers[i:i + QUOTE_CHUNK_SIZE] for i in range(0, len(tickers), QUOTE_CHUNK_SIZE)]
+
+    def _request(chunk):
+        response = requests.get(
+            QUOTE_URL,
+            params={'symbols': ','.join(chunk), 'range': '1d', 'interval': '1d'},
+            headers=YAHOO_HEADERS,
+            timeout=15,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    quotes = {}
+    for payload in yahoo_fetch.map_concurrent(_request, chunks, host=yahoo_fetch.host_of(QUOTE_URL), cost=len):
+        if payload:
+            quotes.update(_parse_spark(payload))
+    return quotes
+
+
+def fetch_stock_quotes():
+    """
+    Quote-only refresh for the open sessions: one batched quote request for every ticker,
+    with daily_change measured against the quote's previous close. The stored close is
+    used instead when the quote has none, or when the exchange calendar confirms it is
+    the previous session's bar (it is adjusted like the cached period changes).
+
+    Weekly, monthly and YTD changes are kept from the last full fetch_stock_data() run
+    (price_store period snapshot). Falls back to fetch_stock_data() when there is no
+    snapshot yet or the quote request fails.
+    """
+    portfolio_tickers = get_tickers()
+    yahoo_by_symbol = {
+        ticker: (yahoo_ticker, descr)
+        for ticker, (yahoo_ticker, descr) in portfolio_tickers.items()
+    }
+    yahoo_tickers = [yahoo for yahoo, _ in yahoo_by_symbol.values()]
+
+    snapshot = price_store.load_period_snapshot(yahoo_tickers)
+    if not snapshot:
+        print("⚠️ No cached period changes yet, running the full history fetch...")
+        return fetch_stock_data()
+
+    print(f"⚡ Refreshing quotes for {len(yahoo_tickers)} tickers...")
+    quotes = fetch_quotes(yahoo_tickers)
+    if not quotes:
+        print("⚠️ Quote refresh returned no data, running the full history fetch...")
+        return fetch_stock_data()
+
+    now_utc = datetime.now(timezone.utc)
+    previous_closes = price_store.get_previous_closes(yahoo_tickers, before=now_utc.date())
+    stock_data = {}
+
+    for etoro_symbol, (yahoo_ticker, descr) in yahoo_by_symbol.items():
+        quote = quotes.get(yahoo_ticker)
+        cached = snapshot.get(yahoo_ticker)
+        if not quote or not cached:
+            print(f"No quote or cached periods for {etoro_symbol}")
+            continue
+
+        exchange = trading_calendar.exchange_for_symbol(yahoo_ticker)
+        previous_close = quote['previous_close']
+        stored = previous_closes.get(yahoo_ticker)
+        if stored:
+            previous_day = trading_calendar.previous_session_date(exchange, now_utc)
+            if not previous_close or (previous_day and stored[0] == previous_day.isoformat()):
+                previous_close = stored[1]
+        daily_change = (quote['price'] / previous_close - 1) * 100 if previous_close else 0.0
+
+        has_traded_today = trading_calendar.has_traded_today(exchange, now_utc)
+        if not has_traded_today:
+            print(f"Day not yet started for {etoro_symbol} (Pre-market / market closed)")
+            daily_change = 0.0
+
+        stock_data[etoro_symbol] = {
+            'yahoo_ticker': yahoo_ticker,
+            'company_name': descr or instrument_registry.get_name(yahoo_ticker) or yahoo_ticker,
+            'price': quote['price'],
+            'daily_change': float(daily_change),
+            'weekly_change': cached['weekly_change'],
+            'monthly_change': cached['monthly_change'],
+            'yearly_change': cached['yearly_change'],
+            'has_traded_today': has_traded_today,
+            'is_us_stock': _is_us_listing(yahoo_ticker)
+        }
+
+        print(f"{etoro_symbol} ({yahoo_ticker}): Daily {daily_change:.2f}% (quote), Monthly {cached['monthly_change']:.2f}%, Yearly {cached['yearly_change']:.2f}%")
+
+    return stock_data
+
 
 def calculate_portfolio_daily_change(stock_data, portfolio_weights=None):
     """
@@ -490,68 +688,67 @@ def calculate_portfolio_daily_change(stock_data, portfolio_weights=None):
     return calculate_portfolio_weighted_change(stock_data, portfolio_weights, metric='daily_change')
 
 
-def calculate_portfolio_weighted_change(stock_data, portfolio_weights=None, metric='daily_change'):
+def _stock_returns(stock_data):
+    """Period changes from a fetch_stock_data() dict as a tickers × PERIODS frame."""
+    return pd.DataFrame(
+        [[data.get(period, 0.0) for period in returns_engine.PERIODS] for data in stock_data.values()],
+        index=list(stock_data.keys()),
+        columns=list(returns_engine.PERIODS),
+    )
+
+
+def calculate_portfolio_attribution(stock_data, portfolio_weights=None):
     """
-    Calculate overall portfolio performance for a specific metric as WEIGHTED average
-    
+    Weighted portfolio return and per-position contribution for every period in one pass.
+    Pure computation: no fetching and no config sync (that is the pipeline's
+    portfolio_sync stage). Without weights every position is equally weighted.
+
     Args:
-        stock_data: dict with stock data
+        stock_data: dict with stock data (daily/weekly/monthly/yearly changes per ticker)
         portfolio_weights: dict with {ticker: weight_percentage}
-        metric: string key to use from stock_data (e.g. 'daily_change', 'weekly_change')
-    
+
     Returns:
-        float: weighted portfolio performance as percentage
+        dict from returns_engine.weighted_attribution() (portfolio, contributions, ...),
+        or None when there is no stock data
     """
     if not stock_data:
-        return 0.0
-    # Fetch fresh weights from BullAware if not provided
-    if portfolio_weights is None:
-        portfolio_weights = fetch_portfolio_weights_from_bullaware()
-    
-    # If still no weights, fallback to equal weights with warning
+        return None
+
     if not portfolio_weights:
         print("⚠️  No portfolio weights available. Using equal weight fallback.")
-        total = sum(data[metric] for data in stock_data.values())
-        return total / len(stock_data)
+        return returns_engine.weighted_attribution(_stock_returns(stock_data))
 
-    # AUTO-SYNC: Update local config based on fetched weights
-    try:
-        from portfolio_manager import sync_portfolio
-        # Update JSON config (add new, remove old)
-        port_tickers = sync_portfolio(portfolio_weights)
-        
-        # RELOAD CONFIG: Update the global variable in config module so subsequent calls use it
-        import config
-        config.PORTFOLIO_TICKERS = port_tickers
-        
-    except Exception as e:
-        print(f"Error during portfolio sync: {e}")
-    
-    # Calculate weighted average
-    weighted_sum = 0.0
-    total_weight = 0.0
-    missing_weights = []
-    
-    for ticker, data in stock_data.items():
-        if ticker in portfolio_weights:
-            weight = portfolio_weights[ticker] / 100.0  # Convert percentage to decimal
-            weighted_sum += data[metric] * weight
-            total_weight += weight
-        else:
-            missing_weights.append(ticker)
-    
-    if missing_weights:
-        print(f"⚠️  No weights found for: {', '.join(missing_weights)}")
+    attribution = returns_engine.weighted_attribution(_stock_returns(stock_data), portfolio_weights)
+
+    if attribution['missing']:
+        print(f"⚠️  No weights found for: {', '.join(attribution['missing'])}")
         print("   These positions are excluded from the weighted calculation")
     
-    if total_weight == 0:
+    if attribution['equal_weight']:
         print("⚠️  Total weight is zero. Using equal weight fallback.")
-        total = sum(data[metric] for data in stock_data.values())
-        return total / len(stock_data)
+
+    return attribution
+
+
+def calculate_portfolio_weighted_change(stock_data, portfolio_weights=None, metric='daily_change', attribution=None):
+    """
+    Calculate overall portfolio performance for a specific metric as WEIGHTED average
     
-    # Calculate weighted performance
-    weighted_performance = weighted_sum
+    Args:
+        stock_data: dict with stock data
+        portfolio_weights: dict with {ticker: weight_percentage}
+        metric: string key to use from stock_data (e.g. 'daily_change', 'weekly_change')
+        attribution: result of calculate_portfolio_attribution() to reuse (skips recomputation)
     
+    Returns:
+        float: weighted portfolio performance as percentage
+    """
+    if attribution is None:
+        attribution = calculate_portfolio_attribution(stock_data, portfolio_weights)
+    if attribution is None:
+        return 0.0
+
+    weighted_performance = attribution['portfolio'][metric]
     print(f"📊 Weighted Portfolio {metric} Change: {weighted_performance:.2f}%")
     
     return weighted_performance
@@ -570,7 +767,7 @@ def fetch_portfolio_history_from_etoro(start_year=2020):
     try:
         # Try official eToro Public API first
         if ETORO_CLIENT_AVAILABLE and etoro_client.is_configured():
-            gain_data = etoro_client.fetch_gain_history(granularity="monthly")
+            gain_data = market_context.get_context().etoro_gain_history(granularity="monthly")
             if gain_data:
                 data = []
                 current_date = datetime.now()
@@ -695,41 +892,30 @@ def fetch_benchmarks_history(start_date='2020-01-01'):
     """
     print(f"📈 Fetching benchmark history since {start_date}...")
     bench_history = pd.DataFrame()
-    
+
+    closes = fetch_close_matrix(list(BENCHMARKS.values()), start=start_date)
+
     for etoro_ticker, yahoo_ticker in BENCHMARKS.items():
-        try:
-            stock = yf.Ticker(yahoo_ticker)
-            hist = stock.history(start=start_date)
-            
-            if not hist.empty:
-                # Normalize index to be timezone-naive for alignment across markets
-                hist.index = hist.index.tz_localize(None).normalize()
-                
-                # Calculate cumulative return
-                start_price = hist['Close'].iloc[0]
-                # (Price / Start_Price - 1) * 100
-                cum_return = ((hist['Close'] / start_price) - 1) * 100
-                
-                # Handle potential duplicate indices if any (rare for daily data but good safety)
-                if not cum_return.index.is_unique:
-                    cum_return = cum_return.groupby(cum_return.index).last()
-                
-                bench_history[etoro_ticker] = cum_return
-            else:
-                print(f"   ⚠️ No history for {etoro_ticker}")
-                
-        except Exception as e:
-            print(f"   ❌ Error fetching history for {etoro_ticker}: {e}")
-            
+        if yahoo_ticker not in closes.columns or closes[yahoo_ticker].dropna().empty:
+            print(f"   ⚠️ No history for {etoro_ticker}")
+            continue
+
+        hist = closes[yahoo_ticker].dropna()
+        # Calculate cumulative return: (Price / Start_Price - 1) * 100
+        start_price = hist.iloc[0]
+        bench_history[etoro_ticker] = ((hist / start_price) - 1) * 100
+
     return bench_history
 
 
-def fetch_benchmarks_performance(start_date='2020-01-01'):
+def fetch_benchmarks_performance(start_date='2020-01-01', history=None):
     """
     Fetch historical performance for benchmarks starting from a specific date.
+    Pass an already-fetched `history` (from fetch_benchmarks_history) to avoid downloading it again.
     Returns a dictionary of cumulative returns for each benchmark.
     """
-    history = fetch_benchmarks_history(start_date)
+    if history is None:
+        history = fetch_benchmarks_history(start_date)
     bench_data = {}
     
     if not history.empty:
@@ -3,10 +3,11 @@ Format the recap output in a nice readable format
 """
 
 from datetime import datetime
-from config import EMOJI_MAP
+from portfolio_manager import get_emojis
 import os
 import random
 import ai_news_generator
+import trading_calendar
 
 # Russian stocks to exclude from all rankings and AI news (sanctioned/untradeable)
 EXCLUDED_TICKERS = {'MNODL.L', 'NVTKL.L'}
@@ -21,7 +22,7 @@ except ImportError:
 
 def get_emoji(etoro_symbol):
     """Get emoji for a given eToro symbol"""
-    return EMOJI_MAP.get(etoro_symbol, '📊')
+    return get_emojis().get(etoro_symbol, '📊')
 
 
 def format_ticker(etoro_symbol, company_name, performance, use_tag=False):
@@ -72,7 +73,7 @@ def generate_recap(stock_data, portfolio_daily, sheets_data, benchmark_data=None
 
     # Calculate top performers
     # Filter for active trading today for the "Daily" list
-    stock_data_active = {k: v for k, v in stock_data.items() if v.get('has_traded_today', True)}
+    stock_data_active = trading_calendar.filter_traded_today(stock_data)
     
     # If weekly, we use weekly_change for the "TOP 5" section
     # If monthly, we skip the daily/weekly section entirely
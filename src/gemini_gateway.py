@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Gemini Gateway
+==============
+Single entry point for Gemini text generation, shared by every post generator.
+
+• Models are tried in DEFAULT_GEMINI_MODELS priority order; models whose daily budget
+  (GEMINI_DAILY_REQUEST_LIMIT, counted by api_usage_tracker) is spent go last.
+• Each model has a circuit breaker. A quota error opens it until the daily quota resets
+  (midnight Pacific) or, for per-minute limits, for the suggested retry delay; 503
+  UNAVAILABLE and timeouts open it for GEMINI_UNAVAILABLE_COOLDOWN_SECONDS; a retired
+  model (404) for a day. Open models are skipped without a request, and the breakers
+  are kept in the Gist ('gemini_model_state'), so later runs that day skip them too.
+• Every request has a timeout and each generation an overall deadline. When all models
+  are cooling down from transient errors and the deadline allows it, the gateway waits
+  for the first one to close instead of giving up.
+
+Usage:
+    import gemini_gateway
+    text, model = gemini_gateway.generate(prompt, 'daily_recap', temperature=0.7, search=True)
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    from google import genai
+    from google.genai import types
+    GENAI_AVAILABLE = True
+except ImportError:
+    GENAI_AVAILABLE = False
+
+try:
+    import api_usage_tracker
+    from api_usage_tracker import QUOTA_TZ   # daily quotas reset at midnight Pacific
+    API_TRACKER_AVAILABLE = True
+except ImportError:
+    API_TRACKER_AVAILABLE = False
+    QUOTA_TZ = timezone(timedelta(hours=-8))
+
+# Default Gemini models in priority order (Smartest -> Standard fallback).
+# Each model belongs to an independent Free Tier quota bucket (20 RPD each).
+DEFAULT_GEMINI_MODELS = [
+    'gemini-3.7-flash',       # Most intelligent & capable (5 RPM, 20 RPD)
+    'gemini-3.6-flash',       # High capability 3.x series (5 RPM, 20 RPD)
+    'gemini-3.5-flash',       # Advanced financial context & reasoning (5 RPM, 20 RPD)
+    'gemini-2.5-flash',       # Robust standard model (5 RPM, 20 RPD)
+]
+
+# Free Tier requests per day for each model
+GEMINI_DAILY_REQUEST_LIMIT = int(os.environ.get('GEMINI_DAILY_REQUEST_LIMIT', '20'))
+# Timeout of a single generate_content request
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', '90'))
+# Overall time budget of one generation (all models, retries and waits included)
+GEMINI_DEADLINE_SECONDS = float(os.environ.get('GEMINI_DEADLINE_SECONDS', '180'))
+# Budget for the main recaps, which used to retry a 503 for up to 50 minutes
+GEMINI_RECAP_DEADLINE_SECONDS = float(os.environ.get('GEMINI_RECAP_DEADLINE_SECONDS', '3000'))
+# Breaker durations for transient failures
+GEMINI_RATE_COOLDOWN_SECONDS = float(os.environ.get('GEMINI_RATE_COOLDOWN_SECONDS', '60'))
+GEMINI_UNAVAILABLE_COOLDOWN_SECONDS = float(os.environ.get('GEMINI_UNAVAILABLE_COOLDOWN_SECONDS', '600'))
+
+# Gist key holding {model: {'open_until': iso, 'reason': str}}
+STATE_KEY = 'gemini_model_state'
+
+# Failures worth waiting out within the deadline (the others skip the model for this call)
+TRANSIENT_FAILURES = ('rate_limit', 'unavailable', 'timeout')
+
+_client = None
+_client_key = None
+_breakers = None
+_lock = threading.RLock()
+
+
+def is_available():
+    """True if the SDK is installed and GEMINI_API_KEY is set."""
+    return GENAI_AVAILABLE and bool(os.environ.get('GEMINI_API_KEY'))
+
+
+def _get_client(api_key=None):
+    """Shared client for `api_key` (default GEMINI_API_KEY); None when Gemini is unavailable."""
+    global _client, _client_key
+    api_key = api_key or os.environ.get('GEMINI_API_KEY')
+    if not GENAI_AVAILABLE or not api_key:
+        return None
+    with _lock:
+        if _client is None or _client_key != api_key:
+            _client = genai.Client(api_key=api_key)
+            _client_key = api_key
+        return _client
+
+
+# ---------------------------------------------------------------------------
+# Circuit breakers
+# ---------------------------------------------------------------------------
+
+def _load_breakers():
+    """{model: {'open_until', 'reason'}} from the Gist, loaded once per process (caller holds _lock)."""
+    global _breakers
+    if _breakers is None:
+        _breakers = {}
+        try:
+            import gist_storage
+            _breakers = dict(gist_storage.load_data().get(STATE_KEY) or {})
+        except Exception as e:
+            print(f"⚠️ Could not load Gemini model state: {e}")
+    return _breakers
+
+
+def _save_breakers():
+    """Persist the breakers that are still open (caller holds _lock)."""
+    now = datetime.now(timezone.utc).isoformat()
+    state = {m: b for m, b in _breakers.items() if b.get('open_until', '') > now}
+    try:
+        import gist_storage
+        data = gist_storage.load_data()
+        if data.get(STATE_KEY) != state:
+            data[STATE_KEY] = state
+            gist_storage.save_data(data)
+    except Exception as e:
+        print(f"⚠️ Could not save Gemini model state: {e}")
+
+
+def open_until(model):
+    """UTC datetime until which `model` is skipped, or None if its breaker is closed."""
+    with _lock:
+        breaker = _load_breakers().get(model)
+    if not breaker:
+        return None
+    until = datetime.fromisoformat(breaker['open_until'])
+    return until if until > datetime.now(timezone.utc) else None
+
+
+def _trip(model, reason, seconds=None):
+    """Open the breaker of `model` for `seconds` (default: until the daily quota resets)."""
+    now = datetime.now(timezone.utc)
+    if seconds is None:
+        local = now.astimezone(QUOTA_TZ)
+        reset = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), tzinfo=QUOTA_TZ)
+        until = reset.astimezone(timezone.utc)
+    else:
+        until = now + timedelta(seconds=seconds)
+    with _lock:
+        _load_breakers()[model] = {'open_until': until.isoformat(), 'reason': reason}
+        _save_breakers()
+    print(f"   🔌 {model} paused until {until.strftime('%H:%M')} UTC ({reason})")
+
+
+def _reset(model):
+    with _lock:
+        if _load_breakers().pop(model, None) is not None:
+            _save_breakers()
+
+
+def _classify(exc):
+    """
+    Map an API error to (failure kind, breaker seconds). Kinds: 'daily_quota',
+    'rate_limit', 'unavailable', 'timeout', 'not_found', 'tools', 'error'.
+    """
+    msg = str(exc).lower()
+    if '429' in msg or 'resource_exhausted' in msg or 'quota' in msg:
+        if 'perday' in msg or 'per_day' in msg or 'per day' in msg:
+            return 'daily_quota', None
+        delay = re.search(r"retry(?:delay)?\W{0,6}(?:in\s+)?(\d+(?:\.\d+)?)s", msg)
+        return 'rate_limit', float(delay.group(1)) if delay else GEMINI_RATE_COOLDOWN_SECONDS
+    if '503' in msg or 'unavailable' in msg or 'overloaded' in msg:
+        return 'unavailable', GEMINI_UNAVAILABLE_COOLDOWN_SECONDS
+    if 'timed out' in msg or 'timeout' in msg or 'deadline' in msg:
+        return 'timeout', GEMINI_UNAVAILABLE_COOLDOWN_SECONDS
+    if '404' in msg or 'not_found' in msg:
+        return 'not_found', 24 * 3600
+    if 'not supported' in msg or 'invalid' in msg:
+        return 'tools', None
+    return 'error', None
+
+
+# ---------------------------------------------------------------------------
+# Model ordering
+# ---------------------------------------------------------------------------
+
+def remaining_budget(models=None):
+    """{model: requests left in the current quota day}, from the usage logged by api_usage_tracker."""
+    models = list(models or DEFAULT_GEMINI_MODELS)
+    used = {}
+    if API_TRACKER_AVAILABLE:
+        try:
+            used = api_usage_tracker.get_model_usage()
+        except Exception as e:
+            print(f"⚠️ Could not read Gemini usage: {e}")
+    return {m: GEMINI_DAILY_REQUEST_LIMIT - used.get(m, 0) for m in models}
+
+
+def _order_models(models):
+    """Priority order for models with budget left, then the spent ones (most headroom first)."""
+    budget = remaining_budget(models)
+    with_budget = [m for m in models if budget[m] > 0]
+    spent = sorted((m for m in models if budget[m] <= 0), key=lambda m: -budget[m])
+    return with_budget + spent
+
+
+# ---------------------------------------------------------------------------
+# Generation
+# ---------------------------------------------------------------------------
+
+def _build_config(temperature, search, response_mime_type, timeout):
+    kwargs = {'temperature': temperature}
+    if response_mime_type:
+        kwargs['response_mime_type'] = response_mime_type
+    if search:
+        try:
+            kwargs['tools'] = [types.Tool(google_search=types.GoogleSearch())]
+        except Exception as e:
+            print(f"⚠️ Search tool unavailable: {e}")
+    try:
+        return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout * 1000)), **kwargs)
+    except Exception:
+        # Older SDKs take no per-request HTTP options
+        return types.GenerateContentConfig(**kwargs)
+
+
+def _attempt(client, model, prompt, request_type, config, validate):
+    """One request. Returns (text, None) on success or (None, (kind, breaker_seconds))."""
+    print(f"   Trying model: {model}...")
+    try:
+        response = client.models.generate_content(model=model, contents=prompt, config=config)
+    except Exception as exc:
+        print(f"⚠️  Model {model} failed: {exc}")
+        if API_TRACKER_AVAILABLE:
+            api_usage_tracker.log_api_request(model, False, request_type)
+        return None, _classify(exc)
+
+    if API_TRACKER_AVAILABLE:
+        api_usage_tracker.log_api_request(model, bool(response and response.text), request_type)
+    text = response.text.strip() if response and response.text else ''
+    if not text:
+        print(f"⚠️  Empty response from {model}")
+        return None, ('error', None)
+    if validate is not None:
+        try:
+            valid = validate(text)
+        except Exception as exc:
+            print(f"⚠️  Unusable response from {model}: {exc}")
+            valid = False
+        if not valid:
+            return None, ('error', None)
+    return text, None
+
+
+def generate(prompt, request_type, temperature=0.7, search=False, response_mime_type=None,
+             validate=None, models=None, deadline_seconds=None, api_key=None):
+    """
+    Generate text with the first model that answers, within the deadline.
+
+    Args:
+        prompt: prompt text
+        request_type: label logged by api_usage_tracker (e.g. 'daily_recap')
+        temperature: sampling temperature
+        search: enable the Google Search tool (retried without it if the model rejects tools)
+        response_mime_type: e.g. 'application/json'
+        validate: optional callable(text) -> bool; a falsy result (or exception) moves on
+                  to the next model
+        models: models in priority order (default DEFAULT_GEMINI_MODELS)
+        deadline_seconds: overall time budget (default GEMINI_DEADLINE_SECONDS)
+        api_key: Gemini API key (default GEMINI_API_KEY)
+
+    Returns:
+        (text, model_name), or (None, None) if no model produced a usable answer
+    """
+    client = _get_client(api_key)
+    if client is None:
+        return None, None
+
+    deadline = time.monotonic() + (deadline_seconds or GEMINI_DEADLINE_SECONDS)
+    candidates = list(models or DEFAULT_GEMINI_MODELS)
+    done = set()       # models that failed this call with a non-transient error
+    no_tools = set()   # models that rejected the search tool
+
+    while True:
+        for model in _order_models(candidates):
+            if model in done:
+                continue
+            paused = open_until(model)
+            if paused:
+                print(f"   ⏭️ Skipping {model} (paused until {paused.strftime('%H:%M')} UTC)")
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 1:
+                print(f"❌ Gemini deadline reached for {request_type}")
+                return None, None
+
+            use_search = search and model not in no_tools
+            config = _build_config(temperature, use_search, response_mime_type, min(GEMINI_TIMEOUT_SECONDS, remaining))
+            text, failure = _attempt(client, model, prompt, request_type, config, validate)
+            if failure and failure[0] == 'tools' and use_search:
+                print(f"   Model {model} might not support search tools, trying without...")
+                no_tools.add(model)
+                config = _build_config(temperature, False, response_mime_type, min(GEMINI_TIMEOUT_SECONDS, remaining))
+                text, failure = _attempt(client, model, prompt, request_type, config, validate)
+            if text:
+                _reset(model)
+                print(f"✅ Generated {request_type} using {model}")
+                return text, model
+
+            kind, seconds = failure
+            if kind == 'daily_quota':
+                _trip(model, 'daily quota exhausted')
+            elif seconds is not None:
+                _trip(model, kind.replace('_', ' '), seconds)
+            if kind not in TRANSIENT_FAILURES:
+                done.add(model)
+
+        # Every model failed or is paused: wait for the first transient pause to end, if it fits
+        reopen = [open_until(m) for m in candidates if m not in done]
+        reopen = [until for until in reopen if until is not None]
+        if not reopen:
+            return None, None
+        wait = (min(reopen) - datetime.now(timezone.utc)).total_seconds()
+        if time.monotonic() + wait >= deadline - 1:
+            print(f"❌ All Gemini models failed or are paused for {request_type}")
+            return None, None
+        print(f"   ⏳ All Gemini models are paused, retrying in {wait:.0f}s...")
+        time.sleep(max(wait, 0))
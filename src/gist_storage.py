@@ -2,17 +2,58 @@
 """
 GitHub Gist Storage Module
 Handles reading and writing data to GitHub Gist for persistent storage outside the repo.
+
+Writes are coalesced: save_data() only updates the in-memory document and marks it
+dirty, and the whole run's changes go out in a single PATCH on flush() (called
+automatically at interpreter exit). Call flush() where durability matters, e.g. after
+recording what was posted. Set GIST_DEFER_WRITES=0 to PATCH on every save instead.
+
+The document is kept by a pluggable backend chosen with STATE_BACKEND: 'gist'
+(default, used on GitHub Actions) or 'sqlite' (state_store.py, for hosts with a
+local disk). With 'sqlite', STATE_GIST_REPLICA=1 copies saved shards to the Gist
+from a background thread so GitHub Actions runs still see the current state.
 """
 
 import os
 import json
+import atexit
+import threading
+import base64
+import bisect
+import gzip
+import hashlib
 import requests
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
 
 # Gist configuration
 GIST_ID = os.environ.get('GIST_ID', '')  # Will be set after first run
 GIST_FILENAME = 'portfolio_recap_data.json'
 
+# Coalesce saves into one PATCH per run (flushed at exit) instead of one per mutation
+DEFER_WRITES = os.environ.get('GIST_DEFER_WRITES', '1') != '0'
+
+# Where the document lives: 'gist' or 'sqlite' (see the module docstring)
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'gist').strip().lower()
+# With the sqlite backend, mirror saved shards to the Gist in the background
+STATE_GIST_REPLICA = os.environ.get('STATE_GIST_REPLICA', '0') == '1'
+# A replicated shard changed both locally and in the Gist: 'hold' keeps the local copy
+# but does not replicate it, 'remote' takes the Gist version, 'local' overwrites the Gist
+STATE_CONFLICT_POLICY = os.environ.get('STATE_CONFLICT_POLICY', 'hold').strip().lower()
+
+# Local copy of the Gist files and their ETag: loads revalidate with If-None-Match
+# and read this file on 304 Not Modified (or when GitHub is unreachable)
+GIST_MIRROR_FILE = os.environ.get(
+    'GIST_MIRROR_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'gist_mirror.json')
+)
+
 # Legacy data to migrate if Gist is empty
 LEGACY_HISTORY = [
   {
@@ -37,11 +78,221 @@ LEGACY_HISTORY = [
   }
 ]
 
+# Each domain lives in its own Gist file, so a save only uploads the shards that changed.
+# Keys not listed here (e.g. added by other modules) go to the 'misc' shard.
+SHARDS = {
+    'recap': ('recap_history', 'used_tags', 'used_stock_focus_tickers'),
+    'perf': ('perf_history',),
+    'portfolio': ('portfolio_config', 'portfolio_emojis', 'pie_chart_index'),
+    'sessions': ('session_runs',),
+    'etoro': ('etoro_history', 'etoro_instruments'),
+    'posts': ('last_etoro_post', 'stock_focus_posts', 'commented_news_hashes'),
+    'api_usage': ('gemini_api_usage', 'gemini_model_state'),
+}
+MISC_SHARD = 'misc'
+SHARD_FILE_PREFIX = 'portfolio_recap_'
+
+_KEY_TO_SHARD = {key: shard for shard, keys in SHARDS.items() for key in keys}
+
+
+def shard_filename(shard):
+    """Gist file name holding one shard, e.g. 'portfolio_recap_perf.json'."""
+    return f'{SHARD_FILE_PREFIX}{shard}.json'
+
+
+def _shard_of(key):
+    return _KEY_TO_SHARD.get(key, MISC_SHARD)
+
+
+# Shards whose JSON exceeds this many bytes are uploaded gzip-compressed and base64-encoded
+# (0 disables compression)
+GZIP_SHARD_BYTES = int(os.environ.get('GIST_GZIP_SHARD_BYTES', str(128 * 1024)))
+GZIP_ENCODING = 'gzip+base64'
+
+
+def _serialize(values):
+    return json.dumps(values, separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+
+
+def _encode_shard(content):
+    """File content for a serialized shard, compressed when it is large."""
+    raw = content.encode('utf-8', 'surrogatepass')  # recap texts hold escaped emoji halves
+    if not GZIP_SHARD_BYTES or len(raw) <= GZIP_SHARD_BYTES:
+        return content
+    packed = base64.b64encode(gzip.compress(raw, mtime=0)).decode('ascii')
+    return json.dumps({'__encoding__': GZIP_ENCODING, 'data': packed})
+
+
+def _decode_shard(content):
+    """Parse a shard file, transparently expanding compressed ones."""
+    values = json.loads(content)
+    if isinstance(values, dict) and values.get('__encoding__') == GZIP_ENCODING:
+        values = json.loads(gzip.decompress(base64.b64decode(values['data'])).decode('utf-8', 'surrogatepass'))
+    return values
+
+
+class GistDocument(dict):
+    """
+    The whole Gist as one dict, backed by per-domain shards.
+
+    A shard's JSON is parsed (and, for files the API truncated, downloaded from its
+    raw URL) only when one of its keys is first accessed. Each loaded shard remembers
+    the serialized content last synced with the Gist, so dirty_shards() can tell
+    exactly which files a save has to upload.
+    """
+
+    def __init__(self, values=None, raw=None, raw_urls=None, headers=None):
+        super().__init__()
+        self._raw = dict(raw or {})            # shard -> unparsed content
+        self._raw_urls = dict(raw_urls or {})  # shard -> raw_url of truncated files
+        self._headers = headers
+        self._loaded = set()
+        self._baseline = {}                    # shard -> serialized content in the Gist
+        self.deleted_files = set()             # Gist files to remove on the next save
+        self.failed_shards = set()             # shards that could not be read: never saved
+        if values is not None:
+            # Documents built from values (defaults, legacy migration) start fully loaded
+            # with no baseline, so every non-empty shard is written on the first save.
+            self._loaded.update(SHARDS)
+            self._loaded.add(MISC_SHARD)
+            dict.update(self, values)
+
+    def _ensure(self, shard):
+        if shard in self._loaded:
+            return
+        # Pipeline stages read the document concurrently: the shard is fetched and decoded
+        # under the lock and only marked loaded once its values are in place
+        with _data_lock:
+            if shard in self._loaded:
+                return
+            content = self._raw.get(shard)
+            failed = False
+            if content is None and shard in self._raw_urls:
+                try:
+                    response = requests.get(self._raw_urls[shard], headers=self._headers, timeout=10)
+                    response.raise_for_status()
+                    content = response.text
+                except Exception as e:
+                    print(f"⚠️ Error loading Gist shard '{shard}': {e}")
+                    failed = True
+            if content:
+                try:
+                    values = _decode_shard(content)
+                    dict.update(self, values)
+                    self._baseline[shard] = _serialize(values)
+                except ValueError as e:
+                    print(f"⚠️ Corrupt Gist shard '{shard}': {e}")
+                    failed = True
+            if failed:
+                # Reads see it as empty, but saving it would overwrite the real file in the Gist
+                print(f"   ⚠️ Shard '{shard}' will not be saved this run")
+                self.failed_shards.add(shard)
+            self._raw.pop(shard, None)
+            self._raw_urls.pop(shard, None)
+            self._loaded.add(shard)
+
+    def _ensure_all(self):
+        for shard in list(SHARDS) + [MISC_SHARD]:
+            self._ensure(shard)
+
+    def is_loaded(self, key):
+        """True if the shard holding `key` has been parsed (so it may have changed)."""
+        return _shard_of(key) in self._loaded
+
+    def shard_values(self, shard):
+        """Current {key: value} content of one shard."""
+        self._ensure(shard)
+        return {k: v for k, v in dict.items(self) if _shard_of(k) == shard}
+
+    def dirty_shards(self):
+        """{shard: serialized content} for loaded shards that differ from the Gist."""
+        dirty = {}
+        for shard in self._loaded - self.failed_shards:
+            values = self.shard_values(shard)
+            if not values and shard not in self._baseline:
+                continue
+            content = _serialize(values)
+            if content != self._baseline.get(shard):
+                dirty[shard] = content
+        return dirty
+
+    def mark_synced(self, shards):
+        """Record the uploaded content as the new baseline of each shard."""
+        for shard, content in shards.items():
+            self._baseline[shard] = content
+        self.deleted_files.clear()
+
+    # Key access loads the owning shard first; whole-document views load every shard.
+    def __getitem__(self, key):
+        self._ensure(_shard_of(key))
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._ensure(_shard_of(key))
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._ensure(_shard_of(key))
+        dict.__delitem__(self, key)
+
+    def __contains__(self, key):
+        self._ensure(_shard_of(key))
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        self._ensure(_shard_of(key))
+        return dict.get(self, key, default)
+
+    def setdefault(self, key, default=None):
+        self._ensure(_shard_of(key))
+        return dict.setdefault(self, key, default)
+
+    def pop(self, key, *default):
+        self._ensure(_shard_of(key))
+        return dict.pop(self, key, *default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __iter__(self):
+        self._ensure_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._ensure_all()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._ensure_all()
+        return dict.keys(self)
+
+    def values(self):
+        self._ensure_all()
+        return dict.values(self)
+
+    def items(self):
+        self._ensure_all()
+        return dict.items(self)
+
+    def copy(self):
+        self._ensure_all()
+        return dict(dict.items(self))
+
+
 _data_cache = None
+# Serializes Gist reads/writes when pipeline stages run concurrently (re-entrant so
+# read-modify-write helpers can hold it across load_data() and save_data())
+_data_lock = threading.RLock()
+# True while the cached document has changes not yet sent to the Gist
+_dirty = False
 
 def _invalidate_cache():
+    """Drop the cached document so the next load re-reads the Gist (pending writes are kept)."""
     global _data_cache
-    _data_cache = None
+    with _data_lock:
+        if not _dirty:
+            _data_cache = None
 
 def _get_headers():
     """Get authorization headers for GitHub API"""
@@ -77,102 +328,235 @@ def verify_token_permissions(token):
     except Exception:
         return True # Assume ok if check fails to avoid blocking
 
+def _read_mirror(gist_id):
+    """Return the local mirror {'gist_id', 'etag', 'files'} of this Gist, or None."""
+    try:
+        with open(GIST_MIRROR_FILE, 'r', encoding='utf-8') as f:
+            mirror = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return mirror if mirror.get('gist_id') == gist_id and mirror.get('files') else None
+
+def _write_mirror(gist_id, etag, files):
+    """Store the Gist files (as returned by the API) and their ETag in the local mirror."""
+    if not files:
+        return
+    mirror = {
+        'gist_id': gist_id,
+        'etag': etag,
+        'files': {
+            name: {k: entry.get(k) for k in ('content', 'truncated', 'raw_url')}
+            for name, entry in files.items() if entry
+        },
+    }
+    try:
+        os.makedirs(os.path.dirname(GIST_MIRROR_FILE), exist_ok=True)
+        tmp_path = GIST_MIRROR_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(mirror, f, ensure_ascii=False)
+        os.replace(tmp_path, GIST_MIRROR_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not write Gist mirror: {e}")
+
 def _get_default_data():
     """Return default data structure, migrating local history if available"""
     default_data = {
         'recap_history': [],
         'used_tags': [],
-        'last_updated': None
     }
     
     # Use embedded legacy history for migration
     print(f"📦 checking for migration: Using embedded legacy history ({len(LEGACY_HISTORY)} items).")
     default_data['recap_history'] = LEGACY_HISTORY
             
-    return default_data
+    return GistDocument(default_data)
 
 def load_data():
     """
     Load data from GitHub Gist. Results are cached in-memory for the lifetime
     of the process so multiple callers within a single run share one API call.
+    Each shard is only parsed when one of its keys is first accessed.
 
     Returns:
-        dict: Data containing recap_history, used_tags, etc.
+        GistDocument: dict containing recap_history, used_tags, etc.
     """
+    with _data_lock:
+        return _load_data()
+
+def _load_data():
+    """Body of load_data(); the caller holds _data_lock."""
     global _data_cache
     if _data_cache is not None:
         return _data_cache
+    data = get_backend().load()
+    if data is None:
+        # Transient failure: serve defaults without caching them, so the next call retries
+        return _get_default_data()
+    _data_cache = data
+    return _data_cache
 
+def _load_from_gist():
+    """Fetch the document from the Gist (None if the request failed)."""
     headers = _get_headers()
     gist_id = os.environ.get('GIST_ID', '')
     
     if not headers:
         print("⚠️ No GitHub token found, using empty data")
-        _data_cache = _get_default_data()
-        return _data_cache
+        return _get_default_data()
 
     if not gist_id:
         print("ℹ️ No GIST_ID set, will create new gist on save")
-        _data_cache = _get_default_data()
-        return _data_cache
+        return _get_default_data()
     
-    try:
-        response = requests.get(
-            f'https://api.github.com/gists/{gist_id}',
-            headers=headers,
-            timeout=10
-        )
-        
-        migrated = False
-        data = _get_default_data() # Start with defaults (including legacy history)
+    mirror = _read_mirror(gist_id)
+    request_headers = dict(headers)
+    if mirror and mirror.get('etag'):
+        request_headers['If-None-Match'] = mirror['etag']
 
-        if response.status_code == 200:
-            gist_data = response.json()
-            if GIST_FILENAME in gist_data.get('files', {}):
-                content = gist_data['files'][GIST_FILENAME]['content']
+    try:
+        try:
+            response = requests.get(
+                f'https://api.github.com/gists/{gist_id}',
+                headers=request_headers,
+                timeout=10
+            )
+        except requests.exceptions.RequestException as e:
+            if not mirror:
+                raise
+            print(f"⚠️ GitHub unreachable ({e}), using the local Gist mirror")
+            response = None
+
+        files = None
+        if response is None or response.status_code == 304 or (mirror and response.status_code >= 500):
+            if response is not None and response.status_code >= 500:
+                print(f"⚠️ Gist API error {response.status_code}, using the local Gist mirror")
+            elif response is not None:
+                print(f"✅ Gist unchanged (ID: {gist_id[:8]}...), using the local mirror")
+            files = mirror['files']
+        elif response.status_code == 200:
+            files = response.json().get('files', {})
+            _write_mirror(gist_id, response.headers.get('ETag'), files)
+
+        if files is not None:
+            raw, raw_urls = {}, {}
+            for shard in list(SHARDS) + [MISC_SHARD]:
+                entry = files.get(shard_filename(shard))
+                if not entry:
+                    continue
+                if entry.get('truncated'):
+                    raw_urls[shard] = entry.get('raw_url')
+                else:
+                    raw[shard] = entry.get('content')
+
+            if raw or raw_urls:
+                if response is not None and response.status_code == 200:
+                    print(f"✅ Loaded data from Gist (ID: {gist_id[:8]}..., {len(raw) + len(raw_urls)} shards)")
+                data = GistDocument(raw=raw, raw_urls=raw_urls, headers=headers)
+            elif GIST_FILENAME in files:
+                # Single-file layout: split it into shards, written (and the old file removed) on the next save
+                print(f"🔄 Migrating {GIST_FILENAME} to per-domain Gist files...")
+                entry = files[GIST_FILENAME]
+                content = entry['content']
+                if entry.get('truncated'):
+                    raw_response = requests.get(entry['raw_url'], headers=headers, timeout=10)
+                    raw_response.raise_for_status()
+                    content = raw_response.text
                 loaded_data = json.loads(content)
-                print(f"✅ Loaded data from Gist (ID: {gist_id[:8]}...)")
-                
-                # Check if we need to merge legacy history (if Gist history is empty)
-                if not loaded_data.get('recap_history') and LEGACY_HISTORY:
-                    print("🔄 Gist history is empty. Merging legacy history...")
-                    loaded_data['recap_history'] = LEGACY_HISTORY
-                    migrated = True
-                
-                data = loaded_data
+                loaded_data.pop('last_updated', None)
+                data = GistDocument(loaded_data)
+                data.deleted_files.add(GIST_FILENAME)
+                save_data(data)
             else:
-                print(f"⚠️ File {GIST_FILENAME} not found in gist, using defaults (will migrate)")
-                migrated = True
+                print(f"⚠️ No data files found in gist, using defaults (will migrate)")
+                data = _get_default_data()
         elif response.status_code == 404:
             print(f"⚠️ Gist not found (ID: {gist_id}), using defaults (will migrate)")
-            migrated = True
+            data = _get_default_data()
         else:
             print(f"⚠️ Error loading gist: {response.status_code} - {response.text}")
             # Fallback to defaults (with legacy history)
-            migrated = True
-            
-        # If we performed a migration (merge or fresh default), we should ideally save it.
-        # But this function is a 'load', so we just return the data.
-        # The next 'save_data' call (which happens after generating news) will persist it.
-        # If the news generation fails, we might lose the migration for this run, but it will try again next time.
-        _data_cache = data
-        return _data_cache
+            data = _get_default_data()
+
+        # Check if we need to merge legacy history (if Gist history is empty)
+        if not data.get('recap_history') and LEGACY_HISTORY:
+            print("🔄 Gist history is empty. Merging legacy history...")
+            data['recap_history'] = LEGACY_HISTORY
+
+        # Defaults and migrations are persisted by the next save_data()/flush() of the run.
+        return data
 
     except Exception as e:
         print(f"⚠️ Error loading from Gist: {e}")
-        return _get_default_data()
+        return None
 
 def save_data(data):
     """
     Save data to GitHub Gist and update the in-memory cache.
+    With deferred writes (default) the document is only marked dirty here and
+    sent by the next flush(). Only the shards that changed are uploaded.
 
     Args:
         data: Dict containing recap_history, used_tags, etc.
 
     Returns:
-        bool: True if save was successful
+        bool: True if save was successful (or queued for the next flush)
+    """
+    global _data_cache, _dirty
+    with _data_lock:
+        if not isinstance(data, GistDocument):
+            data = GistDocument(data)
+        if DEFER_WRITES:
+            _data_cache = data
+            _dirty = True
+            return True
+        return _save_data(data)
+
+def flush():
+    """
+    Send pending changes to the Gist in a single PATCH.
+
+    Returns:
+        bool: True if nothing was pending or the save succeeded
     """
+    global _dirty
+    with _data_lock:
+        if not _dirty:
+            return True
+        ok = _save_data(_data_cache)
+        if ok:
+            _dirty = False
+        return ok
+
+def _at_exit():
+    flush()
+    if STATE_BACKEND == 'sqlite' and STATE_GIST_REPLICA:
+        _get_replicator().drain()
+
+atexit.register(_at_exit)
+
+def _save_data(data):
+    """Persist the changed shards through the configured backend; the caller holds _data_lock."""
     global _data_cache
+    _data_cache = data  # Keep cache in sync with what we're saving
+    if RETENTION_ENABLED:
+        compact(data)
+    return get_backend().save(data)
+
+def _save_to_gist(data):
+    """PATCH (or create) the Gist with the changed shards only."""
+    dirty = data.dirty_shards()
+    if not dirty and not data.deleted_files:
+        return True
+
+    files = {shard_filename(shard): {'content': _encode_shard(content)} for shard, content in dirty.items()}
+    files.update({name: None for name in data.deleted_files})
+    if not _push_files(files, sorted(dirty)):
+        return False
+    data.mark_synced(dirty)
+    return True
+
+def _push_files(files, shards):
+    """Send {filename: {'content': ...} or None (delete)} to the Gist in one request."""
     headers = _get_headers()
     gist_id = os.environ.get('GIST_ID', '')
     
@@ -180,17 +564,9 @@ def save_data(data):
         print("⚠️ No GitHub token found, cannot save to Gist")
         return False
     
-    data['last_updated'] = datetime.now().isoformat()
-    _data_cache = data  # Keep cache in sync with what we're saving
-    content = json.dumps(data, indent=2)
-    
     gist_payload = {
         'description': 'Portfolio Daily Recap - Data Storage',
-        'files': {
-            GIST_FILENAME: {
-                'content': content
-            }
-        }
+        'files': files
     }
     
     try:
@@ -205,6 +581,7 @@ def save_data(data):
         else:
             # Create new gist (private)
             gist_payload['public'] = False
+            gist_payload['files'] = {name: f for name, f in files.items() if f is not None}
             response = requests.post(
                 'https://api.github.com/gists',
                 headers=headers,
@@ -215,10 +592,12 @@ def save_data(data):
         if response.status_code in [200, 201]:
             result = response.json()
             new_gist_id = result.get('id', '')
+            # The response carries the updated files: refresh the mirror so the next load revalidates
+            _write_mirror(new_gist_id or gist_id, response.headers.get('ETag'), result.get('files'))
             if not gist_id and new_gist_id:
                 print(f"🆕 Created new Gist! Add this as secret GIST_ID: {new_gist_id}")
             else:
-                print(f"✅ Data saved to Gist (ID: {new_gist_id[:8]}...)")
+                print(f"✅ Data saved to Gist (ID: {new_gist_id[:8]}..., shards: {', '.join(shards)})")
             return True
 
         elif response.status_code == 403:
@@ -297,42 +676,589 @@ def save_portfolio_config(tickers, emojis):
     save_data(data)
 
 
+# ---------------------------------------------------------------------------
+# Storage backends: load() returns the document (None on a transient failure),
+# save(document) persists its dirty shards and returns True on success.
+# ---------------------------------------------------------------------------
+
+class GistBackend:
+    """The document lives in the Gist, one file per shard."""
+
+    name = 'gist'
+
+    def load(self):
+        return _load_from_gist()
+
+    def save(self, data):
+        return _save_to_gist(data)
+
+
+class SQLiteBackend:
+    """
+    The document lives in the local state_store database, one row per shard.
+    An empty database is seeded once from the Gist (when GIST_ID is set).
+    """
+
+    name = 'sqlite'
+
+    def load(self):
+        import state_store
+        shards = state_store.load_shards()
+        if shards:
+            if STATE_GIST_REPLICA:
+                shards.update(_pull_remote_changes(shards))
+            return GistDocument(raw=shards)
+        if not os.environ.get('GIST_ID'):
+            return _get_default_data()
+        print("🔄 Local state store is empty, seeding it from the Gist...")
+        data = _load_from_gist()
+        if data is None:
+            return None
+        data._ensure_all()
+        if data.failed_shards:
+            # Not stored (nor saved this run); with STATE_GIST_REPLICA the next load pulls them
+            print(f"⚠️ Could not read Gist shards {', '.join(sorted(data.failed_shards))}, "
+                  f"they are left out of the local store")
+        # Shards read from the Gist are stored as already replicated
+        state_store.save_shards(dict(data._baseline), replicated=True)
+        raw_urls = _mirror_raw_urls()
+        state_store.set_remote_versions({shard: (_digest(content), raw_urls.get(shard))
+                                         for shard, content in data._baseline.items()})
+        return data
+
+    def save(self, data):
+        import state_store
+        dirty = data.dirty_shards()
+        if not dirty and not data.deleted_files:
+            return True
+        if dirty and not state_store.save_shards(dirty):
+            return False
+        if data.deleted_files and not state_store.queue_deletes(data.deleted_files):
+            return False
+        data.mark_synced(dirty)
+        if STATE_GIST_REPLICA:
+            _get_replicator().notify()
+        return True
+
+
+def _digest(content):
+    """Fingerprint of a serialized shard, to tell whether the Gist copy changed."""
+    # Escaped emoji halves in old recap texts come back from GitHub as whole characters
+    content = content.encode('utf-16', 'surrogatepass').decode('utf-16', 'surrogatepass')
+    return hashlib.sha1(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _mirror_raw_urls():
+    """{shard: raw_url} of the shard files in the local Gist mirror."""
+    mirror = _read_mirror(os.environ.get('GIST_ID', '')) or {}
+    files = mirror.get('files') or {}
+    return {shard: (files.get(shard_filename(shard)) or {}).get('raw_url')
+            for shard in list(SHARDS) + [MISC_SHARD]}
+
+
+def _read_remote_shards(known):
+    """
+    Revalidate the Gist (conditional GET against the local mirror) and return
+    {shard: (serialized content, raw_url)} for its shard files. The content is None when
+    the raw_url matches the one in `known` ({shard: (digest, raw_url)}): the file has not
+    changed, so nothing is downloaded. Returns None if the Gist cannot be read.
+    """
+    headers = _get_headers()
+    gist_id = os.environ.get('GIST_ID', '')
+    if not headers or not gist_id:
+        return None
+    mirror = _read_mirror(gist_id)
+    request_headers = dict(headers)
+    if mirror and mirror.get('etag'):
+        request_headers['If-None-Match'] = mirror['etag']
+    try:
+        response = requests.get(f'https://api.github.com/gists/{gist_id}', headers=request_headers, timeout=10)
+        if response.status_code == 304 and mirror:
+            files = mirror['files']
+        elif response.status_code == 200:
+            files = response.json().get('files', {})
+            _write_mirror(gist_id, response.headers.get('ETag'), files)
+        else:
+            print(f"⚠️ Could not revalidate the Gist: {response.status_code}")
+            return None
+
+        remote = {}
+        for shard in list(SHARDS) + [MISC_SHARD]:
+            entry = files.get(shard_filename(shard))
+            if not entry:
+                continue
+            raw_url = entry.get('raw_url')
+            if raw_url and known.get(shard, (None, None))[1] == raw_url:
+                remote[shard] = (None, raw_url)
+                continue
+            content = entry.get('content')
+            if entry.get('truncated'):
+                raw_response = requests.get(raw_url, headers=headers, timeout=10)
+                raw_response.raise_for_status()
+                content = raw_response.text
+            remote[shard] = (_serialize(_decode_shard(content)), raw_url)
+        return remote
+    except Exception as e:
+        print(f"⚠️ Could not revalidate the Gist: {e}")
+        return None
+
+
+def _pull_remote_changes(shards):
+    """
+    Compare the local shards with the Gist and return {shard: content} to use instead:
+    shards changed in the Gist (e.g. by a GitHub Actions run) replace local copies that
+    have nothing pending. A shard changed on both sides is resolved by STATE_CONFLICT_POLICY.
+    """
+    import state_store
+    known = state_store.remote_versions()
+    remote = _read_remote_shards(known)
+    if remote is None:
+        return {}
+    pending = state_store.pending_shards()
+    pulled, seen = {}, {}
+    for shard, (content, raw_url) in remote.items():
+        if content is None:
+            continue
+        digest = _digest(content)
+        if digest == known.get(shard, (None, None))[0] or (shard in shards and digest == _digest(shards[shard])):
+            seen[shard] = (digest, raw_url)
+            continue
+        if shard in pending:
+            if shard not in known or STATE_CONFLICT_POLICY == 'local':
+                # No record of the Gist copy (or told to prefer ours): replicate over it
+                seen[shard] = (digest, raw_url)
+                continue
+            if STATE_CONFLICT_POLICY != 'remote':
+                print(f"⚠️ Shard '{shard}' changed both locally and in the Gist: keeping the local copy "
+                      f"and not replicating it (set STATE_CONFLICT_POLICY=remote or local to resolve)")
+                continue
+        pulled[shard] = content
+        seen[shard] = (digest, raw_url)
+    if pulled:
+        state_store.save_shards(pulled, replicated=True)
+        print(f"⬇️ Pulled shards changed in the Gist: {', '.join(sorted(pulled))}")
+    state_store.set_remote_versions(seen)
+    return pulled
+
+
+class GistReplicator:
+    """Background thread pushing shards saved in the state store to the Gist."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def notify(self):
+        """Schedule a replication pass (starts the thread on first use)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='gist-replicator', daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.replicate()
+
+    def replicate(self):
+        """
+        Push every pending shard (and file deletion) in one PATCH. A shard whose Gist copy
+        changed since it was last seen is held back instead of overwritten.
+        Returns True if nothing is left pending.
+        """
+        import state_store
+        with self._lock:
+            pending = state_store.pending_shards()
+            deletes = state_store.pending_deletes()
+            if not pending and not deletes:
+                return True
+            if not os.environ.get('GIST_ID'):
+                print("⚠️ STATE_GIST_REPLICA is on but GIST_ID is not set, skipping replication")
+                return False
+            known = state_store.remote_versions()
+            remote = _read_remote_shards(known)
+            if remote is None:
+                return False
+            held = sorted(
+                shard for shard in pending
+                if shard in known and remote.get(shard, (None, None))[0] is not None
+                and _digest(remote[shard][0]) != known[shard][0]
+            )
+            if held and STATE_CONFLICT_POLICY != 'local':
+                print(f"⚠️ Not replicating shards changed in the Gist since the last sync: {', '.join(held)}")
+                pending = {shard: entry for shard, entry in pending.items() if shard not in held}
+            else:
+                held = []
+            if not pending and not deletes:
+                return False
+            files = {shard_filename(shard): {'content': _encode_shard(content)}
+                     for shard, (content, _) in pending.items()}
+            files.update({name: None for name in deletes})
+            if not _push_files(files, sorted(pending) or sorted(deletes)):
+                return False
+            state_store.mark_replicated({shard: version for shard, (_, version) in pending.items()})
+            raw_urls = _mirror_raw_urls()
+            state_store.set_remote_versions({shard: (_digest(content), raw_urls.get(shard))
+                                             for shard, (content, _) in pending.items()})
+            state_store.clear_deletes(deletes)
+            return not held
+
+    def drain(self):
+        """Replicate whatever is still pending (called at exit, after the final flush)."""
+        if not self.replicate():
+            print("⚠️ Some state shards are not in the Gist yet, they will be retried on the next run")
+
+
+_backend = None
+_replicator = None
+
+
+def get_backend():
+    """The storage backend selected by STATE_BACKEND (built on first use)."""
+    global _backend
+    if _backend is None:
+        if STATE_BACKEND == 'sqlite':
+            _backend = SQLiteBackend()
+        else:
+            if STATE_BACKEND != 'gist':
+                print(f"⚠️ Unknown STATE_BACKEND '{STATE_BACKEND}', using the Gist")
+            _backend = GistBackend()
+    return _backend
+
+
+def _get_replicator():
+    global _replicator
+    if _replicator is None:
+        _replicator = GistReplicator()
+    return _replicator
+
+
+# ---------------------------------------------------------------------------
+# Retention: one compaction pass over the document before every save, so shard
+# size (and load/parse time) stays bounded however long the system has run.
+#
+# Policies address a collection by dotted path ('a.b' = data['a']['b']): a list of
+# records or a dict of records keyed by id. 'time' names the record field holding
+# its ISO timestamp (None: the dict key itself starts with the date).
+#   max_age_days  drop records older than this many days
+#   max_count     keep only the newest N records
+#   downsample    ((max_age_days, 'daily' | 'weekly' | 'monthly'), ...) resolution
+#                 tiers for a columnar series such as perf_history (None = no limit)
+# ---------------------------------------------------------------------------
+
+RETENTION_ENABLED = os.environ.get('GIST_RETENTION', '1') != '0'
+
+RETENTION_POLICIES = {
+    'gemini_api_usage.requests': {'time': 'timestamp', 'max_age_days': 30, 'max_count': 1000},
+    'gemini_api_usage.summary.daily': {'time': None, 'max_age_days': 400},
+    'gemini_api_usage.summary.quota_daily': {'time': None, 'max_age_days': 7},
+    'commented_news_hashes': {'time': 'commented_at', 'max_count': 150},
+    'session_runs': {'time': None, 'max_age_days': 31},
+    'perf_history': {'downsample': ((365, 'daily'), (3 * 365, 'weekly'), (None, 'monthly'))},
+}
+
+# Applied by analytics_tracker to the local post database (data/post_analytics.json)
+ANALYTICS_RETENTION_POLICIES = {
+    'posts': {'time': 'published_at', 'max_age_days': 730, 'max_count': 2000},
+}
+
+
+def _record_time(key, record, field):
+    """ISO timestamp of a record ('' when unknown: never expires, ranks as oldest)."""
+    if field is None:
+        return str(key)
+    value = record.get(field) if isinstance(record, dict) else None
+    return str(value) if value else ''
+
+
+def _compact_records(items, policy, today):
+    """Apply max_age_days / max_count to a list or dict of records. Returns (items, removed)."""
+    entries = list(items.items()) if isinstance(items, dict) else list(enumerate(items))
+    kept = [(key, record, _record_time(key, record, policy.get('time'))) for key, record in entries]
+    if policy.get('max_age_days') is not None:
+        cutoff = (today - timedelta(days=policy['max_age_days'])).isoformat()
+        kept = [entry for entry in kept if not entry[2] or entry[2][:10] >= cutoff]
+    max_count = policy.get('max_count')
+    if max_count is not None and len(kept) > max_count:
+        # Stable sort: on equal timestamps the later entries are the ones kept
+        newest = sorted(range(len(kept)), key=lambda i: kept[i][2])[-max_count:]
+        kept = [kept[i] for i in sorted(newest)]
+    removed = len(entries) - len(kept)
+    if not removed:
+        return items, 0
+    if isinstance(items, dict):
+        return {key: record for key, record, _ in kept}, removed
+    return [record for _, record, _ in kept], removed
+
+
+def _downsample_columns(encoded, tiers, today):
+    """
+    Thin a columnar {'start', 'day_deltas', 'perf_bp'} series in place, keeping the last
+    record of each day / ISO week / month according to its age tier. The latest record
+    and the maximum (so the running ATH is unchanged) are always kept.
+    Returns the number of records removed.
+    """
+    if not isinstance(encoded, dict) or not encoded.get('start'):
+        return 0
+    values = encoded['perf_bp']
+    ordinals = []
+    ordinal = datetime.strptime(encoded['start'], '%Y-%m-%d').toordinal()
+    for delta in encoded['day_deltas']:
+        ordinal += delta
+        ordinals.append(ordinal)
+
+    last_in_bucket = {}
+    for i, ordinal in enumerate(ordinals):
+        age = today.toordinal() - ordinal
+        resolution = next((res for max_age, res in tiers if max_age is None or age < max_age), None)
+        if resolution is None:
+            continue
+        day = date.fromordinal(ordinal)
+        if resolution == 'weekly':
+            bucket = ('week',) + tuple(day.isocalendar()[:2])
+        elif resolution == 'monthly':
+            bucket = ('month', day.year, day.month)
+        else:
+            bucket = ordinal
+        last_in_bucket[bucket] = i
+    keep = set(last_in_bucket.values())
+    keep.add(len(values) - 1)
+    keep.add(max(range(len(values)), key=values.__getitem__))
+    if len(keep) == len(values):
+        return 0
+
+    keep = sorted(keep)
+    kept_ordinals = [ordinals[i] for i in keep]
+    encoded['start'] = date.fromordinal(kept_ordinals[0]).strftime('%Y-%m-%d')
+    encoded['day_deltas'][:] = [0] + [b - a for a, b in zip(kept_ordinals, kept_ordinals[1:])]
+    values[:] = [values[i] for i in keep]
+    return len(ordinals) - len(keep)
+
+
+def compact(data, policies=None, today=None):
+    """
+    Apply retention policies (default RETENTION_POLICIES) to a document in place.
+    On a GistDocument only shards already loaded are touched: the others cannot
+    have grown during this run.
+
+    Returns:
+        int: number of records removed
+    """
+    global _perf_index
+    policies = RETENTION_POLICIES if policies is None else policies
+    today = today or datetime.now(timezone.utc).date()
+    removed = 0
+    for path, policy in policies.items():
+        keys = path.split('.')
+        if isinstance(data, GistDocument) and not data.is_loaded(keys[0]):
+            continue
+        parent = data
+        for key in keys[:-1]:
+            parent = parent.get(key) if isinstance(parent, dict) else None
+        if not isinstance(parent, dict) or not parent.get(keys[-1]):
+            continue
+        if 'downsample' in policy:
+            dropped = _downsample_columns(parent[keys[-1]], policy['downsample'], today)
+            if dropped and keys[-1] == 'perf_history':
+                _perf_index = None  # the index caches the old dates
+        else:
+            parent[keys[-1]], dropped = _compact_records(parent[keys[-1]], policy, today)
+        if dropped:
+            removed += dropped
+            print(f"🧹 Retention: dropped {dropped} old entries from {path}")
+    return removed
+
+
 # ---------------------------------------------------------------------------
 # Performance history (replaces Google Sheets "Storico" sheet)
-# Each record: {'date': 'YYYY-MM-DD', 'perf': float, 'ath': float}
+# Stored column-wise: {'start': 'YYYY-MM-DD', 'day_deltas': [0, 1, 3, ...],
+# 'perf_bp': [15623, ...]} — day offsets from the previous record and cumulative
+# performance in basis points. The ATH column is the running max, derived on load.
 # ---------------------------------------------------------------------------
 
+def encode_series(series):
+    """Encode a date-indexed float Series (percent) as the compact columnar dict."""
+    series = series.sort_index()
+    if series.empty:
+        return {'start': None, 'day_deltas': [], 'perf_bp': []}
+    dates = pd.DatetimeIndex(series.index).normalize()
+    days = (dates - dates[0]).days
+    deltas = np.diff(np.asarray(days), prepend=0)
+    return {
+        'start': dates[0].strftime('%Y-%m-%d'),
+        'day_deltas': [int(d) for d in deltas],
+        'perf_bp': [int(v) for v in np.round(series.to_numpy(dtype=float) * 100)],
+    }
+
+
+def decode_series(encoded, name='perf'):
+    """Decode the columnar dict back into a date-indexed float Series (percent)."""
+    if not encoded or not encoded.get('start'):
+        return pd.Series(dtype=float, name=name, index=pd.DatetimeIndex([], name='date'))
+    offsets = np.cumsum(np.asarray(encoded['day_deltas'], dtype=int))
+    index = pd.DatetimeIndex(pd.Timestamp(encoded['start']) + pd.to_timedelta(offsets, unit='D'), name='date')
+    return pd.Series(np.asarray(encoded['perf_bp'], dtype=float) / 100, index=index, name=name)
+
+
+def _records_to_series(records):
+    """Series from the legacy list of {'date', 'perf', 'ath'} records (last record wins per date)."""
+    if not records:
+        return decode_series(None)
+    series = pd.Series(
+        [float(r['perf']) for r in records],
+        index=pd.DatetimeIndex([r['date'] for r in records], name='date'),
+        name='perf',
+    )
+    return series[~series.index.duplicated(keep='last')].sort_index()
+
+
+def _load_perf_series(data):
+    """Stored perf history as a Series, converting the legacy record list on the fly."""
+    stored = data.get('perf_history')
+    if isinstance(stored, list):
+        return _records_to_series(stored)
+    return decode_series(stored)
+
+
+class PerfHistory:
+    """
+    Date-keyed index over the stored perf_history columns, edited in place.
+
+    Keeps the record dates (as ordinals, sorted) and a running ATH next to the
+    columnar encoding, so appending or replacing the latest date is O(1), an
+    out-of-order date costs one bisect plus a rebuild from that point, and the
+    current ATH / drawdown are read without scanning the history.
+    """
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+        encoded.setdefault('day_deltas', [])
+        encoded.setdefault('perf_bp', [])
+        self._values = encoded['perf_bp']  # same list object as the stored column
+        self._ordinals = []
+        self._ath = []
+        if encoded.get('start'):
+            ordinal = datetime.strptime(encoded['start'], '%Y-%m-%d').toordinal()
+            for delta, value in zip(encoded['day_deltas'], self._values):
+                ordinal += delta
+                self._ordinals.append(ordinal)
+                self._ath.append(value if not self._ath else max(self._ath[-1], value))
+
+    def __len__(self):
+        return len(self._values)
+
+    def upsert(self, date_str, perf):
+        """Insert or replace the value for a date. Returns True if the date already existed."""
+        ordinal = datetime.strptime(date_str, '%Y-%m-%d').toordinal()
+        value = int(round(perf * 100))
+
+        if self._ordinals and ordinal == self._ordinals[-1]:
+            # Same-day rerun: replace the latest record
+            self._values[-1] = value
+            self._ath[-1] = value if len(self._ath) == 1 else max(self._ath[-2], value)
+            return True
+        if not self._ordinals or ordinal > self._ordinals[-1]:
+            # New day: append
+            if not self._ordinals:
+                self.encoded['start'] = date_str
+            self.encoded['day_deltas'].append(ordinal - self._ordinals[-1] if self._ordinals else 0)
+            self._ordinals.append(ordinal)
+            self._values.append(value)
+            self._ath.append(value if len(self._ath) == 0 else max(self._ath[-1], value))
+            return False
+
+        # Backfilled date: locate it, then rebuild the columns from that point on
+        i = bisect.bisect_left(self._ordinals, ordinal)
+        existed = self._ordinals[i] == ordinal
+        if existed:
+            self._values[i] = value
+        else:
+            self._ordinals.insert(i, ordinal)
+            self._values.insert(i, value)
+            self._ath.insert(i, value)
+        for j in range(i, len(self._values)):
+            self._ath[j] = self._values[j] if j == 0 else max(self._ath[j - 1], self._values[j])
+        self.encoded['start'] = datetime.fromordinal(self._ordinals[0]).strftime('%Y-%m-%d')
+        self.encoded['day_deltas'][:] = [0] + [b - a for a, b in zip(self._ordinals, self._ordinals[1:])]
+        return existed
+
+    @property
+    def current(self):
+        """Latest cumulative performance (%), or None if empty."""
+        return self._values[-1] / 100 if self._values else None
+
+    @property
+    def ath(self):
+        """All-time high of the cumulative performance (%), or None if empty."""
+        return self._ath[-1] / 100 if self._ath else None
+
+    @property
+    def drawdown(self):
+        """Latest value minus the ATH (%, <= 0)."""
+        return (self._values[-1] - self._ath[-1]) / 100 if self._values else None
+
+    def series(self):
+        """The history as a date-indexed Series (%)."""
+        return decode_series(self.encoded)
+
+
+_perf_index = None
+
+
+def get_perf_index():
+    """Return the PerfHistory bound to the loaded Gist document (built once per document)."""
+    global _perf_index
+    with _data_lock:
+        data = load_data()
+        stored = data.get('perf_history')
+        if _perf_index is not None and _perf_index.encoded is stored:
+            return _perf_index
+        if not isinstance(stored, dict):
+            # Missing or legacy record list: convert to the columnar encoding once
+            stored = encode_series(_records_to_series(stored or []))
+            data['perf_history'] = stored
+        _perf_index = PerfHistory(stored)
+        return _perf_index
+
+
 def get_perf_history():
-    """Return the full performance history list from Gist."""
-    data = load_data()
-    return data.get('perf_history', [])
+    """
+    Return the full performance history from Gist as a pandas Series of cumulative
+    performance (%) indexed by date. The ATH series is `history.cummax()`.
+    """
+    return _load_perf_series(load_data())
 
 
-def upsert_perf_record(date_str, perf, ath):
-    """Insert or update the performance record for a given date."""
-    data = load_data()
-    records = data.get('perf_history', [])
-    for i, rec in enumerate(records):
-        if rec['date'] == date_str:
-            records[i] = {'date': date_str, 'perf': perf, 'ath': ath}
-            data['perf_history'] = records
-            save_data(data)
-            print(f"✓ Updated Gist perf record for {date_str}: perf={perf:.2f}%, ath={ath:.2f}%")
-            return
-    records.append({'date': date_str, 'perf': perf, 'ath': ath})
-    data['perf_history'] = records
-    save_data(data)
-    print(f"✓ Appended Gist perf record for {date_str}: perf={perf:.2f}%, ath={ath:.2f}%")
+def upsert_perf_record(date_str, perf, ath=None):
+    """
+    Insert or update the performance record for a given date.
+    `ath` is accepted for compatibility; the running ATH is maintained by the index.
+
+    Returns:
+        PerfHistory: the updated index (current, ath, drawdown)
+    """
+    with _data_lock:
+        index = get_perf_index()
+        existed = index.upsert(date_str, perf)
+        save_data(load_data())
+    print(f"✓ {'Updated' if existed else 'Appended'} Gist perf record for {date_str}: perf={perf:.2f}%, ath={index.ath:.2f}%")
+    return index
 
 
 def seed_perf_history(records):
     """Bulk-seed performance history into Gist only if it is currently empty."""
-    data = load_data()
-    if data.get('perf_history'):
-        print(f"ℹ️ Gist perf_history already has {len(data['perf_history'])} records, skipping seed.")
-        return
-    data['perf_history'] = records
-    save_data(data)
+    global _perf_index
+    with _data_lock:
+        data = load_data()
+        existing = _load_perf_series(data)
+        if not existing.empty:
+            print(f"ℹ️ Gist perf_history already has {len(existing)} records, skipping seed.")
+            return
+        data['perf_history'] = encode_series(_records_to_series(records))
+        _perf_index = None  # rebuilt over the seeded columns on the next upsert
+        save_data(data)
     print(f"✅ Seeded {len(records)} records into Gist perf_history.")
 
 
@@ -351,13 +1277,12 @@ def mark_session_run(session_name):
     today = now.strftime('%Y-%m-%d')
     data = load_data()
     runs = data.get('session_runs', {})
-    # Discard entries older than the current month to prevent unbounded growth
-    month_start = now.strftime('%Y-%m-01')
-    runs = {k: v for k, v in runs.items() if k[:10] >= month_start}
     runs[f"{today}:{session_name}"] = now.isoformat()
     data['session_runs'] = runs
     _invalidate_cache()
     save_data(data)
+    # The duplicate-run guard must be visible to the next scheduled run right away
+    flush()
 
 
 # ---------------------------------------------------------------------------
@@ -377,6 +1302,24 @@ def save_etoro_history(history: dict) -> bool:
     return save_data(data)
 
 
+# ---------------------------------------------------------------------------
+# eToro instrument ID ↔ symbol cache (shard of etoro_instruments)
+# ---------------------------------------------------------------------------
+
+def get_etoro_instruments() -> dict:
+    """Return the eToro instruments resolved by previous runs {str(instrument_id): entry}."""
+    data = load_data()
+    return data.get('etoro_instruments', {})
+
+
+def save_etoro_instruments(instruments: dict) -> bool:
+    """Save the resolved eToro instruments to Gist."""
+    with _data_lock:
+        data = load_data()
+        data['etoro_instruments'] = instruments
+        return save_data(data)
+
+
 # ---------------------------------------------------------------------------
 # Pie chart image rotation tracking
 # Rotates through: allocation → sector → geo → pnl_history → allocation …
@@ -390,11 +1333,12 @@ def get_next_pie_chart_type() -> str:
     Return the next pie chart type to use (round-robin).
     Advances the internal counter and saves it back to Gist.
     """
-    data = load_data()
-    idx = data.get('pie_chart_index', 0)
-    chart_type = PIE_CHART_TYPES[idx % len(PIE_CHART_TYPES)]
-    data['pie_chart_index'] = (idx + 1) % len(PIE_CHART_TYPES)
-    save_data(data)
+    with _data_lock:
+        data = load_data()
+        idx = data.get('pie_chart_index', 0)
+        chart_type = PIE_CHART_TYPES[idx % len(PIE_CHART_TYPES)]
+        data['pie_chart_index'] = (idx + 1) % len(PIE_CHART_TYPES)
+        save_data(data)
     return chart_type
 
 
@@ -430,7 +1374,9 @@ def save_last_etoro_post(
         'followup_at': None,
     }
     _invalidate_cache()
-    return save_data(data)
+    save_data(data)
+    # The +1h follow-up run looks this post up: persist it right away (as mark_session_run)
+    return flush()
 
 
 def get_last_etoro_post() -> dict:
@@ -451,7 +1397,9 @@ def mark_last_etoro_post_followup_done(post_id: str = None) -> bool:
         last_post['followup_at'] = datetime.now(timezone.utc).isoformat()
         data['last_etoro_post'] = last_post
         _invalidate_cache()
-        return save_data(data)
+        save_data(data)
+        # Guards the +1h follow-up against a second comment: persist it right away
+        return flush()
     return False
 
 
@@ -481,7 +1429,9 @@ def save_stock_focus_post_id(
     }
     data['stock_focus_posts'] = posts
     _invalidate_cache()
-    return save_data(data)
+    save_data(data)
+    # Catalyst comments on the next runs target this post: persist it right away
+    return flush()
 
 
 def get_stock_focus_post_id(ticker: str) -> dict:
@@ -515,9 +1465,6 @@ def mark_news_commented(
     ticker = ticker.replace('$', '').upper().strip()
     data = load_data()
     commented = data.get('commented_news_hashes', {})
-    # Keep last 200 commented news items to prevent unlimited growth
-    if len(commented) > 200:
-        commented = dict(list(commented.items())[-150:])
     commented[str(news_hash)] = {
         'ticker': ticker,
         'post_id': str(post_id),
@@ -526,6 +1473,8 @@ def mark_news_commented(
     }
     data['commented_news_hashes'] = commented
     _invalidate_cache()
-    return save_data(data)
+    save_data(data)
+    # Keeps the next run from commenting the same news twice: persist it right away
+    return flush()
 
 
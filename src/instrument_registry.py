@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Instrument Metadata Registry
+============================
+Persistent, per-field-TTL cache of instrument metadata (name, exchange, currency,
+quote type) keyed by Yahoo symbol, stored in data/instrument_registry.json.
+
+Yahoo's `.info` endpoint is the slowest and most rate-limited one, yet names and
+exchanges change only every few months at most. The registry is seeded from the portfolio
+config (portfolio_config.json / DEFAULT_TICKERS) and only new or stale symbols are
+ever refreshed from Yahoo. Prices are never cached here.
+
+Used by portfolio_manager.lookup_ticker_info (symbol resolution) and by
+finance_fetcher for US-listing detection.
+"""
+
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+REGISTRY_FILE = os.environ.get(
+    'INSTRUMENT_REGISTRY_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'instrument_registry.json')
+)
+
+# How long each field stays fresh (None = never expires once set). Names change with
+# rebrands and exchange codes with listing transfers; currency and quote type practically never.
+FIELD_TTLS = {
+    'name': timedelta(days=30),
+    'exchange': timedelta(days=30),
+    'currency': timedelta(days=180),
+    'quote_type': timedelta(days=180),
+    # Consecutive price downloads that came back empty (see record_price_data)
+    'no_data': timedelta(days=7),
+}
+
+# Each entry's TTL is stretched by up to this fraction, fixed per symbol and field, so
+# symbols cached on the same run do not all expire (and hit Yahoo) on the same later run
+TTL_JITTER = 0.25
+
+# After this many empty downloads in a row a symbol is skipped until its 'no_data'
+# field expires (delisted or renamed listings), then tried once more
+NO_DATA_STRIKES = int(os.environ.get('NO_DATA_STRIKES', '3'))
+
+# Yahoo `.info` key for every registry field
+INFO_KEYS = {
+    'name': ('longName', 'shortName'),
+    'exchange': ('exchange',),
+    'currency': ('currency',),
+    'quote_type': ('quoteType',),
+}
+
+# Yahoo exchange codes of US venues (plus CCC, crypto quoted in USD)
+US_EXCHANGES = {'NMS', 'NGM', 'NCM', 'NYQ', 'ASE', 'PCX', 'BTS', 'NAS', 'NYS', 'PNK', 'OQB', 'OQX', 'CCC'}
+
+# Yahoo symbol suffix → Yahoo exchange code, used to seed entries without a network call
+SUFFIX_EXCHANGES = {
+    '.L': 'LSE',
+    '.DE': 'GER',
+    '.MI': 'MIL',
+    '.PA': 'PAR',
+    '.AS': 'AMS',
+    '.CO': 'CPH',
+    '.HK': 'HKG',
+    '-USD': 'CCC',
+}
+
+_registry: Optional[Dict[str, Any]] = None
+_lock = threading.RLock()
+
+
+def exchange_from_symbol(yahoo_ticker: str) -> Optional[str]:
+    """Infer the Yahoo exchange code from the symbol suffix (None for unknown suffixes)."""
+    for suffix, exchange in SUFFIX_EXCHANGES.items():
+        if yahoo_ticker.upper().endswith(suffix):
+            return exchange
+    # Yahoo lists US stocks and ETFs without a suffix
+    return 'US' if '.' not in yahoo_ticker else None
+
+
+def _load() -> Dict[str, Any]:
+    """Load the registry from disk once per process (caller holds _lock)."""
+    global _registry
+    if _registry is None:
+        _registry = {'instruments': {}, 'aliases': {}}
+        if os.path.exists(REGISTRY_FILE):
+            try:
+                with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
+                    _registry.update(json.load(f))
+            except Exception as e:
+                print(f"⚠️ Error reading instrument registry: {e}")
+    return _registry
+
+
+def _save():
+    """Persist the registry (caller holds _lock)."""
+    try:
+        os.makedirs(os.path.dirname(REGISTRY_FILE), exist_ok=True)
+        tmp_path = REGISTRY_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_registry, f, indent=2, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, REGISTRY_FILE)
+    except Exception as e:
+        print(f"⚠️ Error saving instrument registry: {e}")
+
+
+def _ttl(yahoo_ticker: str, field: str) -> Optional[timedelta]:
+    """FIELD_TTLS entry stretched by the symbol's stable jitter (crc32, same on every run)."""
+    ttl = FIELD_TTLS.get(field)
+    if ttl is None:
+        return None
+    spread = zlib.crc32(f'{yahoo_ticker}:{field}'.encode('utf-8')) % 1000 / 1000
+    return ttl * (1 + TTL_JITTER * spread)
+
+
+def _is_fresh(yahoo_ticker: str, entry: Optional[dict], field: str, now: datetime) -> bool:
+    if not entry or field not in entry:
+        return False
+    ttl = _ttl(yahoo_ticker, field)
+    if ttl is None:
+        return True
+    try:
+        return now - datetime.fromisoformat(entry[field]['updated']) < ttl
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _set_fields(yahoo_ticker: str, fields: Dict[str, Any], source: str, overwrite: bool = True) -> bool:
+    """Store non-empty field values for a symbol (caller holds _lock). Returns True on change."""
+    instruments = _load()['instruments']
+    entry = instruments.setdefault(yahoo_ticker, {})
+    stamp = datetime.now().isoformat()
+    changed = False
+    for field, value in fields.items():
+        if value in (None, '') or (not overwrite and field in entry):
+            continue
+        entry[field] = {'value': value, 'updated': stamp, 'source': source}
+        changed = True
+    return changed
+
+
+def _fields_from_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a Yahoo `.info` payload onto registry fields."""
+    return {
+        field: next((info[key] for key in keys if info.get(key)), None)
+        for field, keys in INFO_KEYS.items()
+    }
+
+
+def get(yahoo_ticker: str, field: str, default: Any = None) -> Any:
+    """Return a cached field value, whether fresh or stale (never triggers a fetch)."""
+    with _lock:
+        entry = _load()['instruments'].get(yahoo_ticker, {})
+        return entry.get(field, {}).get('value', default)
+
+
+def get_name(yahoo_ticker: str) -> Optional[str]:
+    return get(yahoo_ticker, 'name')
+
+
+def is_us_listing(yahoo_ticker: str) -> bool:
+    """
+    True for instruments quoted on a US venue (or USD crypto pairs).
+    Uses the cached Yahoo exchange code when known, the symbol suffix otherwise.
+    """
+    exchange = get(yahoo_ticker, 'exchange') or exchange_from_symbol(yahoo_ticker)
+    return exchange == 'US' or exchange in US_EXCHANGES
+
+
+def seed_from_config(tickers: Dict[str, Any]) -> int:
+    """
+    Seed names and suffix-derived exchanges from a {symbol: (yahoo_ticker, name)} mapping
+    (PORTFOLIO_TICKERS / DEFAULT_TICKERS). Never overwrites values already cached.
+    Returns the number of symbols that gained data.
+    """
+    seeded = 0
+    with _lock:
+        _load()
+        for symbol, value in tickers.items():
+            yahoo_ticker, name = (list(value) + [None, None])[:2]
+            if not yahoo_ticker:
+                continue
+            fields = {'name': name if name and name != yahoo_ticker else None}
+            exchange = exchange_from_symbol(yahoo_ticker)
+            if exchange and exchange != 'US':
+                fields['exchange'] = exchange
+            if _set_fields(yahoo_ticker, fields, source='config', overwrite=False):
+                seeded += 1
+            if symbol != yahoo_ticker:
+                _registry['aliases'].setdefault(symbol, yahoo_ticker)
+        if seeded:
+            _save()
+    return seeded
+
+
+def record_info(yahoo_ticker: str, info: Dict[str, Any], alias: str = None):
+    """Store the registry fields found in a Yahoo `.info` payload (and an optional alias)."""
+    with _lock:
+        _set_fields(yahoo_ticker, _fields_from_info(info), source='yahoo')
+        if alias and alias != yahoo_ticker:
+            _load()['aliases'][alias] = yahoo_ticker
+        _save()
+
+
+def resolve(symbol: str):
+    """
+    Return (yahoo_ticker, name) for an already-resolved symbol with a fresh name,
+    or None if it has to be looked up on Yahoo.
+    """
+    with _lock:
+        registry = _load()
+        yahoo_ticker = registry['aliases'].get(symbol, symbol)
+        entry = registry['instruments'].get(yahoo_ticker)
+        if _is_fresh(yahoo_ticker, entry, 'name', datetime.now()):
+            return yahoo_ticker, entry['name']['value']
+    return None
+
+
+def record_price_data(found: Iterable[str], missing: Iterable[str]):
+    """Count consecutive empty price downloads per symbol; symbols with data start over."""
+    with _lock:
+        instruments = _load()['instruments']
+        changed = False
+        for yahoo_ticker in found:
+            if instruments.get(yahoo_ticker, {}).pop('no_data', None) is not None:
+                changed = True
+        for yahoo_ticker in missing:
+            strikes = get(yahoo_ticker, 'no_data', 0) + 1
+            changed = _set_fields(yahoo_ticker, {'no_data': strikes}, source='yahoo') or changed
+            if strikes == NO_DATA_STRIKES:
+                print(f"   🚫 {yahoo_ticker}: no prices from Yahoo {strikes} times in a row, "
+                      f"skipping it for {FIELD_TTLS['no_data'].days} days")
+        if changed:
+            _save()
+
+
+def no_data_symbols(yahoo_tickers: Iterable[str]) -> list:
+    """Symbols that returned no prices NO_DATA_STRIKES times in a row, until the count expires."""
+    now = datetime.now()
+    with _lock:
+        instruments = _load()['instruments']
+        return [
+            t for t in dict.fromkeys(yahoo_tickers)
+            if get(t, 'no_data', 0) >= NO_DATA_STRIKES and _is_fresh(t, instruments.get(t), 'no_data', now)
+        ]
+
+
+def stale_symbols(yahoo_tickers: Iterable[str], fields: Iterable[str] = ('name', 'exchange')) -> list:
+    """Symbols that are new to the registry or have any of `fields` expired."""
+    now = datetime.now()
+    with _lock:
+        instruments = _load()['instruments']
+        return [
+            t for t in dict.fromkeys(yahoo_tickers)
+            if not all(_is_fresh(t, instruments.get(t), field, now) for field in fields)
+        ]
+
+
+def refresh(yahoo_tickers: Iterable[str], fields: Iterable[str] = ('name', 'exchange')) -> int:
+    """
+    Fetch `.info` only for new or stale symbols (concurrently, rate-limited via yahoo_fetch).
+    Returns the number of symbols refreshed.
+    """
+    stale = stale_symbols(yahoo_tickers, fields)
+    if not stale:
+        return 0
+    try:
+        import yfinance as yf
+    except ImportError:
+        return 0
+    import yahoo_fetch
+
+    print(f"🗂️ Refreshing instrument metadata for {len(stale)} symbols...")
+    infos = yahoo_fetch.map_concurrent(lambda t: yf.Ticker(t).info, stale)
+    refreshed = 0
+    with _lock:
+        for yahoo_ticker, info in zip(stale, infos):
+            if info:
+                _set_fields(yahoo_ticker, _fields_from_info(info), source='yahoo')
+                refreshed += 1
+        if refreshed:
+            _save()
+    return refreshed
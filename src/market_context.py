@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Market Data Context
+===================
+Run-scoped, memoized access to the market data shared by every module in one session.
+
+data_collector, chart_generator, formatter, stock_focus_infographic, cross_link_scheduler,
+ai_news_generator and the copy trading / dividend posts all ask the same context for
+benchmark history, live portfolio weights, eToro gain history and YTD, so each dataset
+is fetched at most once per process instead of once per caller.
+
+Usage:
+    import market_context
+    ctx = market_context.get_context()
+    weights = ctx.portfolio_weights()
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class MarketDataContext:
+    """Memoizes each dataset (keyed by name + arguments) for the lifetime of one run."""
+
+    def __init__(self):
+        self._values: Dict[Any, Any] = {}
+        self._key_locks: Dict[Any, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _memoize(self, key: Any, loader: Callable[[], Any]) -> Any:
+        # One lock per key: concurrent callers of the same dataset wait for a single
+        # fetch, while different datasets can still load in parallel.
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+            value = loader()
+            with self._lock:
+                self._values[key] = value
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        """Seed a value computed elsewhere (e.g. stock_data from the collector)."""
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Return an already-loaded value without triggering a fetch."""
+        with self._lock:
+            return self._values.get(key, default)
+
+    # ── Portfolio ─────────────────────────────────────────────────────────
+
+    def stock_data(self) -> dict:
+        """Per-ticker daily/weekly/MTD/YTD changes (finance_fetcher.fetch_stock_data)."""
+        import finance_fetcher
+        return self._memoize('stock_data', finance_fetcher.fetch_stock_data)
+
+    def quote_stock_data(self) -> dict:
+        """
+        Same shape as stock_data(), refreshed from one batched quote request
+        (finance_fetcher.fetch_stock_quotes). Shares the 'stock_data' slot, so later
+        callers of stock_data() reuse the quotes instead of downloading history.
+        """
+        import finance_fetcher
+        return self._memoize('stock_data', finance_fetcher.fetch_stock_quotes)
+
+    def portfolio_weights(self) -> Dict[str, float]:
+        """Live portfolio weights {ticker: weight_pct}, eToro API first, BullAware fallback."""
+        import finance_fetcher
+        return self._memoize('portfolio_weights', finance_fetcher.fetch_portfolio_weights)
+
+    def portfolio_ytd(self) -> Optional[float]:
+        """Official eToro portfolio YTD (%), or None if every source failed."""
+        import finance_fetcher
+        return self._memoize('portfolio_ytd', finance_fetcher.fetch_portfolio_ytd_from_etoro)
+
+    def portfolio_history(self, start_year: int = 2020):
+        """Cumulative monthly portfolio return series from eToro (finance_fetcher)."""
+        import finance_fetcher
+        return self._memoize(
+            ('portfolio_history', start_year),
+            lambda: finance_fetcher.fetch_portfolio_history_from_etoro(start_year=start_year),
+        )
+
+    # ── eToro API ─────────────────────────────────────────────────────────
+
+    def etoro_gain_history(self, granularity: str = 'monthly') -> Optional[list]:
+        """Raw gain history from the official eToro API (None if not configured/failed)."""
+        def _load():
+            import etoro_client
+            if not etoro_client.is_configured():
+                return None
+            return etoro_client.fetch_gain_history(granularity=granularity)
+        return self._memoize(('etoro_gain_history', granularity), _load)
+
+    def trader_rankings(self, period: str = 'CurrYear') -> Optional[dict]:
+        """Copier count, risk score, gain etc. from the official eToro rankings endpoint."""
+        def _load():
+            import etoro_client
+            if not etoro_client.is_configured():
+                return None
+            return etoro_client.fetch_trader_rankings(period=period)
+        return self._memoize(('trader_rankings', period), _load)
+
+    # ── Benchmarks ────────────────────────────────────────────────────────
+
+    def benchmark_history(self, start_date: str = '2020-01-01'):
+        """Cumulative benchmark returns (%) since start_date, one column per benchmark."""
+        import finance_fetcher
+        return self._memoize(
+            ('benchmark_history', start_date),
+            lambda: finance_fetcher.fetch_benchmarks_history(start_date=start_date),
+        )
+
+    def benchmark_performance(self, start_date: str = '2020-01-01') -> Dict[str, float]:
+        """Latest cumulative return per benchmark, derived from the shared history."""
+        import finance_fetcher
+        return self._memoize(
+            ('benchmark_performance', start_date),
+            lambda: finance_fetcher.fetch_benchmarks_performance(
+                start_date=start_date, history=self.benchmark_history(start_date)
+            ),
+        )
+
+
+_context: Optional[MarketDataContext] = None
+_context_lock = threading.Lock()
+
+
+def get_context() -> MarketDataContext:
+    """Return the process-wide context for the current run (created on first use)."""
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = MarketDataContext()
+        return _context
+
+
+def reset_context() -> MarketDataContext:
+    """Drop every memoized value and start a fresh context (e.g. between test sessions)."""
+    global _context
+    with _context_lock:
+        _context = MarketDataContext()
+        return _context
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Session Pipeline Executor
+=========================
+Runs a declarative list of named stages as a small dependency graph: every stage
+starts as soon as its inputs are ready, independent stages run concurrently on a
+bounded thread pool, and per-stage timings are reported at the end of the run.
+
+A stage is a plain function `fn(state) -> dict` registered in a stages table:
+
+    STAGES = {
+        'stock_data': {'func': stage_stock_data},
+        'portfolio_daily': {'func': stage_portfolio_daily, 'requires': ('stock_data', 'portfolio_weights')},
+        'portfolio_ytd': {'func': stage_portfolio_ytd, 'after': ('stock_data',)},
+    }
+
+  • requires — stages that must run first; they are pulled into the plan automatically.
+  • after    — ordering-only hints: honoured when those stages are in the plan,
+               ignored (not pulled in) otherwise. Used for optional fallbacks.
+  • lock     — name of a shared resource; stages with the same lock never overlap
+               (e.g. 'matplotlib', whose pyplot state is not thread-safe).
+
+Each stage reads what it needs from the shared `state` dict and returns a dict of
+outputs that is merged back into it. A failing stage is reported and the run goes on;
+stages that require it are skipped.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Iterable
+
+# Upper bound on concurrently running stages (most stages are network-bound)
+PIPELINE_MAX_WORKERS = int(os.environ.get('PIPELINE_MAX_WORKERS', '4'))
+
+
+def resolve_plan(stages: Dict[str, dict], plan: Iterable[str]) -> List[str]:
+    """
+    Expand a plan with its required stages and return it in dependency order.
+    Raises KeyError for unknown stage names and ValueError on dependency cycles.
+    """
+    selected = []
+    pending = list(plan)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        if name not in stages:
+            raise KeyError(f"Unknown pipeline stage: {name}")
+        selected.append(name)
+        pending.extend(stages[name].get('requires', ()))
+
+    ordered: List[str] = []
+    visiting = set()
+
+    def _visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle detected at stage: {name}")
+        visiting.add(name)
+        spec = stages[name]
+        for dep in tuple(spec.get('requires', ())) + tuple(spec.get('after', ())):
+            if dep in selected:
+                _visit(dep)
+        visiting.discard(name)
+        ordered.append(name)
+
+    # Keep the declaration order of the stages table for otherwise-independent stages
+    for name in stages:
+        if name in selected:
+            _visit(name)
+    return ordered
+
+
+def _run_stage(name: str, spec: dict, state: Dict[str, Any], locks: Dict[str, threading.Lock]):
+    """Worker body: run one stage (holding its resource lock, if any) and time it."""
+    lock = locks.get(spec.get('lock'))
+    if lock:
+        lock.acquire()
+    started = time.perf_counter()
+    try:
+        return spec['func'](state) or {}, time.perf_counter() - started
+    finally:
+        if lock:
+            lock.release()
+
+
+def _print_timings(ordered: List[str], status: Dict[str, Any], wall_clock: float):
+    """Print the per-stage timing report."""
+    print("=" * 50)
+    print("⏱️  Pipeline stage timings:")
+    for name in ordered:
+        if name in status['timings']:
+            print(f"   ✅ {name:<20} {status['timings'][name]:6.2f}s")
+        elif name in status['failed']:
+            print(f"   ❌ {name:<20}  failed")
+        else:
+            print(f"   ⏭️  {name:<20}  skipped")
+    print(f"   Total wall clock: {wall_clock:.2f}s "
+          f"(sum of stages: {sum(status['timings'].values()):.2f}s)")
+    print("=" * 50)
+
+
+def run_plan(stages: Dict[str, dict], plan: Iterable[str], state: Dict[str, Any],
+             max_workers: int = None) -> Dict[str, Any]:
+    """
+    Execute the stages of `plan` (plus their requirements) as a dependency graph.
+
+    A stage is submitted to the thread pool once all its `requires`/`after` stages
+    have finished; outputs are merged into `state` on the calling thread.
+    Returns the updated `state`. Completed / failed / skipped stage names and
+    per-stage durations (seconds) are recorded under state['_pipeline'].
+    """
+    ordered = resolve_plan(stages, plan)
+    status = {'completed': [], 'failed': [], 'skipped': [], 'timings': {}}
+    state['_pipeline'] = status
+    print(f"🧭 Pipeline plan: {' → '.join(ordered)}")
+
+    waits_on = {
+        name: [dep for dep in tuple(stages[name].get('requires', ())) + tuple(stages[name].get('after', ()))
+               if dep in ordered]
+        for name in ordered
+    }
+    locks = {spec['lock']: threading.Lock() for spec in stages.values() if spec.get('lock')}
+    finished = set()
+    running = {}
+    run_started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers or PIPELINE_MAX_WORKERS,
+                            thread_name_prefix='stage') as pool:
+        while len(finished) < len(ordered):
+            for name in ordered:
+                if name in finished or name in running.values():
+                    continue
+                if not all(dep in finished for dep in waits_on[name]):
+                    continue
+                spec = stages[name]
+                broken = [dep for dep in spec.get('requires', ()) if dep not in status['completed']]
+                if broken:
+                    print(f"⏭️  Skipping stage '{name}' (missing: {', '.join(broken)})")
+                    status['skipped'].append(name)
+                    finished.add(name)
+                    continue
+                running[pool.submit(_run_stage, name, spec, state, locks)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                finished.add(name)
+                try:
+                    outputs, elapsed = future.result()
+                    state.update(outputs)
+                    status['timings'][name] = elapsed
+                    status['completed'].append(name)
+                except Exception as e:
+                    print(f"❌ Stage '{name}' failed: {e}")
+                    traceback.print_exception(type(e), e, e.__traceback__)
+                    status['failed'].append(name)
+
+    _print_timings(ordered, status, time.perf_counter() - run_started)
+    return state
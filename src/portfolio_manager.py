@@ -1,10 +1,17 @@
 
+import copy
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 try:
     import yfinance as yf
 except ImportError:
     yf = None
+import yahoo_fetch
+import instrument_registry
+
+# New assets resolved at once by sync_portfolio (each lookup is a handful of Yahoo requests)
+SYMBOL_LOOKUP_WORKERS = int(os.environ.get('SYMBOL_LOOKUP_WORKERS', '3'))
 
 # DEFAULT DATA MOVED HERE TO AVOID CIRCULAR IMPORT WITH CONFIG.PY
 # REAL ACTIVE ASSETS IN ANDREA RAVALLI'S ETORO PORTFOLIO
@@ -128,115 +135,134 @@ CONFIG_FILE = os.path.join(os.path.dirname(__file__), '../portfolio_config.json'
 
 from gist_storage import get_portfolio_config, save_portfolio_config as save_gist_config
 
-def load_config():
+_config_snapshot = None
+# True while the snapshot holds changes (expired badges) not yet saved
+_snapshot_stale = False
+
+
+def load_config(refresh=False):
     """
-    Load portfolio configuration, prioritizing Gist storage.
-    Migration path:
-    1. Try Gist: If valid config found, use it.
-    2. Try Local File: If Gist empty/fail, load local JSON.
-    3. Fallback: Use Defaults.
-    
-    If loaded from local/defaults but Gist was empty, we SAVE to Gist to sync it.
+    Return the portfolio configuration, loaded on first use and then memoized for the
+    process (pass refresh=True to re-read it). Sources, in priority order:
+    1. Gist
+    2. Local file (portfolio_config.json)
+    3. Hardcoded defaults
+
+    Loading never writes anything: stored-mapping fixes and Gist initialisation are done
+    by migrate_config() (scripts/migrate_portfolio_config.py). Expired '🆕' badges are
+    dropped from the snapshot and persisted by the next save_config().
     """
+    global _config_snapshot, _snapshot_stale
+    if _config_snapshot is None or refresh:
+        config, _ = _read_config()
+        _snapshot_stale = expire_new_emojis(config)
+        _config_snapshot = config
+    return _config_snapshot
+
+
+def _read_config():
+    """Read the stored configuration. Returns (config, source) with source 'gist', 'local' or 'defaults'."""
     # 1. Try Gist
     try:
         gist_tickers, gist_emojis = get_portfolio_config()
         if gist_tickers:
             print("✅ Loaded portfolio config from Gist")
-            config = {
-                "tickers": gist_tickers,
-                "emojis": gist_emojis
-            }
-            # Auto-migration for bad tickers
-            needs_save = False
-            # Purge any Russian / untradeable assets
-            for russian_t in ["MNODL.L", "NVTKL.L"]:
-                if russian_t in config["tickers"]:
-                    config["tickers"].pop(russian_t, None)
-                    needs_save = True
-                if russian_t in config.get("emojis", {}):
-                    config["emojis"].pop(russian_t, None)
-                    needs_save = True
-            if "ABT.US" not in config["tickers"]:
-                config["tickers"]["ABT.US"] = ["ABT", "Abbott Laboratories"]
-                config["emojis"]["ABT.US"] = config["emojis"].get("ABT", "🏥")
-                needs_save = True
-            # Fix ABT.US yahoo ticker if it was stored as "ABT.US" instead of "ABT"
-            if config["tickers"].get("ABT.US", [""])[0] == "ABT.US":
-                config["tickers"]["ABT.US"] = ["ABT", "Abbott Laboratories"]
-                needs_save = True
-            # Fix 01211.HK (BYD HK): leading zero not valid on Yahoo Finance, correct symbol is 1211.HK
-            if "01211.HK" in config["tickers"]:
-                config["tickers"].pop("01211.HK")
-                config["tickers"]["1211.HK"] = ["1211.HK", "BYD Company"]
-                if "01211.HK" in config.get("emojis", {}):
-                    config["emojis"]["1211.HK"] = config["emojis"].pop("01211.HK")
-                else:
-                    config.setdefault("emojis", {}).setdefault("1211.HK", "🔋")
-                if "01211.HK" in config.get("added_dates", {}):
-                    config["added_dates"]["1211.HK"] = config["added_dates"].pop("01211.HK")
-                needs_save = True
-            
-            # Fix ENI emoji
-            for eni_key in ["ENI", "ENI.MI"]:
-                if eni_key in config["tickers"]:
-                    if config["emojis"].get(eni_key) in ["🆕", None]:
-                        config["emojis"][eni_key] = "⛽"
-                        needs_save = True
-
-            # Fix NOVO-B → NOVO-B.CO emoji key
-            if "NOVO-B" in config["emojis"] and "NOVO-B.CO" not in config["emojis"]:
-                config["emojis"]["NOVO-B.CO"] = config["emojis"].pop("NOVO-B")
-                needs_save = True
-
-            # Fix NOVO-B.CO YF ticker: use native Copenhagen listing instead of US ADR
-            if config["tickers"].get("NOVO-B.CO", [""])[0] == "NVO":
-                config["tickers"]["NOVO-B.CO"] = ["NOVO-B.CO", "Novo Nordisk"]
-                needs_save = True
-
-            # Add new positions: XEON.DE and IB01.L
-            if "XEON.DE" not in config["tickers"]:
-                config["tickers"]["XEON.DE"] = ["XEON.DE", "Xtrackers II EUR Overnight Rate Swap UCITS ETF"]
-                config["emojis"]["XEON.DE"] = "💤"
-                needs_save = True
-            if "IB01.L" not in config["tickers"]:
-                config["tickers"]["IB01.L"] = ["IB01.L", "iShares Treasury Bond 0-1yr UCITS ETF"]
-                config["emojis"]["IB01.L"] = "💵"
-                needs_save = True
-
-            if needs_save:
-                print("🔄 Applying auto-migration to fix ticker mappings in Gist...")
-                save_config(config)
-
-            # Always check for expired '\ud83c\udd95' badges — independent of BullAware sync
-            if expire_new_emojis(config):
-                save_config(config)
-
-            return config
+            return {"tickers": gist_tickers, "emojis": gist_emojis}, 'gist'
     except Exception as e:
         print(f"⚠️ Failed to load config from Gist: {e}")
 
     # 2. Try Local File
     if os.path.exists(CONFIG_FILE):
-        print("ℹ️ Verify local config fallback...")
         try:
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                local_data = json.load(f)
-                if expire_new_emojis(local_data):
-                    save_config(local_data)
-                # If we are here, it means Gist was empty or failed. 
-                # We should try to push this local data to Gist to initialize it.
-                print("📤 Initializing Gist config from local file...")
-                save_gist_config(local_data.get('tickers', {}), local_data.get('emojis', {}))
-                return local_data
+                print("ℹ️ Loaded portfolio config from local file")
+                return json.load(f), 'local'
         except Exception as e:
             print(f"Error loading config file: {e}")
 
     # 3. Defaults
-    cfg = migrate_from_defaults()
-    if expire_new_emojis(cfg):
-        save_config(cfg)
-    return cfg
+    print("⚠️ Using hardcoded defaults")
+    return {"tickers": dict(DEFAULT_TICKERS), "emojis": dict(DEFAULT_EMOJIS)}, 'defaults'
+
+
+def migrate_config():
+    """
+    One-shot maintenance of the stored configuration: fix known bad ticker mappings,
+    expire old '🆕' badges, and initialise the Gist from the local file or defaults when
+    it has no config yet. Saves (Gist + local JSON) only if something changed.
+
+    Returns:
+        bool: True if the configuration was updated
+    """
+    config, source = _read_config()
+    # A config that did not come from the Gist is pushed there
+    needs_save = source != 'gist'
+    config.setdefault("emojis", {})
+
+    # Purge any Russian / untradeable assets
+    for russian_t in ["MNODL.L", "NVTKL.L"]:
+        if russian_t in config["tickers"]:
+            config["tickers"].pop(russian_t, None)
+            needs_save = True
+        if russian_t in config["emojis"]:
+            config["emojis"].pop(russian_t, None)
+            needs_save = True
+    if "ABT.US" not in config["tickers"]:
+        config["tickers"]["ABT.US"] = ["ABT", "Abbott Laboratories"]
+        config["emojis"]["ABT.US"] = config["emojis"].get("ABT", "🏥")
+        needs_save = True
+    # Fix ABT.US yahoo ticker if it was stored as "ABT.US" instead of "ABT"
+    if config["tickers"].get("ABT.US", [""])[0] == "ABT.US":
+        config["tickers"]["ABT.US"] = ["ABT", "Abbott Laboratories"]
+        needs_save = True
+    # Fix 01211.HK (BYD HK): leading zero not valid on Yahoo Finance, correct symbol is 1211.HK
+    if "01211.HK" in config["tickers"]:
+        config["tickers"].pop("01211.HK")
+        config["tickers"]["1211.HK"] = ["1211.HK", "BYD Company"]
+        if "01211.HK" in config["emojis"]:
+            config["emojis"]["1211.HK"] = config["emojis"].pop("01211.HK")
+        else:
+            config["emojis"].setdefault("1211.HK", "🔋")
+        if "01211.HK" in config.get("added_dates", {}):
+            config["added_dates"]["1211.HK"] = config["added_dates"].pop("01211.HK")
+        needs_save = True
+
+    # Fix ENI emoji
+    for eni_key in ["ENI", "ENI.MI"]:
+        if eni_key in config["tickers"]:
+            if config["emojis"].get(eni_key) in ["🆕", None]:
+                config["emojis"][eni_key] = "⛽"
+                needs_save = True
+
+    # Fix NOVO-B → NOVO-B.CO emoji key
+    if "NOVO-B" in config["emojis"] and "NOVO-B.CO" not in config["emojis"]:
+        config["emojis"]["NOVO-B.CO"] = config["emojis"].pop("NOVO-B")
+        needs_save = True
+
+    # Fix NOVO-B.CO YF ticker: use native Copenhagen listing instead of US ADR
+    if config["tickers"].get("NOVO-B.CO", [""])[0] == "NVO":
+        config["tickers"]["NOVO-B.CO"] = ["NOVO-B.CO", "Novo Nordisk"]
+        needs_save = True
+
+    # Add new positions: XEON.DE and IB01.L
+    if "XEON.DE" not in config["tickers"]:
+        config["tickers"]["XEON.DE"] = ["XEON.DE", "Xtrackers II EUR Overnight Rate Swap UCITS ETF"]
+        config["emojis"]["XEON.DE"] = "💤"
+        needs_save = True
+    if "IB01.L" not in config["tickers"]:
+        config["tickers"]["IB01.L"] = ["IB01.L", "iShares Treasury Bond 0-1yr UCITS ETF"]
+        config["emojis"]["IB01.L"] = "💵"
+        needs_save = True
+
+    if expire_new_emojis(config):
+        needs_save = True
+
+    if needs_save:
+        print("🔄 Applying portfolio config migration...")
+        save_config(config)
+    else:
+        print("✅ Portfolio config is up to date")
+    return needs_save
 
 def get_added_dates():
     """Get the dictionary of when tickers were added."""
@@ -285,19 +311,11 @@ def expire_new_emojis(config: dict) -> bool:
 
     return changed
 
-def migrate_from_defaults():
-    """Create JSON config from the defaults."""
-    print("⚠️ Using hardcoded defaults")
-    config_data = {
-        "tickers": DEFAULT_TICKERS,
-        "emojis": DEFAULT_EMOJIS
-    }
-    # Try to save to both Gist and Local
-    save_config(config_data) 
-    return config_data
-
 def save_config(data):
-    """Save configuration to BOTH Gist and local JSON."""
+    """Save configuration to BOTH Gist and local JSON, and make it the current snapshot."""
+    global _config_snapshot, _snapshot_stale
+    _config_snapshot = data
+    _snapshot_stale = False
     # 1. Local Save
     try:
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
@@ -332,6 +350,12 @@ def lookup_ticker_info(symbol):
         print(f"⚠️ Rejecting pure numeric symbol '{symbol}' — looks like an unresolved eToro instrument ID, not a ticker.")
         return symbol, symbol
 
+    # Already resolved on a previous run (names/exchanges are cached with a TTL)
+    cached = instrument_registry.resolve(symbol)
+    if cached:
+        print(f"   ✓ {symbol} → {cached[0]} ({cached[1]}) from instrument registry")
+        return cached
+
     candidates = [symbol]
     
     # Heuristics for common variations
@@ -352,13 +376,13 @@ def lookup_ticker_info(symbol):
     
     for cand in candidates:
         try:
-            ticker = yf.Ticker(cand)
-            # Fetch minimal data to verify
-            info = ticker.info
+            # Fetch minimal data to verify (rate-limited, retried on 429/5xx)
+            info = yahoo_fetch.call(lambda: yf.Ticker(cand).info)
             # Check if it has a valid price or name
             if info and ('regularMarketPrice' in info or 'currentPrice' in info):
                 name = info.get('longName', info.get('shortName', symbol))
                 print(f"   ✓ Found match: {cand} ({name})")
+                instrument_registry.record_info(cand, info, alias=symbol)
                 return cand, name
         except Exception:
             continue
@@ -366,63 +390,78 @@ def lookup_ticker_info(symbol):
     print(f"   ⚠️ Could not automatically resolve Yahoo ticker for {symbol}. Using symbol as is.")
     return symbol, symbol  # Fallback
 
-def sync_portfolio(bullaware_weights):
+def diff_portfolio(config, live_weights):
     """
-    Synchronize the local configuration with the weights fetched from BullAware.
-    - Adds new tickers found in BullAware
-    - Removes tickers no longer in BullAware
+    Compare live position weights with the stored config.
+
+    Returns:
+        (to_add, to_remove): sorted lists of symbols held but not configured, and
+        configured but no longer held
     """
-    if not bullaware_weights:
-        return {}
-        
-    current_config = load_config()
-    current_tickers = current_config.get('tickers', {})
-    current_emojis = current_config.get('emojis', {})
-    
-    bullaware_keys = set(bullaware_weights.keys())
-    config_keys = set(current_tickers.keys())
-    
-    # 1. REMOVE: Tickers in local config but NOT in BullAware
-    to_remove = config_keys - bullaware_keys
+    live = set(live_weights)
+    configured = set(config.get('tickers', {}))
+    return sorted(live - configured), sorted(configured - live)
+
+
+def sync_portfolio(live_weights):
+    """
+    Synchronize the stored configuration with the live portfolio weights.
+    - Adds new tickers (Yahoo symbols and names resolved concurrently)
+    - Removes tickers no longer held
+    - Persists expired '🆕' badges
+
+    The updated config is built on a copy of the snapshot and only saved (local JSON +
+    Gist, becoming the new snapshot) when one of these changed anything.
+
+    Returns:
+        dict: {'added': [...], 'removed': [...], 'saved': bool}
+    """
+    global _snapshot_stale
+    result = {'added': [], 'removed': [], 'saved': False}
+    if not live_weights:
+        return result
+
+    # Work on a copy: get_tickers()/get_emojis() hand the snapshot to stages running
+    # concurrently, so it is only replaced (through save_config), never mutated
+    current_config = copy.deepcopy(load_config())
+    current_tickers = current_config.setdefault('tickers', {})
+    current_emojis = current_config.setdefault('emojis', {})
+    to_add, to_remove = diff_portfolio(current_config, live_weights)
+
+    # 1. REMOVE: Tickers in the config but no longer held
     if to_remove:
         print(f"♻️  Removing {len(to_remove)} assets no longer in portfolio: {', '.join(to_remove)}")
         for k in to_remove:
             current_tickers.pop(k, None)
             current_emojis.pop(k, None) # Optional cleanup
-            
-    # 2. ADD: Tickers in BullAware but NOT in local config
-    to_add = bullaware_keys - config_keys
+
+    # 2. ADD: Tickers held but not in the config
     if to_add:
         print(f"🆕 Discovered {len(to_add)} new assets. Attempting to auto-configure...")
         from datetime import date
         today_iso = date.today().isoformat()
-        
-        # Initialize added_dates if not present
-        if 'added_dates' not in current_config:
-            current_config['added_dates'] = {}
-            
-        for k in to_add:
-            yahoo_ticker, name = lookup_ticker_info(k)
+        added_dates = current_config.setdefault('added_dates', {})
+
+        # Resolve all new assets concurrently on a plain pool: the Yahoo requests inside
+        # lookup_ticker_info already go through yahoo_fetch.call (rate limit + retries)
+        with ThreadPoolExecutor(max_workers=min(SYMBOL_LOOKUP_WORKERS, len(to_add)),
+                                thread_name_prefix='symbol-lookup') as pool:
+            resolved = list(pool.map(lookup_ticker_info, to_add))
+        for k, (yahoo_ticker, name) in zip(to_add, resolved):
             current_tickers[k] = [yahoo_ticker, name] # Use list for JSON compatibility
-            # Try to assign a default emoji
-            current_emojis[k] = "🆕" 
-            current_config['added_dates'][k] = today_iso
-            
-    # 3. MAINTENANCE: expire '🆕' badges older than 7 days
-    if expire_new_emojis(current_config):
-        # expire_new_emojis already printed per-ticker messages
-        pass
-
-    # Save if changes were made or maintenance happened
-    # We always save to ensure added_dates are persisted locally and in Gist (if we update Gist schema support)
-    current_config['tickers'] = current_tickers
-    current_config['emojis'] = current_emojis
-    # Note: added_dates is currently stored in local JSON structure. 
-    # Gist storage might filter it out if not updated to support it, 
-    # but currently saving the whole dict to local file preserves it.
-    save_config(current_config)
-
-    return current_tickers
+            current_emojis[k] = "🆕"
+            added_dates[k] = today_iso
+
+    # 3. MAINTENANCE: '🆕' badges older than 7 days (already expired in the loaded snapshot)
+    expired = expire_new_emojis(current_config) or _snapshot_stale
+
+    result['added'], result['removed'] = to_add, to_remove
+    if to_add or to_remove or expired:
+        save_config(current_config)
+        result['saved'] = True
+    else:
+        print("✅ Portfolio config already matches the live positions")
+    return result
 
 
 # ── Dual / Multi-Exchange Ticker Tags & Related Competitors Mapping ───────────
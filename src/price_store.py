@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Local Price Store
+=================
+On-disk store of daily closes keyed by Yahoo symbol (SQLite under data/).
+
+finance_fetcher reads history from here and only downloads the bars missing
+since the last stored date, so the five daily sessions stop re-downloading a
+full year per ticker (and six years per benchmark) on every run.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+PRICE_STORE_FILE = os.environ.get(
+    'PRICE_STORE_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'price_store.sqlite')
+)
+
+# Gap allowed between the requested start and the first stored bar before a backfill is triggered
+BACKFILL_TOLERANCE_DAYS = 7
+
+# Relative gap between a re-downloaded final bar and the stored one that means Yahoo has
+# re-adjusted the history (split or dividend), so the stored series must be replaced
+ADJUSTMENT_TOLERANCE = 0.001
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_close (
+    symbol TEXT NOT NULL,
+    date   TEXT NOT NULL,
+    close  REAL NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (
+    symbol       TEXT PRIMARY KEY,
+    refreshed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS backfill_state (
+    symbol          TEXT PRIMARY KEY,
+    backfilled_from TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS period_snapshot (
+    symbol         TEXT PRIMARY KEY,
+    weekly_change  REAL NOT NULL,
+    monthly_change REAL NOT NULL,
+    yearly_change  REAL NOT NULL,
+    as_of          TEXT NOT NULL
+)
+"""
+
+
+def _connect():
+    """Open the store, creating the database file and schema on first use."""
+    os.makedirs(os.path.dirname(PRICE_STORE_FILE), exist_ok=True)
+    conn = sqlite3.connect(PRICE_STORE_FILE)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def get_coverage(symbols):
+    """
+    Return {symbol: (first_date, last_date)} for the symbols already in the store.
+    Dates are 'YYYY-MM-DD' strings; symbols with no stored bars are omitted.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    placeholders = ','.join('?' for _ in symbols)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT symbol, MIN(date), MAX(date) FROM daily_close "
+                f"WHERE symbol IN ({placeholders}) GROUP BY symbol",
+                symbols,
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return {}
+    return {symbol: (first, last) for symbol, first, last in rows}
+
+
+def get_refresh_dates(symbols):
+    """
+    Return {symbol: date} of the bar before the last stored one (the last one if it is
+    the only bar). Refreshing from there re-downloads one final bar to compare against
+    the store, plus the last bar, which may have been saved while still in progress.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    placeholders = ','.join('?' for _ in symbols)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT d.symbol, COALESCE(MAX(CASE WHEN d.date < last.date THEN d.date END), last.date) "
+                f"FROM daily_close d "
+                f"JOIN (SELECT symbol, MAX(date) AS date FROM daily_close "
+                f"      WHERE symbol IN ({placeholders}) GROUP BY symbol) last ON d.symbol = last.symbol "
+                f"GROUP BY d.symbol",
+                symbols,
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return {}
+    return {symbol: date for symbol, date in rows}
+
+
+def find_readjusted(close_matrix, tolerance=ADJUSTMENT_TOLERANCE):
+    """
+    Return the symbols of a freshly downloaded close frame whose final bars no longer
+    match the store, i.e. Yahoo has re-adjusted their history for a split or dividend
+    since it was saved. The last stored bar of each symbol is not compared, since it
+    may have been saved before the session closed.
+    """
+    if close_matrix is None or close_matrix.empty:
+        return []
+    symbols = list(close_matrix.columns)
+    coverage = get_coverage(symbols)
+    stored = load_closes(symbols, start=close_matrix.index.min())
+    readjusted = []
+    for symbol in symbols:
+        if symbol not in coverage or symbol not in stored.columns:
+            continue
+        last_stored = pd.Timestamp(coverage[symbol][1])
+        old = stored[symbol][stored.index < last_stored].dropna()
+        new = close_matrix[symbol].reindex(old.index).dropna()
+        if new.empty:
+            continue
+        gap = (new / old.reindex(new.index) - 1).abs()
+        if (gap > tolerance).any():
+            readjusted.append(symbol)
+    return readjusted
+
+
+def replace_closes(close_matrix):
+    """Replace every stored bar of the frame's symbols with the frame's closes."""
+    if close_matrix is None or close_matrix.empty:
+        return 0
+    symbols = list(close_matrix.columns)
+    try:
+        with _connect() as conn:
+            conn.executemany("DELETE FROM daily_close WHERE symbol = ?", [(symbol,) for symbol in symbols])
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store write error: {e}")
+        return 0
+    return save_closes(close_matrix)
+
+
+def save_closes(close_matrix):
+    """
+    Merge a wide close frame (dates × symbols) into the store.
+    Existing bars for the same (symbol, date) are overwritten, so a partial
+    intraday bar saved earlier is replaced by the final close on the next run.
+    """
+    if close_matrix is None or close_matrix.empty:
+        return 0
+
+    rows = []
+    for symbol in close_matrix.columns:
+        series = close_matrix[symbol].dropna()
+        for date, close in series.items():
+            rows.append((symbol, pd.Timestamp(date).strftime('%Y-%m-%d'), float(close)))
+
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_close (symbol, date, close) VALUES (?, ?, ?)",
+                rows,
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store write error: {e}")
+        return 0
+    return len(rows)
+
+
+def mark_refreshed(symbols, when=None):
+    """Record that `symbols` were downloaded at `when` (UTC, defaults to now)."""
+    stamp = (when or datetime.now(timezone.utc)).isoformat()
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sync_state (symbol, refreshed_at) VALUES (?, ?)",
+                [(symbol, stamp) for symbol in symbols],
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store write error: {e}")
+
+
+def mark_backfilled(symbols, start):
+    """
+    Record that `symbols` were downloaded from `start` on: Yahoo has no bars before their
+    first stored one (listed later), so plan_updates stops backfilling them.
+    """
+    start_str = pd.Timestamp(start).strftime('%Y-%m-%d')
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT INTO backfill_state (symbol, backfilled_from) VALUES (?, ?) "
+                "ON CONFLICT (symbol) DO UPDATE SET backfilled_from = MIN(backfilled_from, excluded.backfilled_from)",
+                [(symbol, start_str) for symbol in symbols],
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store write error: {e}")
+
+
+def get_backfilled_from(symbols):
+    """Return {symbol: 'YYYY-MM-DD'} of the earliest start each symbol was backfilled from."""
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    placeholders = ','.join('?' for _ in symbols)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT symbol, backfilled_from FROM backfill_state WHERE symbol IN ({placeholders})",
+                symbols,
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return {}
+    return dict(rows)
+
+
+def get_refreshed_at(symbols):
+    """Return {symbol: datetime (UTC)} of the last download for the symbols that have one."""
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    placeholders = ','.join('?' for _ in symbols)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT symbol, refreshed_at FROM sync_state WHERE symbol IN ({placeholders})",
+                symbols,
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return {}
+    return {symbol: datetime.fromisoformat(stamp) for symbol, stamp in rows}
+
+
+def get_previous_closes(symbols, before):
+    """
+    Return {symbol: (date, close)} of the last stored bar strictly before the `before`
+    date, i.e. the previous session's close for an intraday quote taken on `before`.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    placeholders = ','.join('?' for _ in symbols)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT d.symbol, d.date, d.close FROM daily_close d "
+                f"JOIN (SELECT symbol, MAX(date) AS date FROM daily_close "
+                f"      WHERE symbol IN ({placeholders}) AND date < ? GROUP BY symbol) last "
+                f"ON d.symbol = last.symbol AND d.date = last.date",
+                symbols + [pd.Timestamp(before).strftime('%Y-%m-%d')],
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return {}
+    return {symbol: (day, close) for symbol, day, close in rows}
+
+
+def save_period_snapshot(changes, when=None):
+    """
+    Persist the weekly/MTD/YTD changes of the last full fetch, {symbol: {period: value}},
+    so quote-only refreshes can reuse them without reloading a year of bars.
+    """
+    stamp = (when or datetime.now(timezone.utc)).isoformat()
+    rows = [
+        (symbol, float(values['weekly_change']), float(values['monthly_change']),
+         float(values['yearly_change']), stamp)
+        for symbol, values in changes.items()
+    ]
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO period_snapshot "
+                "(symbol, weekly_change, monthly_change, yearly_change, as_of) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store write error: {e}")
+
+
+def load_period_snapshot(symbols):
+    """Return {symbol: {'weekly_change', 'monthly_change', 'yearly_change', 'as_of'}} for stored symbols."""
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    placeholders = ','.join('?' for _ in symbols)
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT symbol, weekly_change, monthly_change, yearly_change, as_of "
+                f"FROM period_snapshot WHERE symbol IN ({placeholders})",
+                symbols,
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return {}
+    return {
+        symbol: {
+            'weekly_change': weekly,
+            'monthly_change': monthly,
+            'yearly_change': yearly,
+            'as_of': datetime.fromisoformat(as_of),
+        }
+        for symbol, weekly, monthly, yearly, as_of in rows
+    }
+
+
+def load_closes(symbols, start=None):
+    """
+    Load stored closes as a wide DataFrame (dates × symbols) from `start` onwards.
+    Symbols with no stored bars are simply absent from the columns.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return pd.DataFrame()
+
+    placeholders = ','.join('?' for _ in symbols)
+    query = f"SELECT symbol, date, close FROM daily_close WHERE symbol IN ({placeholders})"
+    params = list(symbols)
+    if start:
+        query += " AND date >= ?"
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+
+    try:
+        with _connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Price store read error: {e}")
+        return pd.DataFrame()
+
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows, columns=['symbol', 'date', 'close'])
+    df['date'] = pd.to_datetime(df['date'])
+    return df.pivot(index='date', columns='symbol', values='close').sort_index()
+
+
+def plan_updates(symbols, start, is_settled=None):
+    """
+    Work out which bars need downloading to cover `start` → today.
+
+    Returns {fetch_start_date: [symbols]}:
+      - symbols never stored (or stored only after `start`) are backfilled from `start`,
+        except those already backfilled from `start` or earlier (listed after it)
+      - stored symbols are refreshed from the bar before their last stored one (see
+        get_refresh_dates), grouped by that date so a stale or delisted symbol does not
+        drag the others back to its own date
+
+    `is_settled(symbol, refreshed_at)` may flag stored symbols whose market has not
+    traded since their last download; those are left out of the refresh entirely.
+    """
+    start_str = pd.Timestamp(start).strftime('%Y-%m-%d')
+    # The first stored bar can legitimately sit a few days after `start` (weekends, holidays)
+    backfill_cutoff = (pd.Timestamp(start) + pd.Timedelta(days=BACKFILL_TOLERANCE_DAYS)).strftime('%Y-%m-%d')
+    coverage = get_coverage(symbols)
+
+    refreshed_at = get_refreshed_at(symbols) if is_settled else {}
+    refresh_dates = get_refresh_dates(list(coverage))
+    backfilled_from = get_backfilled_from(list(coverage))
+
+    backfill = []
+    refresh = []
+    for symbol in symbols:
+        first_last = coverage.get(symbol)
+        if not first_last or (first_last[0] > backfill_cutoff
+                              and backfilled_from.get(symbol, '9999-12-31') > start_str):
+            backfill.append(symbol)
+        elif is_settled and is_settled(symbol, refreshed_at.get(symbol)):
+            continue
+        else:
+            refresh.append(symbol)
+
+    plan = {}
+    if backfill:
+        plan[start_str] = backfill
+    for symbol in refresh:
+        refresh_from = refresh_dates.get(symbol, coverage[symbol][1])
+        plan.setdefault(refresh_from, []).append(symbol)
+    return plan
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Rate Limiting
+=============
+Token bucket shared by the modules that pace outgoing requests: yahoo_fetch (one
+bucket per Yahoo host) and etoro_client (one bucket per eToro write endpoint).
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Block until `tokens` tokens have been taken (one at a time, so any cost fits)."""
+        for _ in range(max(1, tokens)):
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                time.sleep(wait)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Returns & Attribution Engine
+============================
+Vectorized period returns and weighted attribution over a price matrix.
+
+Works on a dates × tickers close matrix (as served by finance_fetcher.fetch_close_matrix)
+and a weight vector, so daily / weekly / MTD / YTD returns, the weighted portfolio
+return and every position's contribution (weight × return) come out of one NumPy pass
+instead of per-ticker .iloc lookups and one Python loop per metric.
+"""
+
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+PERIODS = ('daily_change', 'weekly_change', 'monthly_change', 'yearly_change')
+
+# Weekly change compares against the close 5 trading days back (previous Friday)
+WEEKLY_LOOKBACK_BARS = 5
+
+
+def _compact(values):
+    """
+    Move each column's valid (non-NaN) closes to the top, keeping their date order.
+    Returns (compacted values, number of valid closes per column).
+    """
+    valid = np.isfinite(values)
+    order = np.argsort(~valid, axis=0, kind='stable')
+    return np.take_along_axis(values, order, axis=0), valid.sum(axis=0)
+
+
+def _pct(current, base):
+    """Element-wise % change; 0.0 wherever the base is missing or zero."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (current - base) / base * 100
+    return np.where(np.isfinite(change), change, 0.0)
+
+
+def _window_return(values, rows):
+    """First → last valid close inside the selected rows, per column (0.0 with < 2 closes)."""
+    n_cols = values.shape[1]
+    if not rows.any():
+        return np.zeros(n_cols)
+    compact, count = _compact(values[rows])
+    cols = np.arange(n_cols)
+    last = compact[np.clip(count - 1, 0, None), cols]
+    change = _pct(last, compact[0, cols])
+    return np.where(count >= 2, change, 0.0)
+
+
+def period_returns(closes, now=None):
+    """
+    Daily, weekly, MTD and YTD % changes for every column of a close matrix.
+
+    Args:
+        closes: DataFrame (dates × tickers); NaN marks days a market did not trade
+        now: reference datetime for the MTD/YTD windows (defaults to datetime.now())
+
+    Returns:
+        DataFrame indexed by ticker with one column per entry of PERIODS
+    """
+    now = now or datetime.now()
+    values = closes.to_numpy(dtype=float)
+    n_rows, n_cols = values.shape
+    if n_rows == 0 or n_cols == 0:
+        return pd.DataFrame(0.0, index=closes.columns, columns=list(PERIODS))
+
+    compact, count = _compact(values)
+    cols = np.arange(n_cols)
+    enough = count >= 2
+
+    current = compact[np.clip(count - 1, 0, None), cols]
+    previous = compact[np.clip(count - 2, 0, None), cols]
+    # With fewer bars than the lookback, fall back to the oldest close available
+    week_ago = compact[np.clip(count - 1 - WEEKLY_LOOKBACK_BARS, 0, None), cols]
+
+    dates = closes.index.values
+    month_rows = dates >= np.datetime64(pd.Timestamp(year=now.year, month=now.month, day=1))
+    year_rows = dates >= np.datetime64(pd.Timestamp(year=now.year, month=1, day=1))
+
+    return pd.DataFrame({
+        'daily_change': np.where(enough, _pct(current, previous), 0.0),
+        'weekly_change': np.where(enough, _pct(current, week_ago), 0.0),
+        'monthly_change': _window_return(values, month_rows),
+        'yearly_change': _window_return(values, year_rows),
+    }, index=closes.columns)
+
+
+def weighted_attribution(returns, weights=None):
+    """
+    Weighted portfolio return and per-position contribution for every period at once.
+
+    Args:
+        returns: DataFrame indexed by ticker, one column per period (e.g. period_returns())
+        weights: {ticker: weight_pct}; tickers without a weight contribute nothing.
+                 With no usable weights every position gets an equal share.
+
+    Returns:
+        dict with:
+          portfolio     — {period: weighted return %}
+          contributions — DataFrame (tickers × periods) of weight × return
+          weights       — Series of the decimal weights applied
+          total_weight  — sum of the applied weights (1.0 in equal-weight mode)
+          missing       — tickers that had no weight
+          equal_weight  — True when the equal-weight fallback was used
+    """
+    tickers = list(returns.index)
+    matrix = returns.to_numpy(dtype=float)
+    weights = weights or {}
+
+    w = np.array([weights.get(ticker, np.nan) for ticker in tickers], dtype=float) / 100.0
+    has_weight = np.isfinite(w)
+    w = np.where(has_weight, w, 0.0)
+    total_weight = float(w.sum())
+    missing = [ticker for ticker, ok in zip(tickers, has_weight) if not ok] if weights else []
+
+    equal_weight = not tickers or total_weight == 0
+    if equal_weight and tickers:
+        w = np.full(len(tickers), 1.0 / len(tickers))
+        total_weight = 1.0
+
+    contributions = matrix * w[:, None] if tickers else np.zeros((0, len(returns.columns)))
+    portfolio = contributions.sum(axis=0)
+
+    return {
+        'portfolio': {period: float(value) for period, value in zip(returns.columns, portfolio)},
+        'contributions': pd.DataFrame(contributions, index=returns.index, columns=returns.columns),
+        'weights': pd.Series(w, index=returns.index),
+        'total_weight': total_weight,
+        'missing': missing,
+        'equal_weight': equal_weight,
+    }
@@ -33,6 +33,7 @@ import story_generator
 import ai_news_generator
 import etoro_history
 import gist_storage
+import trading_calendar
 
 
 # ── eToro constants ───────────────────────────────────────────────────────────
@@ -93,15 +94,11 @@ def _extract_top_performers(plain_text: str, stock_data: dict = None) -> list:
     if stock_data:
         try:
             sorted_stocks = sorted(
-                stock_data.items(),
+                trading_calendar.filter_traded_today(stock_data).items(),
                 key=lambda x: x[1].get("daily_change", 0),
                 reverse=True,
             )
-            return [
-                (sym, d.get("daily_change", 0.0))
-                for sym, d in sorted_stocks[:5]
-                if d.get("has_traded_today", True)
-            ]
+            return [(sym, d.get("daily_change", 0.0)) for sym, d in sorted_stocks[:5]]
         except Exception:
             pass
 
@@ -128,7 +125,7 @@ def publish_all(
     Read the recap and publish to all enabled platforms.
 
     Args:
-        recap_file_path:      Path to recap.txt
+        recap_file_path:      Path to recap.txt (None if the recap stage did not run)
         image_path:           Optional path to the performance chart PNG
         pie_chart_path:       Optional path to a pie chart PNG (alternates each session)
         ai_cover_path:        Optional path to the AI/PIL cover image
@@ -222,6 +219,9 @@ def publish_all(
     print("=" * 60)
 
     # ── Read recap ──────────────────────────────────────────────────
+    if not recap_file_path:
+        print("❌ No recap was generated this run, nothing to publish")
+        return results
     try:
         with open(recap_file_path, "r", encoding="utf-8") as f:
             full_recap = f.read()
@@ -405,15 +405,14 @@ def publish_all(
                 except Exception as g_err:
                     print(f"⚠️ Failed to save last eToro post to Gist: {g_err}")
 
-            # Execute 3-comment cross-linking sequence in immediate succession (5s interval) to save runner minutes
+            # Execute 3-comment cross-linking sequence in immediate succession (paced by the eToro comment budget) to save runner minutes
             if etoro_sender.LAST_PUBLISHED_POST_ID and market_session in ["U.S. market open", "European market open", "U.S. market close"]:
                 try:
                     import cross_link_scheduler
                     target_pid = etoro_sender.LAST_PUBLISHED_POST_ID
-                    print(f"🚀 Publishing 3 cross-linking comments on eToro post {target_pid} in immediate sequence (5s interval)...")
+                    print(f"🚀 Publishing 3 cross-linking comments on eToro post {target_pid} in immediate sequence...")
                     cross_link_scheduler.run_comments_sequence(
                         post_id=target_pid,
-                        interval_seconds=5,
                         session_name=market_session,
                         market_data=stock_data
                     )
@@ -891,10 +890,10 @@ def _publish_copy_trading_post(portfolio_perf: float = None) -> dict:
     gain_history = None
     rankings_data = None
     try:
-        import etoro_client as _ec
-        if _ec.is_configured():
-            gain_history = _ec.fetch_gain_history(granularity="monthly")
-            rankings_data = _ec.fetch_trader_rankings(period="CurrYear")
+        import market_context
+        ctx = market_context.get_context()
+        gain_history = ctx.etoro_gain_history(granularity="monthly")
+        rankings_data = ctx.trader_rankings(period="CurrYear")
     except Exception as exc:
         print(f"⚠️  Could not fetch live eToro data for copy trading post: {exc}")
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Local State Store
+=================
+SQLite copy of the gist_storage document for hosts with a local disk (the Orange Pi):
+one row per shard, holding the same JSON the Gist file would contain.
+
+gist_storage uses it when STATE_BACKEND=sqlite, so loads and saves never leave the
+machine. Every save bumps the shard's version; pending_shards() lists the versions
+not yet replicated to the Gist, and mark_replicated() records them once pushed.
+remote_versions() remembers which content of each shard was last seen in the Gist, so
+a shard changed there since can be pulled (or held back instead of overwritten), and
+queue_deletes() keeps Gist files to remove (the legacy single file) until replicated.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+STATE_DB_FILE = os.environ.get(
+    'STATE_DB_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'state.sqlite')
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state_shard (
+    name               TEXT PRIMARY KEY,
+    content            BLOB NOT NULL,
+    version            INTEGER NOT NULL,
+    replicated_version INTEGER NOT NULL DEFAULT 0,
+    updated_at         TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS state_shard_pending ON state_shard (name)
+    WHERE replicated_version < version;
+CREATE TABLE IF NOT EXISTS remote_shard (
+    name     TEXT PRIMARY KEY,
+    digest   TEXT NOT NULL,
+    raw_url  TEXT,
+    seen_at  TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pending_delete (
+    filename   TEXT PRIMARY KEY,
+    queued_at  TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+_initialized = False
+
+
+# Shard JSON is stored as UTF-8 bytes; 'surrogatepass' keeps the escaped emoji halves
+# found in older recap texts, which sqlite would reject as TEXT
+def _encode(content):
+    return content.encode('utf-8', 'surrogatepass')
+
+
+def _decode(blob):
+    return bytes(blob).decode('utf-8', 'surrogatepass')
+
+
+def _connect():
+    """Open the store, creating the database file and schema on first use."""
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(STATE_DB_FILE), exist_ok=True)
+    conn = sqlite3.connect(STATE_DB_FILE, timeout=10)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized = True
+    return conn
+
+
+def load_shards():
+    """Return {shard: serialized content} for every stored shard."""
+    try:
+        with _connect() as conn:
+            rows = conn.execute("SELECT name, content FROM state_shard").fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ State store read error: {e}")
+        return {}
+    return {name: _decode(content) for name, content in rows}
+
+
+def save_shards(shards, replicated=False):
+    """
+    Write {shard: serialized content}, bumping each shard's version.
+    With `replicated`, the new versions are recorded as already present in the Gist.
+    """
+    if not shards:
+        return 0
+    stamp = datetime.now(timezone.utc).isoformat()
+    try:
+        with _connect() as conn:
+            for name, content in shards.items():
+                conn.execute(
+                    "INSERT INTO state_shard (name, content, version, replicated_version, updated_at) "
+                    "VALUES (?, ?, 1, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET content = excluded.content, "
+                    "version = version + 1, updated_at = excluded.updated_at",
+                    (name, _encode(content), 1 if replicated else 0, stamp),
+                )
+                if replicated:
+                    conn.execute("UPDATE state_shard SET replicated_version = version WHERE name = ?", (name,))
+    except sqlite3.Error as e:
+        print(f"⚠️ State store write error: {e}")
+        return 0
+    return len(shards)
+
+
+def pending_shards():
+    """Return {shard: (content, version)} for shards changed since their last replication."""
+    try:
+        with _connect() as conn:
+            rows = conn.execute(
+                "SELECT name, content, version FROM state_shard WHERE replicated_version < version"
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ State store read error: {e}")
+        return {}
+    return {name: (_decode(content), version) for name, content, version in rows}
+
+
+def mark_replicated(versions):
+    """Record {shard: version} as pushed to the Gist (newer local versions stay pending)."""
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "UPDATE state_shard SET replicated_version = ? WHERE name = ? AND replicated_version < ?",
+                [(version, name, version) for name, version in versions.items()],
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ State store write error: {e}")
+
+
+def remote_versions():
+    """Return {shard: (digest, raw_url)} of the content last seen in (or pushed to) the Gist."""
+    try:
+        with _connect() as conn:
+            rows = conn.execute("SELECT name, digest, raw_url FROM remote_shard").fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ State store read error: {e}")
+        return {}
+    return {name: (digest, raw_url) for name, digest, raw_url in rows}
+
+
+def set_remote_versions(versions):
+    """Record {shard: (digest, raw_url)} as the content currently in the Gist."""
+    if not versions:
+        return
+    stamp = datetime.now(timezone.utc).isoformat()
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO remote_shard (name, digest, raw_url, seen_at) VALUES (?, ?, ?, ?)",
+                [(name, digest, raw_url, stamp) for name, (digest, raw_url) in versions.items()],
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ State store write error: {e}")
+
+
+def queue_deletes(filenames):
+    """Remember Gist files to delete on the next replication. Returns True on success."""
+    stamp = datetime.now(timezone.utc).isoformat()
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO pending_delete (filename, queued_at) VALUES (?, ?)",
+                [(name, stamp) for name in filenames],
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ State store write error: {e}")
+        return False
+    return True
+
+
+def pending_deletes():
+    """Return the Gist file names still to be deleted."""
+    try:
+        with _connect() as conn:
+            rows = conn.execute("SELECT filename FROM pending_delete").fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ State store read error: {e}")
+        return []
+    return [name for (name,) in rows]
+
+
+def clear_deletes(filenames):
+    """Forget Gist file deletions that have been replicated."""
+    try:
+        with _connect() as conn:
+            conn.executemany("DELETE FROM pending_delete WHERE filename = ?", [(name,) for name in filenames])
+    except sqlite3.Error as e:
+        print(f"⚠️ State store write error: {e}")
@@ -760,8 +760,8 @@ def _get_live_weight_for_ticker(ticker: str) -> str:
     """Fetch live weight from portfolio / eToro API, formatted with percentage."""
     clean = ticker.replace("$", "").strip().upper()
     try:
-        from finance_fetcher import fetch_portfolio_weights
-        weights = fetch_portfolio_weights()
+        import market_context
+        weights = market_context.get_context().portfolio_weights()
         if clean in weights and weights[clean] > 0:
             return f"{weights[clean]:.2f}%"
     except Exception:
@@ -817,10 +817,8 @@ def fetch_dynamic_company_infographic_data(ticker: str) -> dict:
     api_key = os.environ.get("GEMINI_API_KEY")
     if api_key:
         try:
-            from google import genai
-            from google.genai import types
+            import gemini_gateway
 
-            client = genai.Client(api_key=api_key)
             prompt = f"""Analizza in profondità l'azienda {company_name} (${clean_ticker}).
 Il peso attuale in portafoglio è: {live_weight}.
 Fornisci in formato JSON strutturato (senza markdown extra):
@@ -846,32 +844,23 @@ Fornisci in formato JSON strutturato (senza markdown extra):
   "color": [20, 100, 200]
 }}"""
 
-            config_gen = types.GenerateContentConfig(
-                temperature=0.3,
-                response_mime_type="application/json"
-            )
+            def _is_complete(text):
+                parsed = json.loads(text)
+                return bool(parsed.get("name") and parsed.get("kpis"))
 
-            models_to_try = ["gemini-3.7-flash", "gemini-3.6-flash", "gemini-3.5-flash", "gemini-2.5-flash"]
-            for model_name in models_to_try:
-                try:
-                    res = client.models.generate_content(
-                        model=model_name,
-                        contents=prompt,
-                        config=config_gen,
-                    )
-                    if res and res.text:
-                        parsed = json.loads(res.text)
-                        if parsed.get("name") and parsed.get("kpis"):
-                            for k in parsed.get("kpis", []):
-                                if "PESO" in k.get("label", "").upper():
-                                    k["val"] = live_weight
-                            with open(cache_file, "w", encoding="utf-8") as f:
-                                json.dump(parsed, f, indent=2, ensure_ascii=False)
-                            print(f"✓ Dynamically generated and cached AI infographic data for {clean_ticker} using {model_name}")
-                            return parsed
-                except Exception as m_err:
-                    print(f"   ⚠️ Infographic generation model {model_name} failed: {m_err}")
-                    time.sleep(1)
+            text, model_name = gemini_gateway.generate(
+                prompt, "stock_focus_infographic", temperature=0.3,
+                response_mime_type="application/json", validate=_is_complete, api_key=api_key
+            )
+            if text:
+                parsed = json.loads(text)
+                for k in parsed.get("kpis", []):
+                    if "PESO" in k.get("label", "").upper():
+                        k["val"] = live_weight
+                with open(cache_file, "w", encoding="utf-8") as f:
+                    json.dump(parsed, f, indent=2, ensure_ascii=False)
+                print(f"✓ Dynamically generated and cached AI infographic data for {clean_ticker} using {model_name}")
+                return parsed
         except Exception as exc:
             print(f"⚠️ Dynamic Gemini infographic generation fallback for {clean_ticker}: {exc}")
 
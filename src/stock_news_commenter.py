@@ -12,7 +12,6 @@ When breaking news occurs for an asset that has a past Stock Focus post on eToro
 
 import os
 import sys
-import time
 import json
 import hashlib
 import re
@@ -38,26 +37,8 @@ import gist_storage
 import analytics_tracker
 from etoro_sender import _strip_html
 
-try:
-    from google import genai
-    from google.genai import types
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
-
-try:
-    from api_usage_tracker import log_api_request
-    API_TRACKER_AVAILABLE = True
-except ImportError:
-    API_TRACKER_AVAILABLE = False
-
-
-DEFAULT_GEMINI_MODELS = [
-    'gemini-3.7-flash',
-    'gemini-3.6-flash',
-    'gemini-3.5-flash',
-    'gemini-2.5-flash',
-]
+import gemini_gateway
+from gemini_gateway import GENAI_AVAILABLE
 
 # Keywords indicating operational, financial, or strategic catalysts
 CATALYST_KEYWORDS = [
@@ -216,27 +197,9 @@ REGOLE OBBLIGATORIE:
 
 Output SOLO il testo del commento in italiano."""
 
-    try:
-        client = genai.Client(api_key=api_key)
-        config_gen = types.GenerateContentConfig(temperature=0.6)
-
-        for model_name in DEFAULT_GEMINI_MODELS:
-            try:
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=prompt,
-                    config=config_gen,
-                )
-                if response and response.text:
-                    out = response.text.strip()
-                    if API_TRACKER_AVAILABLE:
-                        log_api_request(model_name, True, "stock_news_catalyst_comment")
-                    return out
-            except Exception as exc:
-                print(f"   ⚠️ Gemini {model_name} failed: {exc}")
-                continue
-    except Exception as e:
-        print(f"⚠️ Gemini client error: {e}")
+    out, _ = gemini_gateway.generate(prompt, "stock_news_catalyst_comment", temperature=0.6, api_key=api_key)
+    if out:
+        return out
 
     return fallback_text
 
@@ -355,7 +318,6 @@ def run_stock_news_commenter(
                         'headline': item['title'],
                         'hash': n_hash,
                     })
-                    time.sleep(3)
                     break
                 else:
                     print(f"   ❌ Failed to post comment on eToro: {res.get('error')}")
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Exchange Trading Calendar
+=========================
+Precomputed trading-day index for every exchange the portfolio trades on:
+NYSE/NASDAQ, LSE, Xetra, Borsa Italiana, Euronext, HKEX and Nasdaq Copenhagen
+(crypto trades around the clock).
+
+Each exchange/year is expanded once into {date: (open_utc, close_utc)}, including
+holidays and half-days, so "is this market open / has it traded today / is its last
+bar final" are dictionary lookups. Used by finance_fetcher (has_traded_today, and
+skipping downloads for markets with no new bars) and by the formatter / Top & Flop
+card to keep closed markets out of the daily rankings.
+"""
+
+import threading
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+import instrument_registry
+
+CRYPTO = 'CRYPTO'
+
+# Regular hours in local exchange time; half_day_close applies on each calendar's half-days
+EXCHANGES = {
+    'XNYS': {'name': 'NYSE / NASDAQ',   'tz': 'America/New_York', 'open': (9, 30), 'close': (16, 0), 'half_day_close': (13, 0)},
+    'XLON': {'name': 'London',          'tz': 'Europe/London',    'open': (8, 0),  'close': (16, 30), 'half_day_close': (12, 30)},
+    'XETR': {'name': 'Xetra',           'tz': 'Europe/Berlin',    'open': (9, 0),  'close': (17, 30), 'half_day_close': (14, 0)},
+    'XMIL': {'name': 'Borsa Italiana',  'tz': 'Europe/Rome',      'open': (9, 0),  'close': (17, 30), 'half_day_close': (14, 0)},
+    'XPAR': {'name': 'Euronext',        'tz': 'Europe/Paris',     'open': (9, 0),  'close': (17, 30), 'half_day_close': (14, 5)},
+    'XHKG': {'name': 'HKEX',            'tz': 'Asia/Hong_Kong',   'open': (9, 30), 'close': (16, 0), 'half_day_close': (12, 0)},
+    'XCSE': {'name': 'Copenhagen',      'tz': 'Europe/Copenhagen', 'open': (9, 0), 'close': (17, 0), 'half_day_close': (13, 0)},
+}
+
+# Yahoo exchange codes (instrument_registry) → calendar
+YAHOO_EXCHANGE_CALENDARS = {
+    'US': 'XNYS', 'NMS': 'XNYS', 'NGM': 'XNYS', 'NCM': 'XNYS', 'NYQ': 'XNYS', 'ASE': 'XNYS',
+    'PCX': 'XNYS', 'BTS': 'XNYS', 'NAS': 'XNYS', 'NYS': 'XNYS', 'PNK': 'XNYS', 'OQB': 'XNYS', 'OQX': 'XNYS',
+    'LSE': 'XLON', 'IOB': 'XLON',
+    'GER': 'XETR', 'FRA': 'XETR',
+    'MIL': 'XMIL',
+    'PAR': 'XPAR', 'AMS': 'XPAR', 'BRU': 'XPAR',
+    'HKG': 'XHKG',
+    'CPH': 'XCSE',
+    'CCC': CRYPTO,
+}
+
+# HKEX closures that follow the lunar calendar or Sunday substitution rules (HKEX circulars).
+# Extend yearly; dates missing here only lose lunar holidays, the fixed ones are computed.
+HKEX_LUNAR_CLOSURES = {
+    2025: ['2025-01-29', '2025-01-30', '2025-01-31', '2025-04-04', '2025-05-05', '2025-10-07', '2025-10-29'],
+    2026: ['2026-02-17', '2026-02-18', '2026-02-19', '2026-04-07', '2026-05-25', '2026-06-19', '2026-10-19'],
+    2027: ['2027-02-08', '2027-02-09', '2027-04-05', '2027-05-13', '2027-06-09', '2027-09-16', '2027-10-08'],
+}
+# Lunar New Year's Eve half-days on HKEX
+HKEX_LUNAR_HALF_DAYS = {2025: ['2025-01-28'], 2026: ['2026-02-16'], 2027: ['2027-02-05']}
+
+
+# ── Holiday rules ─────────────────────────────────────────────────────────
+
+def _easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday (Mon=0) of a month."""
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    nxt = date(year + (month == 12), month % 12 + 1, 1)
+    last = nxt - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _us_observed(d: date) -> date:
+    """NYSE rule: Saturday holidays move to Friday, Sunday holidays to Monday."""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def _substitute(days, taken=None) -> set:
+    """Move weekend holidays to the next free weekday (UK / HK substitution rule)."""
+    result = set(taken or ())
+    for d in sorted(days):
+        while d.weekday() >= 5 or d in result:
+            d += timedelta(days=1)
+        result.add(d)
+    return result
+
+
+def _us_calendar(year: int):
+    easter = _easter(year)
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),                   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),                   # Presidents' Day
+        easter - timedelta(days=2),                    # Good Friday
+        _last_weekday(year, 5, 0),                     # Memorial Day
+        _us_observed(date(year, 7, 4)),                # Independence Day
+        _nth_weekday(year, 9, 0, 1),                   # Labor Day
+        _nth_weekday(year, 11, 3, 4),                  # Thanksgiving
+        _us_observed(date(year, 12, 25)),              # Christmas
+    }
+    if date(year, 1, 1).weekday() != 5:                # no Friday substitute for a Saturday New Year
+        holidays.add(_us_observed(date(year, 1, 1)))
+    if year >= 2022:
+        holidays.add(_us_observed(date(year, 6, 19)))  # Juneteenth
+    half_days = {date(year, 7, 3), _nth_weekday(year, 11, 3, 4) + timedelta(days=1), date(year, 12, 24)}
+    return holidays, half_days
+
+
+def _uk_calendar(year: int):
+    easter = _easter(year)
+    holidays = {
+        easter - timedelta(days=2),                    # Good Friday
+        easter + timedelta(days=1),                    # Easter Monday
+        _nth_weekday(year, 5, 0, 1),                   # Early May bank holiday
+        _last_weekday(year, 5, 0),                     # Spring bank holiday
+        _last_weekday(year, 8, 0),                     # Summer bank holiday
+    }
+    holidays |= _substitute([date(year, 1, 1)])
+    holidays |= _substitute([date(year, 12, 25), date(year, 12, 26)])
+    return holidays, {date(year, 12, 24), date(year, 12, 31)}
+
+
+def _xetra_calendar(year: int):
+    easter = _easter(year)
+    holidays = {date(year, 1, 1), easter - timedelta(days=2), easter + timedelta(days=1), date(year, 5, 1),
+                date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31)}
+    return holidays, set()
+
+
+def _milan_calendar(year: int):
+    holidays, _ = _xetra_calendar(year)
+    return holidays | {date(year, 8, 15)}, set()      # Ferragosto
+
+
+def _euronext_calendar(year: int):
+    easter = _easter(year)
+    holidays = {date(year, 1, 1), easter - timedelta(days=2), easter + timedelta(days=1), date(year, 5, 1),
+                date(year, 12, 25), date(year, 12, 26)}
+    return holidays, {date(year, 12, 24), date(year, 12, 31)}
+
+
+def _copenhagen_calendar(year: int):
+    easter = _easter(year)
+    holidays = {
+        date(year, 1, 1),
+        easter - timedelta(days=3),                    # Maundy Thursday
+        easter - timedelta(days=2),                    # Good Friday
+        easter + timedelta(days=1),                    # Easter Monday
+        easter + timedelta(days=39),                   # Ascension Day
+        easter + timedelta(days=40),                   # Friday after Ascension (bank holiday)
+        easter + timedelta(days=50),                   # Whit Monday
+        date(year, 6, 5),                              # Constitution Day
+        date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31),
+    }
+    if year < 2024:
+        holidays.add(easter + timedelta(days=26))      # Great Prayer Day (abolished from 2024)
+    return holidays, set()
+
+
+def _hkex_calendar(year: int):
+    easter = _easter(year)
+    holidays = {easter - timedelta(days=2), easter + timedelta(days=1)}   # Good Friday, Easter Monday
+    # Fixed-date holidays: Sunday ones move to the next free weekday, Saturday ones are lost
+    for d in (date(year, 1, 1), date(year, 5, 1), date(year, 7, 1), date(year, 10, 1), date(year, 12, 25)):
+        if d.weekday() != 5:
+            holidays = _substitute([d], holidays)
+    holidays = _substitute([date(year, 12, 26)], holidays)   # first weekday after Christmas
+    holidays |= {date.fromisoformat(d) for d in HKEX_LUNAR_CLOSURES.get(year, [])}
+    half_days = {date(year, 12, 24), date(year, 12, 31)}
+    half_days |= {date.fromisoformat(d) for d in HKEX_LUNAR_HALF_DAYS.get(year, [])}
+    return holidays, half_days
+
+
+_CALENDAR_RULES = {
+    'XNYS': _us_calendar,
+    'XLON': _uk_calendar,
+    'XETR': _xetra_calendar,
+    'XMIL': _milan_calendar,
+    'XPAR': _euronext_calendar,
+    'XHKG': _hkex_calendar,
+    'XCSE': _copenhagen_calendar,
+}
+
+
+# ── Index ─────────────────────────────────────────────────────────────────
+
+_index: Dict[Tuple[str, int], Dict[date, Tuple[datetime, datetime]]] = {}
+_index_lock = threading.Lock()
+
+
+def _localize(tz_name: str, day: date, hour_minute) -> datetime:
+    tz = pytz.timezone(tz_name)
+    return tz.localize(datetime.combine(day, dtime(*hour_minute))).astimezone(timezone.utc)
+
+
+def _build_year(code: str, year: int) -> Dict[date, Tuple[datetime, datetime]]:
+    """Expand one exchange/year into {trading_day: (open_utc, close_utc)}."""
+    spec = EXCHANGES[code]
+    holidays, half_days = _CALENDAR_RULES[code](year)
+    sessions = {}
+    day = date(year, 1, 1)
+    while day.year == year:
+        if day.weekday() < 5 and day not in holidays:
+            close = spec['half_day_close'] if day in half_days else spec['close']
+            sessions[day] = (_localize(spec['tz'], day, spec['open']), _localize(spec['tz'], day, close))
+        day += timedelta(days=1)
+    return sessions
+
+
+def _year_index(code: str, year: int) -> Dict[date, Tuple[datetime, datetime]]:
+    key = (code, year)
+    if key not in _index:
+        with _index_lock:
+            if key not in _index:
+                _index[key] = _build_year(code, year)
+    return _index[key]
+
+
+def _utc_now(now: Optional[datetime]) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now if now.tzinfo else now.replace(tzinfo=timezone.utc)
+
+
+def _local_date(code: str, now: datetime) -> date:
+    return now.astimezone(pytz.timezone(EXCHANGES[code]['tz'])).date()
+
+
+# ── Public API ────────────────────────────────────────────────────────────
+
+def exchange_for_symbol(yahoo_ticker: str) -> Optional[str]:
+    """Calendar code for a Yahoo symbol (via the instrument registry), or None if unknown."""
+    yahoo_exchange = (instrument_registry.get(yahoo_ticker, 'exchange')
+                      or instrument_registry.exchange_from_symbol(yahoo_ticker))
+    return YAHOO_EXCHANGE_CALENDARS.get(yahoo_exchange)
+
+
+def session(code: str, day: date) -> Optional[Tuple[datetime, datetime]]:
+    """(open_utc, close_utc) of the exchange's session on a local date, None if closed."""
+    return _year_index(code, day.year).get(day)
+
+
+def is_trading_day(code: str, day: date) -> bool:
+    if code == CRYPTO or code not in EXCHANGES or pytz is None:
+        return True
+    return session(code, day) is not None
+
+
+def is_open(code: str, now: datetime = None) -> bool:
+    """True while the exchange is inside a regular session."""
+    if code == CRYPTO or code not in EXCHANGES or pytz is None:
+        return True
+    now = _utc_now(now)
+    today = session(code, _local_date(code, now))
+    return bool(today and today[0] <= now < today[1])
+
+
+def has_traded_today(code: str, now: datetime = None, reference_date: date = None) -> bool:
+    """
+    True if the exchange's latest session that has opened falls on the run's reference
+    date (the UTC date of `now` by default). Deciding on the run's date rather than the
+    exchange's wall clock keeps HKEX in at the U.S. close, when Hong Kong is already on
+    the next (not yet opened) day. False on holidays, weekends and before the opening
+    bell (e.g. US pre-market). Unknown exchanges are assumed to have traded.
+    """
+    if code == CRYPTO or code not in EXCHANGES or pytz is None:
+        return True
+    now = _utc_now(now)
+    bounds = last_session(code, now)
+    return bool(bounds) and _local_date(code, bounds[0]) == (reference_date or now.date())
+
+
+def last_session(code: str, now: datetime = None) -> Optional[Tuple[datetime, datetime]]:
+    """Most recent session that has already opened (today's if it is running or done)."""
+    now = _utc_now(now)
+    day = _local_date(code, now)
+    for _ in range(15):  # longest closure runs (e.g. Lunar New Year + weekend) are well below this
+        bounds = session(code, day)
+        if bounds and bounds[0] <= now:
+            return bounds
+        day -= timedelta(days=1)
+    return None
+
+
+def previous_session_date(code: str, now: datetime = None) -> Optional[date]:
+    """
+    Local date of the session before the latest one that has opened: the bar a quote
+    taken at `now` is measured against. None for crypto and unknown exchanges.
+    """
+    if code == CRYPTO or code not in EXCHANGES or pytz is None:
+        return None
+    bounds = last_session(code, now)
+    if not bounds:
+        return None
+    day = _local_date(code, bounds[0]) - timedelta(days=1)
+    for _ in range(15):
+        if session(code, day):
+            return day
+        day -= timedelta(days=1)
+    return None
+
+
+def is_settled(code: str, since: datetime, now: datetime = None) -> bool:
+    """
+    True if no session has been running since `since` (UTC), i.e. a download made at
+    `since` already holds the final bar and fetching again cannot return new prices.
+    """
+    if code == CRYPTO or code not in EXCHANGES or pytz is None or since is None:
+        return False
+    bounds = last_session(code, now)
+    return bool(bounds) and bounds[1] <= _utc_now(since)
+
+
+def traded_today(data: dict, now: datetime = None) -> bool:
+    """
+    Whether a stock_data entry belongs to a market that has traded today: uses the
+    fetcher's has_traded_today flag when present, the exchange calendar otherwise.
+    """
+    if 'has_traded_today' in data:
+        return bool(data['has_traded_today'])
+    yahoo_ticker = data.get('yahoo_ticker')
+    return has_traded_today(exchange_for_symbol(yahoo_ticker), now) if yahoo_ticker else True
+
+
+def filter_traded_today(stock_data: dict, now: datetime = None) -> dict:
+    """Drop the stock_data entries whose market has not traded today."""
+    return {ticker: data for ticker, data in stock_data.items() if traded_today(data, now)}
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Portfolio Weights Store
+=======================
+On-disk history of live portfolio weight snapshots (SQLite under data/).
+
+finance_fetcher.fetch_portfolio_weights serves the latest snapshot while it is
+younger than WEIGHTS_TTL_MINUTES, so sessions running close together (and every
+caller within a run, via market_context) share one /portfolio/live call. Every
+snapshot is kept, so weight drift can be charted from load_history() without
+new API calls.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+WEIGHTS_STORE_FILE = os.environ.get(
+    'WEIGHTS_STORE_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'weights_store.sqlite')
+)
+
+# How long a snapshot is served before the live weights are fetched again
+WEIGHTS_TTL_MINUTES = float(os.environ.get('WEIGHTS_TTL_MINUTES', '15'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weight_snapshot (
+    taken_at TEXT NOT NULL,
+    ticker   TEXT NOT NULL,
+    weight   REAL NOT NULL,
+    source   TEXT NOT NULL,
+    PRIMARY KEY (taken_at, ticker)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS weight_snapshot_ticker ON weight_snapshot (ticker, taken_at)
+"""
+
+
+def _connect():
+    """Open the store, creating the database file and schema on first use."""
+    os.makedirs(os.path.dirname(WEIGHTS_STORE_FILE), exist_ok=True)
+    conn = sqlite3.connect(WEIGHTS_STORE_FILE)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def save_snapshot(weights, source='etoro', when=None):
+    """Append a {ticker: weight_pct} snapshot taken at `when` (UTC, defaults to now)."""
+    if not weights:
+        return 0
+    stamp = (when or datetime.now(timezone.utc)).isoformat()
+    rows = [(stamp, ticker, float(weight), source) for ticker, weight in weights.items()]
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO weight_snapshot (taken_at, ticker, weight, source) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Weights store write error: {e}")
+        return 0
+    return len(rows)
+
+
+def load_latest(max_age_minutes=None):
+    """
+    Return (taken_at, {ticker: weight_pct}) for the most recent snapshot, or None.
+    With `max_age_minutes`, snapshots older than that are ignored.
+    """
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT MAX(taken_at) FROM weight_snapshot").fetchone()
+            if not row or not row[0]:
+                return None
+            taken_at = datetime.fromisoformat(row[0])
+            if max_age_minutes is not None and \
+                    datetime.now(timezone.utc) - taken_at > timedelta(minutes=max_age_minutes):
+                return None
+            rows = conn.execute(
+                "SELECT ticker, weight FROM weight_snapshot WHERE taken_at = ?", (row[0],)
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Weights store read error: {e}")
+        return None
+    return taken_at, {ticker: weight for ticker, weight in rows}
+
+
+def load_history(tickers=None, start=None):
+    """
+    Load every snapshot as a wide DataFrame (snapshot time × tickers) of weight percentages,
+    optionally limited to `tickers` and to snapshots taken from `start` onwards.
+    A ticker absent from a snapshot (not held at the time) shows NaN.
+    """
+    query = "SELECT taken_at, ticker, weight FROM weight_snapshot WHERE 1 = 1"
+    params = []
+    if tickers:
+        tickers = list(tickers)
+        query += f" AND ticker IN ({','.join('?' for _ in tickers)})"
+        params.extend(tickers)
+    if start:
+        query += " AND taken_at >= ?"
+        start = pd.Timestamp(start)
+        start = start.tz_localize('UTC') if start.tzinfo is None else start.tz_convert('UTC')
+        params.append(start.isoformat())
+
+    try:
+        with _connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ Weights store read error: {e}")
+        return pd.DataFrame()
+
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows, columns=['taken_at', 'ticker', 'weight'])
+    df['taken_at'] = pd.to_datetime(df['taken_at'], utc=True)
+    return df.pivot(index='taken_at', columns='ticker', values='weight').sort_index()
@@ -28,6 +28,8 @@ try:
 except ImportError:
     REQUESTS_AVAILABLE = False
 
+import trading_calendar
+
 CARD_W = 1280
 CARD_H = 720   # 16:9 Landscape — fits perfectly in all feeds without cropping
 
@@ -452,10 +454,11 @@ def build_card_from_stock_data(
     """
     metric     = SESSION_METRIC.get(session_name, "daily_change")
     is_daily   = metric == "daily_change"
+    # Daily cards only rank markets that actually traded today (exchange calendar)
+    pool       = trading_calendar.filter_traded_today(stock_data) if is_daily else stock_data
     candidates = {
-        t: d for t, d in stock_data.items()
-        if (d.get("has_traded_today", True) or not is_daily)
-        and metric in d
+        t: d for t, d in pool.items()
+        if metric in d
         and d[metric] is not None
         and t not in {"MNODL.L", "NVTKL.L"}
     }
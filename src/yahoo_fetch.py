@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Yahoo Fetch Executor
+====================
+Shared, rate-limited access to Yahoo Finance for every module that talks to it
+(finance_fetcher, crypto_fetcher, portfolio_manager, dividend_tracker).
+
+  • a bounded thread pool (YAHOO_MAX_WORKERS) for fanning out per-symbol requests
+  • a token bucket per host (YAHOO_RATE_PER_SEC, burst YAHOO_BURST), shared by all
+    threads, so parallel callers never exceed the request rate Yahoo tolerates
+  • retries with jittered exponential backoff on 429 / 5xx responses
+
+Usage:
+    import yahoo_fetch
+    hist = yahoo_fetch.call(lambda: yf.Ticker('NVDA').history(period='5d'))
+    results = yahoo_fetch.map_concurrent(fetch_one, symbols)
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+from urllib.parse import urlparse
+
+from rate_limit import TokenBucket  # re-exported: yahoo_fetch.TokenBucket predates rate_limit
+
+YAHOO_MAX_WORKERS = int(os.environ.get('YAHOO_MAX_WORKERS', '4'))
+YAHOO_RATE_PER_SEC = float(os.environ.get('YAHOO_RATE_PER_SEC', '4'))
+YAHOO_BURST = int(os.environ.get('YAHOO_BURST', '10'))
+YAHOO_MAX_RETRIES = int(os.environ.get('YAHOO_MAX_RETRIES', '3'))
+
+# yfinance spreads requests over query1/query2 and a few auxiliary hosts that all
+# share one throttling budget, so library calls are accounted under a single key.
+YAHOO_HOST = 'finance.yahoo.com'
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+_RETRYABLE_STATUS_RE = re.compile(r'\b(429|5\d\d)\b|too many requests|rate limit', re.IGNORECASE)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def host_of(url: str) -> str:
+    """Bucket key for a URL: every *.finance.yahoo.com host shares YAHOO_HOST."""
+    host = urlparse(url).netloc.lower()
+    return YAHOO_HOST if host.endswith(YAHOO_HOST) else host
+
+
+def _bucket(host: str) -> TokenBucket:
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(YAHOO_RATE_PER_SEC, YAHOO_BURST)
+        return _buckets[host]
+
+
+def _status_code(exc: Exception):
+    """Best-effort HTTP status from requests / urllib / yfinance exceptions."""
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True for throttling (429) and server-side (5xx) failures."""
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    # yfinance raises YFRateLimitError, or plain exceptions carrying the status in the message
+    return type(exc).__name__ == 'YFRateLimitError' or bool(_RETRYABLE_STATUS_RE.search(str(exc)))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff (seconds) before retry number `attempt + 1`."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def call(fn: Callable[[], Any], host: str = YAHOO_HOST, cost: int = 1,
+         retries: int = None) -> Any:
+    """
+    Run one Yahoo request `fn()` under the host's rate limit.
+
+    `cost` is the number of underlying HTTP requests `fn` performs (e.g. one per
+    symbol of a bulk yf.download). 429/5xx failures are retried with full-jitter
+    exponential backoff; any other exception (or the last retryable one) is raised.
+    """
+    retries = YAHOO_MAX_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        _bucket(host).acquire(cost)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            print(f"   ⏳ Yahoo throttled/unavailable ({e}), retry {attempt}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def map_concurrent(fn: Callable[[Any], Any], items: Iterable[Any], host: str = YAHOO_HOST,
+                   cost: Callable[[Any], int] = None, max_workers: int = None) -> List[Any]:
+    """
+    Apply `fn(item)` to every item on a bounded worker pool, each call going through
+    call() (rate limit + retries; `cost(item)` requests each, default 1). Results come
+    back in input order; items whose request failed yield None after the error is logged.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def _one(item):
+        try:
+            return call(lambda: fn(item), host=host, cost=cost(item) if cost else 1)
+        except Exception as e:
+            print(f"   ⚠️ Yahoo request failed for {item}: {e}")
+            return None
+
+    workers = min(max_workers or YAHOO_MAX_WORKERS, len(items))
+    if workers <= 1:
+        return [_one(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='yahoo') as pool:
+        return list(pool.map(_one, items))
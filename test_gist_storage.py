@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Quick checks of the Gist document helpers, run against an in-memory document (no GitHub access)
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import gist_storage
+
+
+def _use_document(values=None):
+    """Install an in-memory document as the cached Gist data."""
+    gist_storage._data_cache = gist_storage.GistDocument(values or {})
+    gist_storage._dirty = False
+    gist_storage._perf_index = None
+    return gist_storage._data_cache
+
+
+def test_seed_then_upsert_perf():
+    """Seed an empty history, then append, rerun the same day and backfill a missing date."""
+    _use_document()
+    gist_storage.seed_perf_history([
+        {'date': '2026-07-31', 'perf': 10.0},
+        {'date': '2026-08-31', 'perf': 14.5},
+        {'date': '2026-09-30', 'perf': 12.0},
+    ])
+    assert len(gist_storage.get_perf_history()) == 3
+
+    # A second seed leaves the stored history alone
+    gist_storage.seed_perf_history([{'date': '2020-01-01', 'perf': 1.0}])
+    assert gist_storage.get_perf_history().index[0].strftime('%Y-%m-%d') == '2026-07-31'
+
+    index = gist_storage.upsert_perf_record('2026-10-15', 13.0)   # append
+    assert index.ath == 14.5 and index.drawdown == -1.5
+
+    index = gist_storage.upsert_perf_record('2026-10-15', 15.25)  # same-day rerun
+    assert len(index) == 4 and index.ath == 15.25 and index.drawdown == 0.0
+
+    index = gist_storage.upsert_perf_record('2026-10-01', 16.0)   # backfill
+    assert len(index) == 5 and index.ath == 16.0 and index.drawdown == -0.75
+
+    history = gist_storage.get_perf_history()
+    assert [d.strftime('%Y-%m-%d') for d in history.index] == [
+        '2026-07-31', '2026-08-31', '2026-09-30', '2026-10-01', '2026-10-15']
+    assert history.cummax().iloc[-1] == 16.0
+
+
+class _Response:
+    def __init__(self, status_code, body=None, text=''):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+        self.text = text
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+def _with_fake_gist(files, test):
+    """Run `test` against a Gist serving `files` ({name: content or None for a failing raw_url})."""
+    entries = {
+        name: {'content': '' if content is None else content, 'truncated': content is None,
+               'raw_url': f'https://gist.example/raw/{name}'}
+        for name, content in files.items()
+    }
+
+    def fake_get(url, headers=None, timeout=None):
+        if url.startswith('https://gist.example/raw/'):
+            return _Response(500)
+        return _Response(200, {'files': entries})
+
+    saved_get, saved_mirror, saved_env = gist_storage.requests.get, gist_storage.GIST_MIRROR_FILE, dict(os.environ)
+    with tempfile.TemporaryDirectory() as tmp:
+        gist_storage.GIST_MIRROR_FILE = os.path.join(tmp, 'gist_mirror.json')
+        os.environ.update(GIST_ID='test-gist', GIST_ACCESS_TOKEN='test-token')
+        gist_storage.requests.get = fake_get
+        try:
+            _use_document()
+            test()
+        finally:
+            _use_document()  # drop what the migration queued for saving
+            gist_storage.requests.get = saved_get
+            gist_storage.GIST_MIRROR_FILE = saved_mirror
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+
+def test_dirty_shards_only_changed():
+    """Only shards whose content differs from the Gist are uploaded."""
+    def test():
+        data = gist_storage._load_from_gist()
+        assert data.dirty_shards() == {}
+        data['session_runs']['2026-10-16:close'] = 'x'
+        assert set(data.dirty_shards()) == {'sessions'}
+        data.mark_synced(data.dirty_shards())
+        assert data.dirty_shards() == {}
+
+    _with_fake_gist({
+        gist_storage.shard_filename('recap'): json.dumps({'recap_history': [{'content': 'r'}], 'used_tags': []}),
+        gist_storage.shard_filename('sessions'): json.dumps({'session_runs': {}}),
+    }, test)
+
+
+def test_single_file_migration():
+    """The legacy single file is split into shards, and deleted in the same save."""
+    def test():
+        data = gist_storage._load_from_gist()
+        assert data['used_tags'] == ['a'] and data['session_runs'] == {'x': 1}
+        assert gist_storage.GIST_FILENAME in data.deleted_files
+        assert set(data.dirty_shards()) == {'recap', 'sessions'}
+
+    _with_fake_gist({gist_storage.GIST_FILENAME: json.dumps({'used_tags': ['a'], 'session_runs': {'x': 1}})}, test)
+
+
+def test_unreadable_shard_never_saved():
+    """A shard whose raw_url fails (or is corrupt) reads as empty but is never written back."""
+    def test():
+        data = gist_storage._load_from_gist()
+        assert data.get('perf_history') is None and data.get('session_runs') is None
+        data['perf_history'] = {'start': None, 'day_deltas': [], 'perf_bp': []}
+        data['session_runs'] = {'2026-10-16:close': 'x'}
+        data['used_tags'] = ['b']
+        assert data.failed_shards == {'perf', 'sessions'}
+        assert set(data.dirty_shards()) == {'recap'}
+
+    _with_fake_gist({
+        gist_storage.shard_filename('recap'): json.dumps({'recap_history': [{'content': 'r'}], 'used_tags': []}),
+        gist_storage.shard_filename('perf'): None,
+        gist_storage.shard_filename('sessions'): '{"session_runs": ',
+    }, test)
+
+
+if __name__ == '__main__':
+    test_seed_then_upsert_perf()
+    test_dirty_shards_only_changed()
+    test_single_file_migration()
+    test_unreadable_shard_never_saved()
+    print("✅ Gist storage checks passed")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Quick check of trading_calendar.has_traded_today at the scheduled session times
+"""
+
+import sys
+import os
+from datetime import datetime, timezone
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import trading_calendar
+
+
+def test_us_close_keeps_hkex():
+    """At the U.S. close (21:00 UTC) Hong Kong is on the next day, but today's HKEX session counted."""
+    now = datetime(2026, 10, 16, 21, 0, tzinfo=timezone.utc)   # Friday, 05:00 HKT Saturday
+    assert trading_calendar.has_traded_today('XHKG', now)
+    assert trading_calendar.has_traded_today('XNYS', now)
+    assert trading_calendar.has_traded_today('XLON', now)
+
+
+def test_us_premarket_and_holidays():
+    """Before the opening bell, and on exchange holidays, the market has not traded today."""
+    assert not trading_calendar.has_traded_today('XNYS', datetime(2026, 10, 16, 7, 0, tzinfo=timezone.utc))
+    # Chung Yeung Festival (observed): HKEX closed, still excluded at the U.S. close
+    assert not trading_calendar.has_traded_today('XHKG', datetime(2026, 10, 19, 21, 0, tzinfo=timezone.utc))
+
+
+def test_copenhagen_ascension_bridge():
+    """Nasdaq Copenhagen closes on Ascension Day and the Friday after it."""
+    assert not trading_calendar.has_traded_today('XCSE', datetime(2026, 5, 14, 16, 0, tzinfo=timezone.utc))
+    assert not trading_calendar.has_traded_today('XCSE', datetime(2026, 5, 15, 16, 0, tzinfo=timezone.utc))
+    assert trading_calendar.has_traded_today('XCSE', datetime(2026, 5, 18, 16, 0, tzinfo=timezone.utc))
+
+
+if __name__ == '__main__':
+    test_us_close_keeps_hkex()
+    test_us_premarket_and_holidays()
+    test_copenhagen_ascension_bridge()
+    print("✅ Trading calendar checks passed")